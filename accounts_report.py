@@ -4,8 +4,13 @@ from supabase import create_client, Client
 from datetime import date, datetime
 import calendar
 import pandas as pd
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
+from functools import partial
 import logging
+from booking_model import Booking
+from booking_store import get_booking_store
+from cache_registry import invalidate_bookings
+from report_jobs import get_report_jobs, rebuild_requested, show_job_progress
 
 # ────── Logging ──────
 logging.basicConfig(filename="accounts_report.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -33,146 +38,40 @@ def normalize_property(name: str) -> str:
     """Normalize property names using mapping."""
     return property_mapping.get(name.strip(), name.strip())
 
-def safe_float(v, default: float = 0.0) -> float:
-    """Safely convert value to float."""
-    try:
-        return float(v) if v not in [None, "", " "] else default
-    except:
-        return default
-
-def sanitize_string(v, default: str = "") -> str:
-    """Sanitize string values."""
-    return str(v).strip() if v is not None else default
-
 # ────────────────────────────────────────────────────────────────────────
-# Load bookings with pagination for entire month
+# Load bookings for entire month from the shared booking store
 # ────────────────────────────────────────────────────────────────────────
-def load_all_bookings_for_month(year: int, month: int) -> List[Dict]:
-    """Load ALL bookings (both direct and online) for the given month with pagination."""
+def load_all_bookings_for_month(year: int, month: int) -> List[Booking]:
+    """Load ALL bookings (both direct and online) for the given month."""
     try:
         # Calculate month date range
         first_day = date(year, month, 1)
         last_day = date(year, month, calendar.monthrange(year, month)[1])
+        store = get_booking_store(supabase)
         
         all_bookings = []
-        
-        # ───── Load Direct Reservations with pagination ─────
-        st.info("Loading direct reservations...")
-        page_size = 1000
-        start = 0
-        
-        while True:
-            response = supabase.table("reservations")\
-                .select("*")\
-                .lte("check_in", str(last_day))\
-                .gte("check_out", str(first_day))\
-                .in_("plan_status", ["Confirmed", "Completed"])\
-                .order("check_in", desc=False)\
-                .range(start, start + page_size - 1)\
-                .execute()
-            
-            if not response.data:
-                break
-            
-            for record in response.data:
-                try:
-                    check_in = date.fromisoformat(record["check_in"])
-                    check_out = date.fromisoformat(record["check_out"])
-                    
-                    # Only include bookings that overlap with the selected month
-                    if check_out <= first_day or check_in > last_day:
-                        continue
-                    
-                    booking = {
-                        "type": "direct",
-                        "date": check_in,
-                        "property_name": normalize_property(record.get("property_name", "")),
-                        "guest_name": sanitize_string(record.get("guest_name")),
-                        "booking_id": sanitize_string(record.get("booking_id")),
-                        "total_amount": safe_float(record.get("total_tariff")),
-                        "advance": safe_float(record.get("advance_amount")),
-                        "balance": safe_float(record.get("balance_amount")),
-                        "check_in": str(check_in),
-                        "check_out": str(check_out),
-                        "booking_status": sanitize_string(record.get("plan_status")),
-                        "payment_status": sanitize_string(record.get("payment_status")),
-                    }
-                    
-                    # Calculate pending amount
-                    booking["pending"] = booking["total_amount"] - booking["advance"] - booking["balance"]
-                    
-                    all_bookings.append(booking)
-                except Exception as e:
-                    logging.warning(f"Error processing direct booking: {e}")
-                    continue
-            
-            if len(response.data) < page_size:
-                break
-            
-            start += page_size
-        
-        # ───── Load Online Reservations with pagination ─────
-        st.info("Loading online reservations...")
-        start = 0
-        
-        while True:
-            response = supabase.table("online_reservations")\
-                .select("*")\
-                .lte("check_in", str(last_day))\
-                .gte("check_out", str(first_day))\
-                .in_("booking_status", ["Confirmed", "Completed"])\
-                .order("check_in", desc=False)\
-                .range(start, start + page_size - 1)\
-                .execute()
-            
-            if not response.data:
-                break
-            
-            for record in response.data:
+        sources = (
+            ("reservations", False, "plan_status"),
+            ("online_reservations", True, "booking_status"),
+        )
+        for table, is_online, status_field in sources:
+            rows = store.rows(table, first_day, last_day, where={status_field: ["Confirmed", "Completed"]})
+            bookings = []
+            for record in rows:
                 try:
-                    check_in = date.fromisoformat(record["check_in"])
-                    check_out = date.fromisoformat(record["check_out"])
+                    # Online totals are the full booking amount; receivable is kept on the record
+                    booking = Booking.from_row(record, is_online, normalize_property)
                     
                     # Only include bookings that overlap with the selected month
-                    if check_out <= first_day or check_in > last_day:
+                    if booking is None or booking.check_out <= first_day or booking.check_in > last_day:
                         continue
                     
-                    # For online bookings, calculate amounts
-                    total_amount = safe_float(record.get("booking_amount"))
-                    gst = safe_float(record.get("gst"))
-                    tax = safe_float(record.get("ota_tax"))
-                    commission = safe_float(record.get("ota_commission"))
-                    
-                    # Hotel receivable = Total - GST - Tax - Commission
-                    receivable = total_amount - gst - tax - commission
-                    
-                    booking = {
-                        "type": "online",
-                        "date": check_in,
-                        "property_name": normalize_property(record.get("property", "")),
-                        "guest_name": sanitize_string(record.get("guest_name")),
-                        "booking_id": sanitize_string(record.get("booking_id") or record.get("id")),
-                        "total_amount": total_amount,  # Use hotel receivable for online bookings
-                        "advance": safe_float(record.get("total_payment_made")),
-                        "balance": safe_float(record.get("balance_due")),
-                        "check_in": str(check_in),
-                        "check_out": str(check_out),
-                        "booking_status": sanitize_string(record.get("booking_status")),
-                        "payment_status": sanitize_string(record.get("payment_status")),
-                    }
-                    
-                    # Calculate pending amount
-                    booking["pending"] = booking["total_amount"] - booking["advance"] - booking["balance"]
-                    
-                    all_bookings.append(booking)
+                    bookings.append(booking)
                 except Exception as e:
-                    logging.warning(f"Error processing online booking: {e}")
+                    logging.warning(f"Error processing {'online' if is_online else 'direct'} booking: {e}")
                     continue
-            
-            if len(response.data) < page_size:
-                break
-            
-            start += page_size
+            bookings.sort(key=lambda b: b.check_in)
+            all_bookings.extend(bookings)
         
         logging.info(f"Loaded {len(all_bookings)} total bookings for {year}-{month:02d}")
         return all_bookings
@@ -185,12 +84,12 @@ def load_all_bookings_for_month(year: int, month: int) -> List[Dict]:
 # ────────────────────────────────────────────────────────────────────────
 # Create Accounts Report Table
 # ────────────────────────────────────────────────────────────────────────
-def create_accounts_report(bookings: List[Dict], property_filter: str = "All") -> pd.DataFrame:
+def create_accounts_report(bookings: List[Booking], property_filter: str = "All") -> pd.DataFrame:
     """Create accounts report table with all bookings."""
     
     # Filter by property if not "All"
     if property_filter != "All":
-        bookings = [b for b in bookings if b["property_name"] == property_filter]
+        bookings = [b for b in bookings if b.property == property_filter]
     
     if not bookings:
         return pd.DataFrame()
@@ -199,19 +98,19 @@ def create_accounts_report(bookings: List[Dict], property_filter: str = "All") -
     report_data = []
     for booking in bookings:
         report_data.append({
-            "Date": booking["date"].strftime("%Y-%m-%d"),
-            "Property Name": booking["property_name"],
-            "Guest Name": booking["guest_name"],
-            "Booking ID": booking["booking_id"],
-            "Check In": booking["check_in"],
-            "Check Out": booking["check_out"],
-            "Total Amount": booking["total_amount"],
-            "Advance": booking["advance"],
-            "Balance": booking["balance"],
-            "Pending": booking["pending"],
-            "Booking Status": booking["booking_status"],
-            "Payment Status": booking["payment_status"],
-            "Type": booking["type"].title()
+            "Date": booking.check_in.strftime("%Y-%m-%d"),
+            "Property Name": booking.property,
+            "Guest Name": booking.guest_name,
+            "Booking ID": booking.booking_id,
+            "Check In": str(booking.check_in),
+            "Check Out": str(booking.check_out),
+            "Total Amount": booking.total_amount,
+            "Advance": booking.advance,
+            "Balance": booking.balance,
+            "Pending": booking.pending,
+            "Booking Status": booking.booking_status,
+            "Payment Status": booking.payment_status,
+            "Type": booking.type.title()
         })
     
     df = pd.DataFrame(report_data)
@@ -221,6 +120,15 @@ def create_accounts_report(bookings: List[Dict], property_filter: str = "All") -
     
     return df
 
+def build_month_report(year: int, month: int, progress: Optional[Callable[[float, str], None]] = None) -> pd.DataFrame:
+    """Accounts report of every property for the month; the accounts report job's build."""
+    if progress:
+        progress(0.0, "Reading bookings")
+    bookings = load_all_bookings_for_month(year, month)
+    if progress:
+        progress(0.5, f"Building report from {len(bookings)} bookings")
+    return create_accounts_report(bookings)
+
 # ────────────────────────────────────────────────────────────────────────
 # Calculate Summary Statistics
 # ────────────────────────────────────────────────────────────────────────
@@ -293,30 +201,38 @@ def show_accounts_report():
     with col2:
         month = st.selectbox("Month", list(range(1, 13)), index=today.month - 1, format_func=lambda x: calendar.month_name[x])
     
+    period = (date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1]))
     with col3:
-        if st.button("🔄 Refresh Data", use_container_width=False):
-            st.cache_data.clear()
-            st.rerun()
-    
-    # Load all bookings for the month
-    with st.spinner(f"Loading bookings for {calendar.month_name[month]} {year}..."):
-        all_bookings = load_all_bookings_for_month(year, month)
+        refresh = st.button("🔄 Refresh Data", use_container_width=False)
+        if refresh:
+            invalidate_bookings(supabase, None, *period)
+    
+    # The month's report is built by a background job, only when there is none yet or on
+    # request; widget reruns (property filter, exports) reuse the last one built
+    report_jobs = get_report_jobs(supabase)
+    job = report_jobs.find("accounts", (year, month), period)
+    if job is None or refresh or rebuild_requested(job, key="accounts_rebuild"):
+        job = report_jobs.submit("accounts", (year, month), partial(build_month_report, year, month), period,
+                                 label=f"{calendar.month_name[month]} {year} accounts report")
+    if not show_job_progress(job):
+        return
+    month_df = job.result
     
-    if not all_bookings:
+    if month_df.empty:
         st.warning(f"No bookings found for {calendar.month_name[month]} {year}")
         return
     
-    st.success(f"✅ Loaded {len(all_bookings)} bookings")
+    st.success(f"✅ Loaded {len(month_df)} bookings")
     
     # Get unique properties
-    properties = sorted(list(set(b["property_name"] for b in all_bookings)))
+    properties = sorted(month_df["Property Name"].unique())
     
     # Property filter
     st.subheader("🏨 Filter by Property")
     property_filter = st.selectbox("Select Property", ["All"] + properties)
     
-    # Create report
-    df = create_accounts_report(all_bookings, property_filter)
+    # Filter the report
+    df = month_df if property_filter == "All" else month_df[month_df["Property Name"] == property_filter]
     
     if df.empty:
         st.warning("No data available for the selected filters.")
@@ -24,6 +24,9 @@ from log import show_log_report, log_activity
 from users import validate_user, create_user, update_user, delete_user, load_users
 from accounts_report import show_accounts_report
 from nrd_report import show_nrd_report
+from cache_registry import invalidate_bookings
+from booking_feed import start_booking_feed
+from stayflexi_sync import get_stayflexi_sync
 
 # Properties that stopped operating from July 1, 2026 onward.
 # Existing user assignments / historical data are untouched - this only
@@ -73,6 +76,15 @@ def get_supabase_client():
         st.stop()
 
 supabase: Client = get_supabase_client()
+
+# Optional: keep the shared booking store current from Supabase Realtime instead of polling
+if os.getenv("BOOKING_REALTIME", "").strip().lower() in ("1", "true", "yes"):
+    start_booking_feed(supabase, os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
+
+# Optional: pull Stayflexi booking changes every few minutes instead of waiting for an Excel upload
+if os.getenv("STAYFLEXI_SYNC", "").strip().lower() in ("1", "true", "yes"):
+    get_stayflexi_sync(supabase).start()
+
 def check_authentication():
     if 'authenticated' not in st.session_state:
         st.session_state.authenticated = False
@@ -422,7 +434,7 @@ def main():
     # === Refresh Button (not for hardcoded Admin) ===
     if not (st.session_state.role == "Admin" and st.session_state.user_data is None):
         if st.sidebar.button("Refresh All Data"):
-            st.cache_data.clear()
+            invalidate_bookings(supabase)
             try:
                 st.session_state.reservations = load_reservations_from_supabase()
                 st.session_state.online_reservations = load_online_reservations_from_supabase()
@@ -499,8 +511,6 @@ def main():
         st.sidebar.write(f"Role: **{st.session_state.role}**")
     if st.sidebar.button("Log Out"):
         log_activity(supabase, st.session_state.username, "Logged out")
-        st.cache_data.clear()
-        st.cache_resource.clear()
         for key in list(st.session_state.keys()):
             del st.session_state[key]
         st.session_state.authenticated = False
@@ -4,6 +4,8 @@ from supabase import create_client, Client
 from datetime import date, datetime
 import pandas as pd
 import calendar
+from supabase_paging import fetch_all
+from cache_registry import get_cache_registry
 
 # Initialize Supabase client
 try:
@@ -104,28 +106,17 @@ TABLE_CSS = """
 </style>
 """
 
+# Columns the report tables and downloads read from each table
+DIRECT_COLUMNS = ("booking_id", "property_name", "booking_date", "guest_name", "mobile_no", "check_in", "check_out",
+                  "room_no", "advance_mop", "balance_mop", "total_tariff", "advance_amount", "plan_status", "remarks")
+ONLINE_COLUMNS = ("id", "booking_id", "property", "created_at", "guest_name", "guest_phone", "check_in", "check_out",
+                  "room_no", "advance_mop", "balance_mop", "booking_amount", "total_payment_made", "balance_due",
+                  "booking_status", "remarks")
+
 def load_direct_reservations_from_supabase():
     """Load ALL direct reservations without any limits using pagination"""
     try:
-        all_data = []
-        page_size = 1000
-        offset = 0
-        
-        while True:
-            response = supabase.table("reservations")\
-                .select("*")\
-                .range(offset, offset + page_size - 1)\
-                .execute()
-            
-            if response.data:
-                all_data.extend(response.data)
-                if len(response.data) < page_size:
-                    break
-                offset += page_size
-            else:
-                break
-        
-        return all_data
+        return fetch_all(supabase, "reservations", DIRECT_COLUMNS, key="booking_id")
     except Exception as e:
         st.error(f"Error loading direct reservations: {e}")
         return []
@@ -133,25 +124,7 @@ def load_direct_reservations_from_supabase():
 def load_online_reservations_from_supabase():
     """Load ALL online reservations without any limits using pagination"""
     try:
-        all_data = []
-        page_size = 1000
-        offset = 0
-        
-        while True:
-            response = supabase.table("online_reservations")\
-                .select("*")\
-                .range(offset, offset + page_size - 1)\
-                .execute()
-            
-            if response.data:
-                all_data.extend(response.data)
-                if len(response.data) < page_size:
-                    break
-                offset += page_size
-            else:
-                break
-        
-        return all_data
+        return fetch_all(supabase, "online_reservations", ONLINE_COLUMNS, key="id")
     except Exception as e:
         st.error(f"Error loading online reservations: {e}")
         return []
@@ -248,7 +221,9 @@ def show_booking_date_report():
     st.markdown("**This report shows all bookings based on when they were created/booked, not check-in dates.**")
 
     if st.button("Refresh Bookings"):
-        st.cache_data.clear()
+        # Clear only this report's loaders, not every cached query on the server
+        cached_load_online_reservations.clear()
+        cached_load_direct_reservations.clear()
         st.success("Cache cleared! Refreshing bookings...")
         st.rerun()
 
@@ -259,6 +234,9 @@ def show_booking_date_report():
     # Load ALL bookings
     online_bookings = cached_load_online_reservations()
     direct_bookings = cached_load_direct_reservations()
+    # Every booking is loaded, so any booking write or refresh clears them
+    get_cache_registry().register(cached_load_online_reservations, ())
+    get_cache_registry().register(cached_load_direct_reservations, ())
 
     st.info(f"Total records loaded: Online={len(online_bookings)}, Direct={len(direct_bookings)}")
 
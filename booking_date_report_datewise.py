@@ -1,10 +1,13 @@
 # booking_date_report_datewise.py - Date-wise Booking Made Report (All Properties)
 import streamlit as st
 from supabase import create_client, Client
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 import pandas as pd
 import calendar
 from io import BytesIO
+from booking_store import TABLE_KEYS
+from supabase_paging import fetch_all
+from cache_registry import get_cache_registry
 
 # Initialize Supabase client
 try:
@@ -135,56 +138,20 @@ TABLE_CSS = """
 <link rel="stylesheet" type="text/css" href="https://cdn.datatables.net/buttons/2.2.2/css/buttons.dataTables.min.css">
 """
 
-def load_direct_reservations_from_supabase():
-    """Load ALL direct reservations without any limits using pagination"""
-    try:
-        all_data = []
-        page_size = 1000
-        offset = 0
-        
-        while True:
-            response = supabase.table("reservations")\
-                .select("*")\
-                .range(offset, offset + page_size - 1)\
-                .execute()
-            
-            if response.data:
-                all_data.extend(response.data)
-                if len(response.data) < page_size:
-                    break
-                offset += page_size
-            else:
-                break
-        
-        return all_data
-    except Exception as e:
-        st.error(f"Error loading direct reservations: {e}")
-        return []
+# Columns the report tables and downloads read from each table
+DIRECT_COLUMNS = ("booking_id", "property_name", "booking_date", "guest_name", "mobile_no", "check_in", "check_out",
+                  "room_no", "advance_mop", "balance_mop", "total_tariff", "advance_amount", "plan_status", "remarks")
+ONLINE_COLUMNS = ("id", "booking_id", "property", "created_at", "guest_name", "guest_phone", "check_in", "check_out",
+                  "room_no", "advance_mop", "balance_mop", "booking_amount", "total_payment_made", "balance_due",
+                  "booking_status", "remarks")
 
-def load_online_reservations_from_supabase():
-    """Load ALL online reservations without any limits using pagination"""
+def load_reservations_in_window(table, columns, date_column, first_day, last_day):
+    """Load rows whose date_column falls between first_day and last_day (inclusive) using pagination"""
     try:
-        all_data = []
-        page_size = 1000
-        offset = 0
-        
-        while True:
-            response = supabase.table("online_reservations")\
-                .select("*")\
-                .range(offset, offset + page_size - 1)\
-                .execute()
-            
-            if response.data:
-                all_data.extend(response.data)
-                if len(response.data) < page_size:
-                    break
-                offset += page_size
-            else:
-                break
-        
-        return all_data
+        window = lambda q: q.gte(date_column, str(first_day)).lt(date_column, str(last_day + timedelta(days=1)))
+        return fetch_all(supabase, table, columns, key=TABLE_KEYS[table], where=window)
     except Exception as e:
-        st.error(f"Error loading online reservations: {e}")
+        st.error(f"Error loading {table}: {e}")
         return []
 
 def safe_date_parse(date_str):
@@ -402,12 +369,12 @@ def convert_df_to_excel(df):
     return output.getvalue()
 
 @st.cache_data(ttl=300)
-def cached_load_online_reservations():
-    return load_online_reservations_from_supabase()
+def cached_load_online_reservations(first_day, last_day):
+    return load_reservations_in_window("online_reservations", ONLINE_COLUMNS, "created_at", first_day, last_day)
 
 @st.cache_data(ttl=300)
-def cached_load_direct_reservations():
-    return load_direct_reservations_from_supabase()
+def cached_load_direct_reservations(first_day, last_day):
+    return load_reservations_in_window("reservations", DIRECT_COLUMNS, "booking_date", first_day, last_day)
 
 def show_datewise_booking_report():
     """Main function to display the date-wise booking report"""
@@ -431,9 +398,14 @@ def show_datewise_booking_report():
     with col2:
         month = st.selectbox("Select Month", list(range(1, 13)), index=date.today().month - 1)
 
-    # Load ALL bookings
-    online_bookings = cached_load_online_reservations()
-    direct_bookings = cached_load_direct_reservations()
+    # Load only bookings booked during the selected month
+    first_day = date(year, month, 1)
+    last_day = date(year, month, calendar.monthrange(year, month)[1])
+    online_bookings = cached_load_online_reservations(first_day, last_day)
+    direct_bookings = cached_load_direct_reservations(first_day, last_day)
+    # Windowed by booking date, not stay, so any booking write or refresh clears them
+    get_cache_registry().register(cached_load_online_reservations, (first_day, last_day))
+    get_cache_registry().register(cached_load_direct_reservations, (first_day, last_day))
 
     st.info(f"Total records loaded: Online={len(online_bookings)}, Direct={len(direct_bookings)}")
 
@@ -0,0 +1,127 @@
+# booking_feed.py - Pushes reservation row changes into the shared booking store
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+import streamlit as st
+
+from booking_store import TABLE_KEYS, BookingStore, get_booking_store
+from cache_registry import CacheRegistry, get_cache_registry
+
+EVENTS = ("INSERT", "UPDATE", "DELETE")
+RECONNECT_AFTER = 30  # seconds before a dropped Realtime connection is retried
+
+
+def parse_change(payload: Dict) -> Optional[Dict]:
+    """table / event / record / old_record from a Realtime postgres_changes payload.
+
+    Accepts the realtime-py shape ({"data": {"type", "record", "old_record"}})
+    as well as the JS-style one ({"eventType", "new", "old"}).
+    """
+    data = payload.get("data", payload)
+    event = str(data.get("type") or data.get("eventType") or "").upper()
+    table = data.get("table")
+    if event not in EVENTS or table not in TABLE_KEYS:
+        return None
+    return {
+        "table": table,
+        "event": event,
+        "record": data.get("record") or data.get("new") or {},
+        "old_record": data.get("old_record") or data.get("old") or {},
+    }
+
+
+class BookingFeed:
+    """Applies pushed inserts, updates and deletes to the booking store.
+
+    Each change is written straight into the store, and the registered report
+    caches for the months the stay covered before and after the change are
+    cleared. While connected the store polls for changes only every
+    FEED_SYNC_INTERVAL seconds instead of every SYNC_INTERVAL.
+    """
+
+    def __init__(self, store: BookingStore, registry: CacheRegistry):
+        self.store = store
+        self.registry = registry
+        self._thread: Optional[threading.Thread] = None
+
+    def handle(self, payload: Dict):
+        change = parse_change(payload)
+        if change is None:
+            return
+        try:
+            for ci, co in self.store.apply_change(**change):
+                self.registry.invalidate(None, ci, co)
+        except Exception as e:
+            logging.error(f"BookingFeed: failed to apply {change['event']} on {change['table']}: {e}")
+
+    # ────── Sources ──────
+    def connect_local(self, publisher: "LocalPublisher"):
+        """Take changes from an in-process publisher instead of Realtime."""
+        publisher.subscribe(self.handle)
+        self.store.feed_connected(True)
+
+    def start_realtime(self, url: str, key: str):
+        """Listen to Supabase Realtime on a daemon thread, reconnecting when the socket drops.
+
+        Needs both tables in the supabase_realtime publication (sql/booking_realtime.sql).
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run_realtime, args=(url, key), name="booking-feed", daemon=True)
+        self._thread.start()
+
+    def _run_realtime(self, url: str, key: str):
+        while True:
+            try:
+                asyncio.run(self._listen(url, key))
+            except Exception as e:
+                logging.warning(f"BookingFeed: Realtime connection lost, polling until it is back: {e}")
+            finally:
+                self.store.feed_connected(False)
+            threading.Event().wait(RECONNECT_AFTER)
+
+    async def _listen(self, url: str, key: str):
+        from supabase import acreate_client
+
+        client = await acreate_client(url, key)
+        await client.realtime.connect()
+        channel = client.channel("booking-feed")
+        for table in TABLE_KEYS:
+            channel.on_postgres_changes("*", schema="public", table=table, callback=self.handle)
+        await channel.subscribe()
+        # Rows changed while disconnected are picked up by one forced incremental pull
+        for table in TABLE_KEYS:
+            self.store.sync(table, force=True)
+        self.store.feed_connected(True)
+        logging.info("BookingFeed: subscribed to reservation changes")
+        await client.realtime.listen()
+
+
+class LocalPublisher:
+    """In-process stand-in for the Realtime channel, for tests and setups without Realtime.
+
+    publish() delivers a payload shaped like Realtime's to every subscriber,
+    synchronously on the caller's thread.
+    """
+
+    def __init__(self):
+        self._subscribers: List[Callable[[Dict], None]] = []
+
+    def subscribe(self, callback: Callable[[Dict], None]):
+        self._subscribers.append(callback)
+
+    def publish(self, table: str, event: str, record: Optional[Dict] = None, old_record: Optional[Dict] = None):
+        payload = {"data": {"schema": "public", "table": table, "type": event.upper(),
+                            "record": record or {}, "old_record": old_record or {}}}
+        for callback in list(self._subscribers):
+            callback(payload)
+
+
+@st.cache_resource
+def start_booking_feed(_client, url: str, key: str) -> BookingFeed:
+    """Start the one Realtime booking feed for this server process."""
+    feed = BookingFeed(get_booking_store(_client), get_cache_registry())
+    feed.start_realtime(url, key)
+    return feed
@@ -0,0 +1,65 @@
+# booking_index.py - Shared stay index for "who is in-house on day D" lookups
+from bisect import bisect_right
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+def parse_stay_date(value: Any) -> Optional[date]:
+    """Parse an ISO check-in/check-out value, returning None if it is missing or invalid."""
+    if isinstance(value, date):
+        return value
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+class StayIndex:
+    """Bookings indexed by their stay interval [check_in, check_out).
+
+    Check-in/check-out dates are parsed once when the index is built. Stays are
+    kept sorted by check-in, so a lookup bisects to the bookings that started
+    no earlier than the longest stay before the requested day instead of
+    scanning every booking. Results come back in the original booking order,
+    so callers that depend on load order behave exactly as with a linear scan.
+    """
+
+    def __init__(self, bookings: Sequence[Dict], parse: Callable[[Any], Optional[date]] = parse_stay_date,
+                 check_in_key: str = "check_in", check_out_key: str = "check_out"):
+        stays = []
+        for pos, b in enumerate(bookings):
+            ci = parse(b.get(check_in_key))
+            co = parse(b.get(check_out_key))
+            if ci and co and co > ci:
+                stays.append((ci.toordinal(), co.toordinal(), pos, b))
+        stays.sort(key=lambda s: (s[0], s[2]))
+
+        self._starts = [s[0] for s in stays]
+        self._ends = [s[1] for s in stays]
+        self._positions = [s[2] for s in stays]
+        self._bookings = [s[3] for s in stays]
+        self._max_span = max((end - start for start, end, _, _ in stays), default=0)
+
+    def __len__(self) -> int:
+        return len(self._bookings)
+
+    def _overlapping(self, first: int, last: int) -> List[Dict]:
+        """Bookings whose stay overlaps the ordinal day range [first, last]."""
+        lo = bisect_right(self._starts, first - self._max_span)
+        hi = bisect_right(self._starts, last)
+        hits = [i for i in range(lo, hi) if self._ends[i] > first]
+        hits.sort(key=self._positions.__getitem__)
+        return [self._bookings[i] for i in hits]
+
+    def active_on(self, day: date) -> List[Dict]:
+        """Bookings in-house on the night of `day` (check_in <= day < check_out)."""
+        d = day.toordinal()
+        return self._overlapping(d, d)
+
+    def active_between(self, start: date, end: date) -> List[Dict]:
+        """Bookings in-house on at least one night between start and end (inclusive)."""
+        if end < start:
+            return []
+        return self._overlapping(start.toordinal(), end.toordinal())
@@ -0,0 +1,199 @@
+# booking_model.py - Canonical booking record shared by direct and online reservations
+from datetime import date
+from typing import Any, Callable, Dict, Optional
+
+CONFIRMED_STATUSES = ("Confirmed", "Completed")
+PAID_STATUSES = ("Fully Paid", "Partially Paid")
+
+# Columns Booking.from_row reads; loaders building Bookings project to these instead of select("*")
+DIRECT_COLUMNS = (
+    "booking_id", "property_name", "guest_name", "mobile_no", "total_pax",
+    "check_in", "check_out", "no_of_days", "room_no", "mob", "breakfast",
+    "total_tariff", "advance_amount", "advance_mop", "balance_amount", "balance_mop",
+    "plan_status", "payment_status", "submitted_by", "modified_by",
+    "remarks", "advance_remarks", "balance_remarks", "accounts_status",
+)
+ONLINE_COLUMNS = (
+    "id", "booking_id", "ota_booking_id", "property", "guest_name", "guest_phone", "total_pax",
+    "check_in", "check_out", "room_nights", "room_no", "mode_of_booking", "rate_plans",
+    "booking_amount", "gst", "ota_tax", "ota_commission",
+    "total_payment_made", "advance_mop", "balance_due", "balance_mop",
+    "booking_status", "payment_status", "submitted_by", "modified_by",
+    "remarks", "advance_remarks", "balance_remarks", "accounts_status",
+)
+
+
+def _text(v: Any, default: str = "") -> str:
+    return str(v).strip() if v is not None else default
+
+
+def _int(v: Any, default: int = 0) -> int:
+    try:
+        return int(float(v)) if v not in [None, "", " "] else default
+    except (ValueError, TypeError):
+        return default
+
+
+def _float(v: Any, default: float = 0.0) -> float:
+    try:
+        return float(v) if v not in [None, "", " "] else default
+    except (ValueError, TypeError):
+        return default
+
+
+class Booking:
+    """One reservation, normalised from either the reservations or the
+    online_reservations table.
+
+    Built once per fetch. check_in/check_out are dates; money fields are
+    floats. Mapping-style reads (b["room_no"], b.get("mob")) are supported so
+    generic helpers such as StayIndex and sweep_occupancy accept it like a row.
+    """
+
+    __slots__ = (
+        "type", "property", "booking_id", "db_id", "ota_booking_id",
+        "guest_name", "mobile_no", "total_pax",
+        "check_in", "check_out", "days", "room_no", "mob", "plan",
+        "room_charges", "gst", "tax", "total_amount", "commission", "receivable",
+        "advance", "advance_mop", "balance", "balance_mop",
+        "booking_status", "payment_status", "submitted_by", "modified_by",
+        "remarks", "advance_remarks", "balance_remarks", "accounts_status",
+    )
+
+    def __init__(self, **fields: Any):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_row(cls, row: Dict, is_online: bool,
+                 normalize_property: Optional[Callable[[str], str]] = None) -> Optional["Booking"]:
+        """Normalise a Supabase row. Returns None when the stay dates are missing or unparseable."""
+        try:
+            ci = date.fromisoformat(str(row["check_in"])[:10])
+            co = date.fromisoformat(str(row["check_out"])[:10])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+        days = _int(row.get("room_nights" if is_online else "no_of_days")) or (co - ci).days
+        if days <= 0:
+            days = 1
+        prop = _text(row.get("property") if is_online else row.get("property_name"))
+        if normalize_property:
+            prop = normalize_property(prop)
+
+        if is_online:
+            total_amount = _float(row.get("booking_amount"))
+            gst = _float(row.get("gst"))
+            tax = _float(row.get("ota_tax"))
+            commission = _float(row.get("ota_commission"))
+            room_charges = total_amount - gst - tax
+        else:
+            total_amount = _float(row.get("total_tariff"))
+            gst = tax = commission = 0.0
+            room_charges = total_amount
+
+        receivable = max(total_amount - gst - tax - commission, 0.0)
+        identifier = row.get("id") if is_online else row.get("booking_id")
+
+        return cls(
+            type="online" if is_online else "direct",
+            property=prop,
+            booking_id=_text(row.get("booking_id") or row.get("id")),
+            db_id=str(identifier) if identifier is not None else "",
+            ota_booking_id=_text(row.get("ota_booking_id")) if is_online else "",
+            guest_name=_text(row.get("guest_name")),
+            mobile_no=_text(row.get("guest_phone") if is_online else row.get("mobile_no")),
+            total_pax=_int(row.get("total_pax")),
+            check_in=ci,
+            check_out=co,
+            days=days,
+            room_no=_text(row.get("room_no")).title(),
+            mob=_text(row.get("mode_of_booking") if is_online else row.get("mob")),
+            plan=_text(row.get("rate_plans") if is_online else row.get("breakfast")),
+            room_charges=room_charges,
+            gst=gst,
+            tax=tax,
+            total_amount=total_amount,
+            commission=commission,
+            receivable=receivable,
+            advance=_float(row.get("total_payment_made") if is_online else row.get("advance_amount")),
+            advance_mop=_text(row.get("advance_mop")),
+            balance=_float(row.get("balance_due") if is_online else row.get("balance_amount")),
+            balance_mop=_text(row.get("balance_mop")),
+            booking_status=_text(row.get("booking_status" if is_online else "plan_status")).title(),
+            payment_status=_text(row.get("payment_status")).title(),
+            submitted_by=_text(row.get("submitted_by")),
+            modified_by=_text(row.get("modified_by")),
+            remarks=_text(row.get("remarks")),
+            advance_remarks=_text(row.get("advance_remarks")),
+            balance_remarks=_text(row.get("balance_remarks")),
+            accounts_status=_text(row.get("accounts_status", "Pending")).title(),
+        )
+
+    @property
+    def has_stay(self) -> bool:
+        return self.check_out > self.check_in
+
+    @property
+    def is_confirmed(self) -> bool:
+        return self.booking_status in CONFIRMED_STATUSES
+
+    @property
+    def is_paid(self) -> bool:
+        return self.payment_status in PAID_STATUSES
+
+    @property
+    def pending(self) -> float:
+        return self.total_amount - self.advance - self.balance
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __repr__(self) -> str:
+        return f"Booking({self.type} {self.booking_id} {self.property} {self.check_in}→{self.check_out} rooms={self.room_no!r})"
+
+
+class RoomStay:
+    """One room of a booking on one day.
+
+    Replaces the per-room dict copies made during inventory assignment: only
+    the room-specific values are stored, everything else is read through from
+    the shared Booking.
+    """
+
+    __slots__ = ("booking", "room", "total_pax", "per_night", "is_primary")
+
+    def __init__(self, booking: Booking, room: str, total_pax: int, per_night: float, is_primary: bool):
+        self.booking = booking
+        self.room = room
+        self.total_pax = total_pax
+        self.per_night = per_night
+        self.is_primary = is_primary
+
+    @property
+    def room_no(self) -> str:
+        return self.room
+
+    @property
+    def assigned_room(self) -> str:
+        return self.room
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__") or name == "booking":
+            raise AttributeError(name)
+        return getattr(self.booking, name)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
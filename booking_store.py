@@ -0,0 +1,311 @@
+# booking_store.py - Process-wide booking cache shared by every report, refreshed incrementally
+import calendar
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import streamlit as st
+
+from booking_index import parse_stay_date
+from booking_model import DIRECT_COLUMNS, ONLINE_COLUMNS
+from supabase_paging import fetch_all
+
+Month = Tuple[int, int]
+
+TABLE_KEYS = {"reservations": "booking_id", "online_reservations": "id"}
+# Union of the columns the reports read (see the per-report DIRECT_COLUMNS / ONLINE_COLUMNS)
+TABLE_COLUMNS = {
+    "reservations": DIRECT_COLUMNS + ("booking_date",),
+    "online_reservations": ONLINE_COLUMNS + ("created_at",),
+}
+# Columns of the normalized (lower(guest_name), phone, room_no) duplicate-guest key
+GUEST_KEY_COLUMNS = {
+    "reservations": ("guest_name", "mobile_no", "room_no"),
+    "online_reservations": ("guest_name", "guest_phone", "room_no"),
+}
+SYNC_INTERVAL = 30        # seconds between incremental pulls per table
+FEED_SYNC_INTERVAL = 600  # the same while a change feed is pushing rows (see booking_feed.py)
+RELOAD_AFTER = 1800       # full reload of a month, catches hard deletes
+FALLBACK_RELOAD = 300     # full reload interval when the table has no updated_at column
+FETCH_WORKERS = 4         # concurrent Supabase requests while prefetching months
+
+
+def month_bounds(month: Month) -> Tuple[date, date]:
+    y, m = month
+    return date(y, m, 1), date(y, m, calendar.monthrange(y, m)[1])
+
+
+def months_between(start: date, end: date) -> List[Month]:
+    months, (y, m) = [], (start.year, start.month)
+    while (y, m) <= (end.year, end.month):
+        months.append((y, m))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return months
+
+
+def guest_key(guest_name: Any, phone: Any, room_no: Any) -> Tuple[str, str, str]:
+    return (str(guest_name or "").lower(), str(phone or ""), str(room_no or ""))
+
+
+class BookingStore:
+    """Raw reservation rows for every (table, month) any report has asked for.
+
+    A month holds the stays overlapping it (check_in <= last day and
+    check_out >= first day), which is the window every stay-based report
+    queries. Rows are held once per table however many months they span.
+    Changes are pulled with an updated_at high-water mark (see
+    sql/booking_updated_at.sql); months are fully reloaded every
+    RELOAD_AFTER seconds to drop hard-deleted rows. Without an updated_at
+    column the store falls back to reloading months every FALLBACK_RELOAD
+    seconds.
+    """
+
+    def __init__(self, client, sync_interval: float = SYNC_INTERVAL, reload_after: float = RELOAD_AFTER):
+        self.client = client
+        self.sync_interval = sync_interval
+        self._polled_interval = sync_interval
+        self.reload_after = reload_after
+        self._lock = threading.RLock()
+        self._rows: Dict[str, Dict[Any, Dict]] = {t: {} for t in TABLE_KEYS}
+        self._stays: Dict[str, Dict[Any, Tuple[date, date]]] = {t: {} for t in TABLE_KEYS}
+        self._by_month: Dict[str, Dict[Month, Set[Any]]] = {t: {} for t in TABLE_KEYS}
+        self._loaded: Dict[str, Dict[Month, float]] = {t: {} for t in TABLE_KEYS}
+        self._high_water: Dict[str, Optional[str]] = {t: None for t in TABLE_KEYS}
+        self._incremental: Dict[str, bool] = {t: True for t in TABLE_KEYS}
+        self._synced: Dict[str, float] = {t: 0.0 for t in TABLE_KEYS}
+        self._version: Dict[str, int] = {t: 0 for t in TABLE_KEYS}
+        self._month_version: Dict[str, Dict[Month, int]] = {t: {} for t in TABLE_KEYS}
+        self._guest_index: Dict[str, Dict[Tuple[str, str, str], List[Any]]] = {t: {} for t in TABLE_KEYS}
+        self._guest_index_version: Dict[str, int] = {t: -1 for t in TABLE_KEYS}
+
+    # ────── Reads ──────
+    def rows(self, table: str, start: date, end: date, where: Optional[Dict[str, Iterable]] = None) -> List[Dict]:
+        """Copies of the rows whose stay overlaps [start, end], ordered by primary key.
+
+        where maps a column to its allowed values, like .in_() on a query.
+        """
+        allowed = {col: set(values) for col, values in (where or {}).items()}
+        with self._lock:
+            months = months_between(start, end)
+            for month in months:
+                if month not in self._loaded[table]:
+                    self._load_month(table, month)
+            self.sync(table)
+
+            keys = set().union(*(self._by_month[table].get(m, set()) for m in months))
+            out = []
+            for key in sorted(keys):
+                ci, co = self._stays[table][key]
+                row = self._rows[table][key]
+                if ci <= end and co >= start and all(row.get(col) in vals for col, vals in allowed.items()):
+                    out.append(dict(row))
+            return out
+
+    def find_guest(self, table: str, guest_name: str, phone: str, room_no: str) -> List[Dict]:
+        """Copies of the held rows with this (lower(guest_name), phone, room_no) key, ordered by primary key.
+
+        Only rows in months already loaded are seen; the hash index is rebuilt
+        lazily after the table changes.
+        """
+        with self._lock:
+            if self._guest_index_version[table] != self._version[table]:
+                index: Dict[Tuple[str, str, str], List[Any]] = {}
+                for key, row in self._rows[table].items():
+                    index.setdefault(guest_key(*(row.get(c) for c in GUEST_KEY_COLUMNS[table])), []).append(key)
+                self._guest_index[table] = index
+                self._guest_index_version[table] = self._version[table]
+            keys = self._guest_index[table].get(guest_key(guest_name, phone, room_no), [])
+            return [dict(self._rows[table][k]) for k in sorted(keys)]
+
+    def version(self, table: str) -> int:
+        """Bumped whenever rows of the table change; usable as a cache key for derived data."""
+        return self._version[table]
+
+    def versions(self, start: date, end: date) -> Tuple[int, ...]:
+        """Per-table, per-month change counters over start..end.
+
+        Only months whose rows actually changed move, so data derived from
+        start..end can be keyed on this without going stale whenever a booking
+        in another month is edited.
+        """
+        months = months_between(start, end)
+        with self._lock:
+            return tuple(self._month_version[t].get(m, 0) for t in TABLE_KEYS for m in months)
+
+    # ────── Refresh ──────
+    def sync(self, table: str, force: bool = False):
+        """Pull rows changed since the high-water mark and reload months past their age limit."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._synced[table] < self.sync_interval:
+                return
+            self._synced[table] = now
+            if not self._loaded[table]:
+                return
+
+            if self._incremental[table] and self._high_water[table]:
+                try:
+                    changed = self._fetch(table, lambda q: q.gte("updated_at", self._high_water[table]))
+                    self._apply(table, changed, advance=True)
+                except Exception as e:
+                    logging.warning(f"BookingStore: incremental sync of {table} failed, using full reloads: {e}")
+                    self._incremental[table] = False
+
+            for month in list(self._loaded[table]):
+                if self._due(table, month, now):
+                    self._load_month(table, month)
+
+    def prefetch(self, start: date, end: date, tables: Iterable[str] = ()):
+        """Load the months of start..end that are missing or due for reload, concurrently.
+
+        Multi-property reports call this before their per-property loops, so a
+        cold store loads every (table, month) at once on up to FETCH_WORKERS
+        threads instead of one after another on the first rows() calls.
+        """
+        tables = tuple(tables) or tuple(TABLE_KEYS)
+        with self._lock:
+            now = time.monotonic()
+            due = [(t, m) for t in tables for m in months_between(start, end) if self._due(t, m, now)]
+            # A table's first load seeds its high-water mark, so it must finish before the
+            # table's other months are fetched (see _store_month)
+            first = []
+            for table in tables:
+                pending = [tm for tm in due if tm[0] == table]
+                if pending and self._high_water[table] is None:
+                    first.append(pending[0])
+        for wave in (first, [tm for tm in due if tm not in first]):
+            if not wave:
+                continue
+            with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(wave))) as pool:
+                fetched = list(pool.map(lambda tm: self._fetch_month(*tm), wave))
+            with self._lock:
+                now = time.monotonic()
+                for (table, month), rows in zip(wave, fetched):
+                    if self._due(table, month, now):  # unless a rows() call loaded it meanwhile
+                        self._store_month(table, month, rows)
+
+    def apply_change(self, table: str, event: str, record: Optional[Dict] = None,
+                     old_record: Optional[Dict] = None) -> List[Tuple[date, date]]:
+        """Apply one pushed INSERT / UPDATE / DELETE; returns the stays it touched, before and after."""
+        key_col = TABLE_KEYS[table]
+        record, old_record = record or {}, old_record or {}
+        key = record.get(key_col, old_record.get(key_col))
+        if key is None:
+            return []
+        with self._lock:
+            touched = [self._stays[table][key]] if key in self._stays[table] else []
+            if event == "DELETE":
+                self._discard(table, key)
+                return touched
+            columns = TABLE_COLUMNS[table] + ("updated_at",)
+            self._apply(table, [{c: record[c] for c in columns if c in record}])
+            if key in self._stays[table]:
+                touched.append(self._stays[table][key])
+            return touched
+
+    def feed_connected(self, connected: bool):
+        """Poll rarely while a change feed keeps the store current, normally again once it drops."""
+        with self._lock:
+            self.sync_interval = max(self._polled_interval, FEED_SYNC_INTERVAL) if connected else self._polled_interval
+
+    def invalidate(self, start: Optional[date] = None, end: Optional[date] = None, tables: Iterable[str] = ()):
+        """Mark the held months overlapping start..end (all when not given) for reload on their next read."""
+        months = set(months_between(start, end)) if start and end else None
+        with self._lock:
+            for table in tables or tuple(TABLE_KEYS):
+                for month in self._loaded[table]:
+                    if months is None or month in months:
+                        self._loaded[table][month] = float("-inf")
+                self._synced[table] = 0.0
+
+    def _due(self, table: str, month: Month, now: float) -> bool:
+        loaded_at = self._loaded[table].get(month)
+        max_age = self.reload_after if self._incremental[table] else FALLBACK_RELOAD
+        return loaded_at is None or now - loaded_at > max_age
+
+    def _load_month(self, table: str, month: Month):
+        self._store_month(table, month, self._fetch_month(table, month))
+
+    def _fetch_month(self, table: str, month: Month) -> List[Dict]:
+        first, last = month_bounds(month)
+        return self._fetch(table, lambda q: q.lte("check_in", str(last)).gte("check_out", str(first)))
+
+    def _store_month(self, table: str, month: Month, fresh: List[Dict]):
+        key_col = TABLE_KEYS[table]
+        fresh_keys = {r.get(key_col) for r in fresh}
+        # Rows that left this month were deleted or moved; moved rows come back through sync
+        for key in self._by_month[table].get(month, set()) - fresh_keys:
+            self._discard(table, key)
+        self._loaded[table][month] = time.monotonic()
+        self._by_month[table].setdefault(month, set())
+        # Only the first load seeds the high-water mark; later month loads must not skip
+        # past changes in months already held
+        self._apply(table, fresh, advance=self._high_water[table] is None)
+
+    def _fetch(self, table: str, window: Callable) -> List[Dict]:
+        columns = TABLE_COLUMNS[table] + (("updated_at",) if self._incremental[table] else ())
+        try:
+            return fetch_all(self.client, table, columns, key=TABLE_KEYS[table], where=window)
+        except Exception as e:
+            if "updated_at" not in columns:
+                raise
+            logging.warning(f"BookingStore: {table} has no usable updated_at column, using full reloads: {e}")
+            self._incremental[table] = False
+            return self._fetch(table, window)
+
+    # ────── Row bookkeeping ──────
+    def _apply(self, table: str, rows: List[Dict], advance: bool = False):
+        key_col = TABLE_KEYS[table]
+        changed = False
+        for row in rows:
+            key = row.get(key_col)
+            if key is None:
+                continue
+            ci, co = parse_stay_date(row.get("check_in")), parse_stay_date(row.get("check_out"))
+            stamp = row.get("updated_at")
+            if advance and stamp and (self._high_water[table] is None or str(stamp) > self._high_water[table]):
+                self._high_water[table] = str(stamp)
+            months = [m for m in months_between(ci, co) if m in self._loaded[table]] if ci and co else []
+            added = [m for m in months if key not in self._by_month[table].get(m, ())]
+            if row == self._rows[table].get(key):
+                # Rows already held as they are (the high-water overlap, reloads) leave the versions
+                # alone; a newly loaded month only bumps that month
+                for m in added:
+                    self._by_month[table][m].add(key)
+                self._bump_months(table, added)
+                changed = changed or bool(added)
+                continue
+            self._discard(table, key)
+            if not months:
+                continue
+            self._rows[table][key] = row
+            self._stays[table][key] = (ci, co)
+            for m in months:
+                self._by_month[table][m].add(key)
+            self._bump_months(table, months)
+            changed = True
+        if changed:
+            self._version[table] += 1
+
+    def _discard(self, table: str, key: Any):
+        if key not in self._rows[table]:
+            return
+        ci, co = self._stays[table].pop(key)
+        del self._rows[table][key]
+        for m in months_between(ci, co):
+            self._by_month[table].get(m, set()).discard(key)
+        self._bump_months(table, months_between(ci, co))
+        self._version[table] += 1
+
+    def _bump_months(self, table: str, months: Iterable[Month]):
+        for m in months:
+            self._month_version[table][m] = self._month_version[table].get(m, 0) + 1
+
+
+@st.cache_resource
+def get_booking_store(_client) -> BookingStore:
+    """The booking store shared by every session in this server process."""
+    return BookingStore(_client)
@@ -0,0 +1,90 @@
+# cache_registry.py - Which cached report data was built from which property and month
+import threading
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+import streamlit as st
+
+from booking_index import parse_stay_date
+from booking_store import Month, get_booking_store, months_between
+
+Entry = Tuple[Callable, tuple]
+
+
+class CacheRegistry:
+    """Dependency registry for st.cache_data entries.
+
+    Callers register each cached call with the properties and date range it
+    was computed from; write paths and refresh buttons then clear only the
+    entries overlapping what changed, via CachedFunc.clear(*args), instead of
+    st.cache_data.clear() wiping every cached query for every session.
+    Entries registered without properties or dates (loaders of every booking,
+    or of a booking-date window) are cleared by any invalidation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._deps: Dict[Tuple[str, Month], Set[Entry]] = {}
+        self._any: Set[Entry] = set()
+
+    def register(self, func: Callable, args: tuple, properties: Optional[Iterable[str]] = None,
+                 start: Optional[date] = None, end: Optional[date] = None):
+        if properties is None or not (start and end):
+            with self._lock:
+                self._any.add((func, args))
+            return
+        months = months_between(start, end)
+        with self._lock:
+            for prop in properties:
+                for month in months:
+                    self._deps.setdefault((prop, month), set()).add((func, args))
+
+    def invalidate(self, properties: Optional[Iterable[str]] = None,
+                   start: Optional[date] = None, end: Optional[date] = None) -> int:
+        """Clear the entries depending on any of the properties (all when None) over start..end (all when not given)."""
+        props = set(properties) if properties is not None else None
+        months = set(months_between(start, end)) if start and end else None
+        with self._lock:
+            hit = [scope for scope in self._deps
+                   if (props is None or scope[0] in props) and (months is None or scope[1] in months)]
+            entries = set().union(self._any, *(self._deps.pop(scope) for scope in hit))
+            self._any.clear()
+            for scope, deps in list(self._deps.items()):
+                deps -= entries
+                if not deps:
+                    del self._deps[scope]
+        for func, args in entries:
+            func.clear(*args)
+        return len(entries)
+
+
+@st.cache_resource
+def get_cache_registry() -> CacheRegistry:
+    """The registry shared by every session in this server process."""
+    return CacheRegistry()
+
+
+def invalidate_bookings(client, properties: Optional[Iterable[str]] = None,
+                        start: Optional[date] = None, end: Optional[date] = None):
+    """Drop cached booking data for the properties and date range after a write or a refresh.
+
+    Registered report caches are cleared per property; the shared booking
+    store reloads the affected months, which it holds for all properties.
+    """
+    get_cache_registry().invalidate(properties, start, end)
+    get_booking_store(client).invalidate(start, end)
+
+
+def invalidate_stays(client, *stays: Tuple[Any, Any]):
+    """invalidate_bookings over the months of each (check_in, check_out) a write touched.
+
+    Every property is cleared for those months, since written rows carry the
+    stored property name while cache entries are registered under report
+    names. A stay without parseable dates clears everything.
+    """
+    for check_in, check_out in stays:
+        ci, co = parse_stay_date(check_in), parse_stay_date(check_out)
+        if not ci or not co:
+            invalidate_bookings(client)
+            return
+        invalidate_bookings(client, None, min(ci, co), max(ci, co))
@@ -5,6 +5,8 @@ from datetime import date, datetime
 import pandas as pd
 import calendar
 from io import BytesIO
+from booking_store import get_booking_store
+from cache_registry import invalidate_bookings
 
 # Initialize Supabase client
 try:
@@ -135,56 +137,13 @@ TABLE_CSS = """
 <link rel="stylesheet" type="text/css" href="https://cdn.datatables.net/buttons/2.2.2/css/buttons.dataTables.min.css">
 """
 
-def load_direct_reservations_from_supabase():
-    """Load ALL direct reservations without any limits using pagination"""
+def load_checkins_in_window(table, first_day, last_day):
+    """Rows checking in between first_day and last_day (inclusive), from the shared booking store"""
     try:
-        all_data = []
-        page_size = 1000
-        offset = 0
-        
-        while True:
-            response = supabase.table("reservations")\
-                .select("*")\
-                .range(offset, offset + page_size - 1)\
-                .execute()
-            
-            if response.data:
-                all_data.extend(response.data)
-                if len(response.data) < page_size:
-                    break
-                offset += page_size
-            else:
-                break
-        
-        return all_data
-    except Exception as e:
-        st.error(f"Error loading direct reservations: {e}")
-        return []
-
-def load_online_reservations_from_supabase():
-    """Load ALL online reservations without any limits using pagination"""
-    try:
-        all_data = []
-        page_size = 1000
-        offset = 0
-        
-        while True:
-            response = supabase.table("online_reservations")\
-                .select("*")\
-                .range(offset, offset + page_size - 1)\
-                .execute()
-            
-            if response.data:
-                all_data.extend(response.data)
-                if len(response.data) < page_size:
-                    break
-                offset += page_size
-            else:
-                break
-        
-        return all_data
+        rows = get_booking_store(supabase).rows(table, first_day, last_day)
+        return [r for r in rows if str(r.get("check_in"))[:10] >= str(first_day)]
     except Exception as e:
-        st.error(f"Error loading online reservations: {e}")
+        st.error(f"Error loading {table}: {e}")
         return []
 
 def safe_date_parse(date_str):
@@ -402,25 +361,18 @@ def convert_df_to_excel(df):
         df.to_excel(writer, index=False, sheet_name='Check-ins')
     return output.getvalue()
 
-@st.cache_data(ttl=300)
-def cached_load_online_reservations():
-    return load_online_reservations_from_supabase()
+def cached_load_online_reservations(first_day, last_day):
+    return load_checkins_in_window("online_reservations", first_day, last_day)
 
-@st.cache_data(ttl=300)
-def cached_load_direct_reservations():
-    return load_direct_reservations_from_supabase()
+def cached_load_direct_reservations(first_day, last_day):
+    return load_checkins_in_window("reservations", first_day, last_day)
 
 def show_checkin_date_report():
     """Main function to display the check-in date-wise report"""
     st.title("Date-wise Check-in Report (All Properties)")
     st.markdown("**This report shows all bookings across all properties based on their check-in dates.**")
 
-    if st.button("Refresh Bookings"):
-        # Clear only the specific cached functions instead of all cache
-        cached_load_online_reservations.clear()
-        cached_load_direct_reservations.clear()
-        st.success("Cache cleared! Refreshing bookings...")
-        st.rerun()
+    refresh = st.button("Refresh Bookings")
 
     # Filters Row 1
     col1, col2 = st.columns(2)
@@ -432,9 +384,14 @@ def show_checkin_date_report():
     with col2:
         month = st.selectbox("Select Month", list(range(1, 13)), index=date.today().month - 1)
 
-    # Load ALL bookings
-    online_bookings = cached_load_online_reservations()
-    direct_bookings = cached_load_direct_reservations()
+    # Load only bookings checking in during the selected month
+    first_day = date(year, month, 1)
+    last_day = date(year, month, calendar.monthrange(year, month)[1])
+    if refresh:
+        invalidate_bookings(supabase, None, first_day, last_day)
+        st.success("Cache cleared! Refreshing bookings...")
+    online_bookings = cached_load_online_reservations(first_day, last_day)
+    direct_bookings = cached_load_direct_reservations(first_day, last_day)
 
     st.info(f"Total records loaded: Online={len(online_bookings)}, Direct={len(direct_bookings)}")
 
@@ -3,6 +3,10 @@ import pandas as pd
 from datetime import date, timedelta
 from supabase import create_client, Client
 import logging
+from booking_index import StayIndex
+from booking_model import Booking
+from booking_store import get_booking_store
+from cache_registry import invalidate_bookings
 
 # === CONFIG ===
 logging.basicConfig(
@@ -69,46 +73,26 @@ def sanitize_string(value, default="Unknown"):
     return str(value).strip() if value is not None else default
 
 def normalize_booking(booking, is_online):
-    booking_id = sanitize_string(booking.get('booking_id'))
-    payment_status = sanitize_string(booking.get('payment_status')).title()
-    if payment_status not in ["Fully Paid", "Partially Paid"]:
-        return None
     try:
-        check_in = date.fromisoformat(booking.get('check_in')) if booking.get('check_in') else None
-        check_out = date.fromisoformat(booking.get('check_out')) if booking.get('check_out') else None
-        if not check_in or not check_out:
+        b = Booking.from_row(booking, is_online, lambda name: property_mapping.get(name, name))
+        if b is None or not b.is_paid:
             return None
-        days = (check_out - check_in).days
-        if days <= 0: days = 1
-        property_name = sanitize_string(booking.get('property', booking.get('property_name', '')))
-        property_name = property_mapping.get(property_name, property_name)
-        room_no = sanitize_string(booking.get('room_no', '')).title()
-        return {
-            "property": property_name,
-            "booking_id": booking_id,
-            "check_in": str(check_in),
-            "check_out": str(check_out),
-            "days": days,
-            "room_no": room_no,
-            "payment_status": payment_status
-        }
+        return b
     except Exception as e:
-        logging.warning(f"Error normalizing booking {booking_id}: {e}")
+        logging.warning(f"Error normalizing booking {sanitize_string(booking.get('booking_id'))}: {e}")
         return None
 
 def load_bookings_for_date_range(start_date, end_date):
     all_bookings = []
     try:
-        online_response = supabase.table("online_reservations").select("*") \
-            .gte("check_in", str(start_date)).lte("check_out", str(end_date)).execute()
-        for b in (online_response.data or []):
-            norm = normalize_booking(b, True)
-            if norm: all_bookings.append(norm)
-        direct_response = supabase.table("reservations").select("*") \
-            .gte("check_in", str(start_date)).lte("check_out", str(end_date)).execute()
-        for b in (direct_response.data or []):
-            norm = normalize_booking(b, False)
-            if norm: all_bookings.append(norm)
+        store = get_booking_store(supabase)
+        for table, is_online in (("online_reservations", True), ("reservations", False)):
+            for b in store.rows(table, start_date, end_date):
+                # Stays wholly inside the window
+                if str(b["check_in"])[:10] < str(start_date) or str(b["check_out"])[:10] > str(end_date):
+                    continue
+                norm = normalize_booking(b, is_online)
+                if norm: all_bookings.append(norm)
         logging.info(f"Loaded {len(all_bookings)} bookings for {start_date} to {end_date}")
         return all_bookings
     except Exception as e:
@@ -116,16 +100,13 @@ def load_bookings_for_date_range(start_date, end_date):
         logging.error(f"Error loading bookings: {e}")
         return []
 
-def filter_bookings_for_day(bookings, target_date):
-    return [b for b in bookings if date.fromisoformat(b["check_in"]) <= target_date < date.fromisoformat(b["check_out"])]
-
 def count_rooms_sold(bookings, property_name):
     inventory = PROPERTY_INVENTORY.get(property_name, {"all": []})["all"]
     inventory_lower = [i.lower() for i in inventory]
     rooms_sold = 0
     for b in bookings:
-        if b["property"] != property_name: continue
-        rooms = [r.strip().title() for r in b.get('room_no', '').split(',') if r.strip()]
+        if b.property != property_name: continue
+        rooms = [r.strip().title() for r in b.room_no.split(',') if r.strip()]
         if all(r.lower() in inventory_lower for r in rooms):
             rooms_sold += len(rooms)
     return rooms_sold
@@ -133,7 +114,7 @@ def count_rooms_sold(bookings, property_name):
 def get_dashboard_data():
     today = date.today()
     dates = [today - timedelta(days=1), today, today + timedelta(days=1), today + timedelta(days=2)]
-    all_bookings = load_bookings_for_date_range(dates[0], dates[3])
+    all_bookings = StayIndex(load_bookings_for_date_range(dates[0], dates[3]))
     properties = sorted(PROPERTY_INVENTORY.keys())
     data = []
     for prop in properties:
@@ -141,7 +122,7 @@ def get_dashboard_data():
         row = {"Property Name": prop, "Total Inventory": total_inv}
         for d in dates:
             d_str = d.strftime('%Y-%m-%d')
-            sold = count_rooms_sold(filter_bookings_for_day(all_bookings, d), prop)
+            sold = count_rooms_sold(all_bookings.active_on(d), prop)
             row[f"{d_str} Sold"] = sold
         data.append(row)
     return data, dates, all_bookings
@@ -182,7 +163,8 @@ def show_dashboard():
 
     # === REFRESH BUTTON ===
     if st.button("Refresh Dashboard Data"):
-        st.cache_data.clear()
+        today = date.today()
+        invalidate_bookings(supabase, None, today - timedelta(days=1), today + timedelta(days=2))
         st.rerun()
 
     try:
@@ -244,7 +226,7 @@ def show_dashboard():
                 total_inv = get_total_inventory(prop)
                 row = {"Property": prop, "Total Inv": total_inv}
                 for d in dates:
-                    sold = count_rooms_sold(filter_bookings_for_day(all_bookings, d), prop)
+                    sold = count_rooms_sold(all_bookings.active_on(d), prop)
                     unsold = total_inv - sold
                     d_label = d.strftime('%b %d')
                     row[f"{d_label} Sold"] = sold
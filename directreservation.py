@@ -3,6 +3,9 @@ import pandas as pd
 import plotly.express as px
 from datetime import datetime, date, timedelta
 from supabase import create_client, Client
+from utils import allocate_booking_ids, find_duplicate_guests
+from supabase_paging import iter_pages
+from cache_registry import invalidate_stays
 
 # Initialize Supabase client
 try:
@@ -192,32 +195,22 @@ def load_active_property_room_map():
     return full_map
 
 def generate_booking_id():
-    """Generate a unique booking ID by checking existing IDs in Supabase."""
+    """Generate a unique booking ID from the per-day allocator in Supabase."""
     try:
-        today = datetime.now().strftime('%Y%m%d')
-        response = supabase.table("reservations").select("booking_id").like("booking_id", f"TIE{today}%").execute()
-        existing_ids = [record["booking_id"] for record in response.data]
-        sequence = 1
-        while f"TIE{today}{sequence:03d}" in existing_ids:
-            sequence += 1
-        return f"TIE{today}{sequence:03d}"
+        return allocate_booking_ids(supabase, "reservations")[0]
     except Exception as e:
         st.error(f"Error generating booking ID: {e}")
         return None
 
-def check_duplicate_guest(guest_name, mobile_no, room_no, exclude_booking_id=None, mob=None):
+def check_duplicate_guest(guest_name, mobile_no, room_no, exclude_booking_id=None, mob=None, check_in=None, check_out=None):
     """Check for duplicate guest based on name, mobile number, and room number, allowing 'Stay-back' if MOB differs."""
     try:
-        response = supabase.table("reservations").select("*").execute()
-        for reservation in response.data:
-            if exclude_booking_id and reservation["booking_id"] == exclude_booking_id:
+        matches = find_duplicate_guests(supabase, "reservations", guest_name, mobile_no, room_no,
+                                        exclude_booking_id, check_in, check_out)
+        for reservation in matches:
+            if mob == "Stay-back" and reservation["mob"] != "Stay-back":
                 continue
-            if (reservation["guest_name"].lower() == guest_name.lower() and
-                    reservation["mobile_no"] == mobile_no and
-                    reservation["room_no"] == room_no):
-                if mob == "Stay-back" and reservation["mob"] != "Stay-back":
-                    continue
-                return True, reservation["booking_id"]
+            return True, reservation["booking_id"]
         return False, None
     except Exception as e:
         st.error(f"Error checking duplicate guest: {e}")
@@ -248,16 +241,9 @@ def load_reservations_from_supabase():
     """Load ALL reservations from Supabase with pagination, handling potential None values."""
     try:
         reservations = []
-        page_size = 1000
-        start = 0
         
-        while True:
-            response = supabase.table("reservations").select("*").order("booking_id", desc=True).range(start, start + page_size - 1).execute()
-            
-            if not response.data:
-                break
-            
-            for record in response.data:
+        for page in iter_pages(supabase, "reservations", key="booking_id", descending=True):
+            for record in page:
                 reservation = {
                     "Booking ID": record["booking_id"],
                     "Property Name": record["property_name"] or "",
@@ -292,13 +278,6 @@ def load_reservations_from_supabase():
                     "Payment Status": record.get("payment_status", "Not Paid")
                 }
                 reservations.append(reservation)
-            
-            # If we got less than page_size records, we've reached the end
-            if len(response.data) < page_size:
-                break
-            
-            # Move to next page
-            start += page_size
         
         print(f"✅ Loaded {len(reservations)} reservations from Supabase")
         return reservations
@@ -344,6 +323,7 @@ def save_reservation_to_supabase(reservation):
         }
         response = supabase.table("reservations").insert(supabase_reservation).execute()
         if response.data:
+            invalidate_stays(supabase, (supabase_reservation["check_in"], supabase_reservation["check_out"]))
             st.session_state.reservations = load_reservations_from_supabase()
             return True
         return False
@@ -387,8 +367,11 @@ def update_reservation_in_supabase(booking_id, updated_reservation):
             "remarks": updated_reservation["Remarks"],
             "payment_status": updated_reservation["Payment Status"]
         }
+        # The stay before the edit, so cached reports of the months it leaves are cleared too
+        previous = supabase.table("reservations").select("check_in, check_out").eq("booking_id", booking_id).execute().data or []
         response = supabase.table("reservations").update(supabase_reservation).eq("booking_id", booking_id).execute()
         if response.data:
+            invalidate_stays(supabase, *((r.get("check_in"), r.get("check_out")) for r in previous + response.data))
             return True
         return False
     except Exception as e:
@@ -400,6 +383,7 @@ def delete_reservation_in_supabase(booking_id):
     try:
         response = supabase.table("reservations").delete().eq("booking_id", booking_id).execute()
         if response.data:
+            invalidate_stays(supabase, *((r.get("check_in"), r.get("check_out")) for r in response.data))
             return True
         return False
     except Exception as e:
@@ -622,14 +606,15 @@ def show_new_reservation_form():
             elif no_of_days < 0:
                 st.error("❌ Number of days cannot be negative")
             else:
-                booking_id = generate_booking_id()
-                if not booking_id:
-                    st.error("❌ Failed to generate booking ID")
+                mob_value = custom_mob if mob == "Others" else mob
+                is_duplicate, existing_booking_id = check_duplicate_guest(guest_name, mobile_no, room_no.strip(), mob=mob_value, check_in=check_in, check_out=check_out)
+                if is_duplicate:
+                    st.error(f"❌ Guest already exists! Booking ID: {existing_booking_id}")
                 else:
-                    mob_value = custom_mob if mob == "Others" else mob
-                    is_duplicate, existing_booking_id = check_duplicate_guest(guest_name, mobile_no, room_no.strip(), mob=mob_value)
-                    if is_duplicate:
-                        st.error(f"❌ Guest already exists! Booking ID: {existing_booking_id}")
+                    # Allocated last: every call takes the next number of the day's sequence for good
+                    booking_id = generate_booking_id()
+                    if not booking_id:
+                        st.error("❌ Failed to generate booking ID")
                     else:
                         new_reservation = {
                             "Property Name": property_name,
@@ -948,7 +933,7 @@ def show_edit_form(edit_index):
                     st.error("❌ Number of days cannot be negative")
                 else:
                     mob_value = custom_mob if mob == "Others" else mob
-                    is_duplicate, existing_booking_id = check_duplicate_guest(guest_name, mobile_no, room_no.strip(), exclude_booking_id=reservation["Booking ID"], mob=mob_value)
+                    is_duplicate, existing_booking_id = check_duplicate_guest(guest_name, mobile_no, room_no.strip(), exclude_booking_id=reservation["Booking ID"], mob=mob_value, check_in=check_in, check_out=check_out)
                     if is_duplicate:
                         st.error(f"❌ Guest already exists! Booking ID: {existing_booking_id}")
                     else:
@@ -4,6 +4,9 @@ from supabase import create_client, Client
 from datetime import date, timedelta, datetime
 import pandas as pd
 import calendar
+from booking_index import StayIndex
+from booking_store import get_booking_store
+from cache_registry import invalidate_bookings
 
 # Initialize Supabase client
 try:
@@ -73,56 +76,21 @@ TABLE_CSS = """
 </style>
 """
 
-def load_direct_reservations_from_supabase():
-    """Load ALL direct reservations without any limits using pagination"""
-    try:
-        all_data = []
-        page_size = 1000
-        offset = 0
-        
-        while True:
-            response = supabase.table("reservations")\
-                .select("*")\
-                .range(offset, offset + page_size - 1)\
-                .execute()
-            
-            if response.data:
-                all_data.extend(response.data)
-                if len(response.data) < page_size:
-                    break
-                offset += page_size
-            else:
-                break
-        
-        return all_data
-    except Exception as e:
-        st.error(f"Error loading direct reservations: {e}")
-        return []
+# Statuses always listed in the DMS; "Confirmed" is listed only while "Not Paid"
+DMS_OPEN_STATUSES = ["Pending", "Follow-up", "ON_HOLD", "On Hold"]
 
-def load_online_reservations_from_supabase():
-    """Load ALL online reservations without any limits using pagination"""
+def load_dms_reservations(table, status_field, first_day, last_day):
+    """Follow-up bookings from one table that are in-house on any night between first_day and last_day"""
     try:
-        all_data = []
-        page_size = 1000
-        offset = 0
-        
-        while True:
-            response = supabase.table("online_reservations")\
-                .select("*")\
-                .range(offset, offset + page_size - 1)\
-                .execute()
-            
-            if response.data:
-                all_data.extend(response.data)
-                if len(response.data) < page_size:
-                    break
-                offset += page_size
-            else:
-                break
-        
-        return all_data
+        rows = get_booking_store(supabase).rows(table, first_day, last_day,
+                                                where={status_field: DMS_OPEN_STATUSES + ["Confirmed"]})
+        return [
+            r for r in rows
+            if str(r.get("check_out"))[:10] > str(first_day)
+            and (r.get(status_field) != "Confirmed" or r.get("payment_status") == "Not Paid")
+        ]
     except Exception as e:
-        st.error(f"Error loading online reservations: {e}")
+        st.error(f"Error loading {table} for DMS: {e}")
         return []
 
 # ROBUST DATE PARSING – THIS FIXES LA ANTILIA & ALL DATES
@@ -155,19 +123,6 @@ def should_show_in_dms(booking):
         return payment == "Not Paid"
     return False
 
-def filter_bookings_for_day(bookings, target_date):
-    """Filter bookings that are active on the target date"""
-    filtered = []
-    for b in bookings:
-        if not should_show_in_dms(b):
-            continue
-        ci = safe_date_parse(b.get("check_in"))
-        co = safe_date_parse(b.get("check_out"))
-        if ci and co and ci <= target_date < co:
-            b["source"] = "direct" if "property_name" in b else "online"
-            filtered.append(b)
-    return filtered
-
 def create_bookings_table(bookings):
     columns = [
         "Source", "Booking ID", "Guest Name", "Mobile No", "Check-in Date", "Check-out Date", "Room No",
@@ -203,29 +158,28 @@ def create_bookings_table(bookings):
             df[col] = df[col].apply(lambda x: f'<span title="{x}">{x}</span>' if pd.notna(x) and str(x).strip() else x)
     return df
 
-@st.cache_data(ttl=300)
-def cached_load_online_reservations():
-    return load_online_reservations_from_supabase()
+def cached_load_online_reservations(first_day, last_day):
+    return load_dms_reservations("online_reservations", "booking_status", first_day, last_day)
 
-@st.cache_data(ttl=300)
-def cached_load_direct_reservations():
-    return load_direct_reservations_from_supabase()
+def cached_load_direct_reservations(first_day, last_day):
+    return load_dms_reservations("reservations", "plan_status", first_day, last_day)
 
 def show_dms():
     st.title("Daily Management Status")
 
-    if st.button("Refresh Bookings"):
-        st.cache_data.clear()
-        st.success("Cache cleared! Refreshing bookings...")
-        st.rerun()
+    refresh = st.button("Refresh Bookings")
 
     current_year = date.today().year
     year = st.selectbox("Select Year", list(range(current_year - 5, current_year + 6)), index=5)
     month = st.selectbox("Select Month", list(range(1, 13)), index=date.today().month - 1)
 
-    # Load ALL bookings without date restrictions
-    online_bookings = cached_load_online_reservations()
-    direct_bookings = cached_load_direct_reservations()
+    # Load only follow-up bookings in-house during the selected month
+    month_dates = generate_month_dates(year, month)
+    if refresh:
+        invalidate_bookings(supabase, None, month_dates[0], month_dates[-1])
+        st.success("Cache cleared! Refreshing bookings...")
+    online_bookings = cached_load_online_reservations(month_dates[0], month_dates[-1])
+    direct_bookings = cached_load_direct_reservations(month_dates[0], month_dates[-1])
 
     # Debug info to see what's being loaded
     st.info(f"Total records loaded: Online={len(online_bookings)}, Direct={len(direct_bookings)}")
@@ -244,7 +198,7 @@ def show_dms():
             b["property_name"] = property_mapping.get(b["property_name"], b["property_name"])
 
     if not online_bookings and not direct_bookings:
-        st.info("No reservations available.")
+        st.info(f"No bookings requiring follow-up in {calendar.month_name[month]} {year}.")
         return
 
     # Get all properties
@@ -264,17 +218,18 @@ def show_dms():
 
     for prop in all_properties:
         with st.expander(f"{prop}", expanded=False):
-            month_dates = generate_month_dates(year, month)
-
             # Filter only relevant bookings using the correct logic
             relevant_online = [b for b in online_bookings if b.get("property") == prop and should_show_in_dms(b)]
             relevant_direct = [b for b in direct_bookings if b.get("property_name") == prop and should_show_in_dms(b)]
             relevant_all = relevant_online + relevant_direct
+            for b in relevant_all:
+                b["source"] = "direct" if "property_name" in b else "online"
+            stays = StayIndex(relevant_all, parse=safe_date_parse)
 
             st.info(f"Total bookings requiring follow-up: **{len(relevant_all)}** (Online: {len(relevant_online)}, Direct: {len(relevant_direct)})")
 
             for day in month_dates:
-                daily_bookings = filter_bookings_for_day(relevant_all, day)
+                daily_bookings = stays.active_on(day)
                 st.subheader(f"{prop} - {day.strftime('%B %d, %Y')}")
 
                 if daily_bookings:
@@ -3,6 +3,8 @@ import pandas as pd
 from datetime import date
 from supabase import create_client, Client
 from utils import safe_int, safe_float
+from supabase_paging import fetch_all, iter_pages
+from cache_registry import invalidate_stays
 
 # Initialize Supabase client
 try:
@@ -34,7 +36,11 @@ def update_online_reservation_in_supabase(booking_id, updated_reservation):
         if "remarks" in truncated_reservation:
             truncated_reservation["remarks"] = str(truncated_reservation["remarks"]).strip()[:500] if truncated_reservation["remarks"] else ""
         
+        # The stay before the edit, so cached reports of the months it leaves are cleared too
+        previous = supabase.table("online_reservations").select("check_in, check_out").eq("booking_id", booking_id).execute().data or []
         response = supabase.table("online_reservations").update(truncated_reservation).eq("booking_id", booking_id).execute()
+        if response.data:
+            invalidate_stays(supabase, *((r.get("check_in"), r.get("check_out")) for r in previous + response.data))
         return bool(response.data)
     except Exception as e:
         st.error(f"Error updating online reservation {booking_id}: {e}")
@@ -46,6 +52,8 @@ def delete_online_reservation_in_supabase(booking_id):
         # Trim booking_id before delete
         booking_id = booking_id.strip()
         response = supabase.table("online_reservations").delete().eq("booking_id", booking_id).execute()
+        if response.data:
+            invalidate_stays(supabase, *((r.get("check_in"), r.get("check_out")) for r in response.data))
         return bool(response.data)
     except Exception as e:
         st.error(f"Error deleting online reservation {booking_id}: {e}")
@@ -54,23 +62,7 @@ def delete_online_reservation_in_supabase(booking_id):
 def load_online_reservations_from_supabase():
     """Load ALL online reservations from Supabase without any limit using pagination."""
     try:
-        all_data = []
-        page_size = 1000
-        offset = 0
-        
-        while True:
-            response = supabase.table("online_reservations")\
-                .select("*")\
-                .range(offset, offset + page_size - 1)\
-                .execute()
-            
-            if response.data:
-                all_data.extend(response.data)
-                if len(response.data) < page_size:
-                    break
-                offset += page_size
-            else:
-                break
+        all_data = fetch_all(supabase, "online_reservations", key="id")
         
         if not all_data:
             st.warning("No online reservations found in the database.")
@@ -115,29 +107,12 @@ def search_booking_by_id(booking_id):
 def load_properties():
     """Load unique properties from reservations table (direct reservations)."""
     try:
-        all_data = []
-        page_size = 1000
-        offset = 0
-        
-        while True:
-            response = supabase.table("reservations")\
-                .select("property_name")\
-                .range(offset, offset + page_size - 1)\
-                .execute()
-            
-            if response.data:
-                all_data.extend(response.data)
-                if len(response.data) < page_size:
-                    break
-                offset += page_size
-            else:
-                break
-        
         properties = set()
-        for r in all_data:
-            prop = r.get('property_name')
-            if prop:
-                properties.add(prop)
+        for page in iter_pages(supabase, "reservations", ("property_name",), key="booking_id"):
+            for r in page:
+                prop = r.get('property_name')
+                if prop:
+                    properties.add(prop)
         return sorted(properties)
     except Exception as e:
         st.error(f"Error loading properties: {e}")
@@ -4,12 +4,19 @@ from supabase import create_client, Client
 from datetime import date
 import calendar
 import pandas as pd
-from typing import Any, List, Dict, Optional
+from typing import Callable, List, Dict, Optional
+from functools import partial
 import logging
 import io
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
+from booking_index import StayIndex
+from booking_model import Booking, RoomStay
+from booking_store import get_booking_store
+from cache_registry import invalidate_bookings
+from report_jobs import get_report_jobs, rebuild_requested, show_job_progress
 
 # ────── Logging ──────
 logging.basicConfig(filename="app.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -83,6 +90,16 @@ mob_mapping = {
     "Cleartrip": ["Cleartrip"],
     "Website": ["Stayflexi Booking Engine"],
 }
+# Variant -> canonical name, so a whole MOP / MOB column is mapped at once. MOP matches
+# exactly; MOB ignores case and the first mob_mapping entry listing a variant wins.
+MOP_LOOKUP: Dict[str, str] = {}
+for _std, _variants in mop_mapping.items():
+    for _v in _variants:
+        MOP_LOOKUP.setdefault(_v, _std)
+MOB_LOOKUP: Dict[str, str] = {}
+for _mob, _variants in mob_mapping.items():
+    for _v in _variants:
+        MOB_LOOKUP.setdefault(_v.upper(), _mob)
 
 # ────── Full inventory ──────
 PROPERTY_INVENTORY = {
@@ -112,21 +129,6 @@ PROPERTY_INVENTORY = {
 def normalize_property(name: str) -> str:
     return property_mapping.get(name.strip(), name.strip())
 
-def sanitize_string(v: Any, default: str = "") -> str:
-    return str(v).strip() if v is not None else default
-
-def safe_int(v: Any, default: int = 0) -> int:
-    try:
-        return int(float(v)) if v not in [None, "", " "] else default
-    except:
-        return default
-
-def safe_float(v: Any, default: float = 0) -> float:
-    try:
-        return float(v) if v not in [None, "", " "] else default
-    except:
-        return default
-
 # ═══════════════════════════════════════════════════════════════════════════
 # Highlighting Function
 # ═══════════════════════════════════════════════════════════════════════════
@@ -140,155 +142,82 @@ def highlight_columns(df):
         styles['Balance Mop'] = 'background-color: #D3D3D3'
     return styles
 
+def format_inventory_numbers(styler):
+    """Show the typed inventory columns with two decimals / as plain counts, blank where empty."""
+    return (styler.format(precision=2, na_rep="", subset=MONEY_COLUMNS)
+                  .format(na_rep="", subset=COUNT_COLUMNS))
+
 # ═══════════════════════════════════════════════════════════════════════════
 # Load Properties & Bookings
 # ═══════════════════════════════════════════════════════════════════════════
 @st.cache_data(ttl=3600)
 def load_properties() -> List[str]:
-    try:
-        direct = supabase.table("reservations").select("property_name").execute()
-        online = supabase.table("online_reservations").select("property").execute()
-        props = set()
-        for r in direct.data or []:
-            p = normalize_property(r.get("property_name", ""))
-            if p: props.add(p)
-        for r in online.data or []:
-            p = normalize_property(r.get("property", ""))
-            if p: props.add(p)
-        return sorted(list(PROPERTY_INVENTORY.keys()))
-    except Exception as e:
-        logging.error(f"load_properties: {e}")
-        return []
-
-@st.cache_data(ttl=600)
-def load_combined_bookings(property: str, start_date: date, end_date: date) -> List[Dict]:
-    prop = normalize_property(property)
-    query_props = [prop] + reverse_mapping.get(prop, [])
-    combined: List[Dict] = []
+    # The listed properties are the configured inventories; scanning both tables for names changed nothing
+    return sorted(PROPERTY_INVENTORY.keys())
+
+def load_bookings_by_property(properties: List[str], start_date: date, end_date: date) -> Dict[str, List[Booking]]:
+    """Bookings of every property in properties from one store read per table, partitioned by property."""
+    owner = {}
+    for property in properties:
+        prop = normalize_property(property)
+        for name in [prop] + reverse_mapping.get(prop, []):
+            owner.setdefault(name, property)
+    store = get_booking_store(supabase)
+    by_prop: Dict[str, List[Booking]] = {p: [] for p in properties}
 
     try:
-        q = supabase.table("reservations")\
-            .select("*")\
-            .in_("property_name", query_props)\
-            .lte("check_in", str(end_date))\
-            .gte("check_out", str(start_date))\
-            .in_("plan_status", ["Confirmed", "Completed"])\
-            .in_("payment_status", ["Partially Paid", "Fully Paid"])\
-            .execute()
-        for r in q.data or []:
+        rows = store.rows("reservations", start_date, end_date, where={"property_name": list(owner), "plan_status": ["Confirmed", "Completed"], "payment_status": ["Partially Paid", "Fully Paid"]})
+        for r in rows:
             norm = normalize_booking(r, is_online=False)
-            if norm: combined.append(norm)
+            if norm: by_prop[owner[r["property_name"]]].append(norm)
     except Exception as e:
         logging.error(f"Direct query error: {e}")
 
     try:
-        q = supabase.table("online_reservations")\
-            .select("*")\
-            .in_("property", query_props)\
-            .lte("check_in", str(end_date))\
-            .gte("check_out", str(start_date))\
-            .in_("booking_status", ["Confirmed", "Completed"])\
-            .in_("payment_status", ["Partially Paid", "Fully Paid"])\
-            .execute()
-        for r in q.data or []:
+        rows = store.rows("online_reservations", start_date, end_date, where={"property": list(owner), "booking_status": ["Confirmed", "Completed"], "payment_status": ["Partially Paid", "Fully Paid"]})
+        for r in rows:
             norm = normalize_booking(r, is_online=True)
-            if norm: combined.append(norm)
+            if norm: by_prop[owner[r["property"]]].append(norm)
     except Exception as e:
         logging.error(f"Online query error: {e}")
 
-    return combined
+    return by_prop
+
+def load_combined_bookings(property: str, start_date: date, end_date: date) -> List[Booking]:
+    return load_bookings_by_property([property], start_date, end_date)[property]
 
 # ═══════════════════════════════════════════════════════════════════════════
 # Normalize booking
 # ═══════════════════════════════════════════════════════════════════════════
-def normalize_booking(row: Dict, is_online: bool) -> Optional[Dict]:
+def normalize_booking(row: Dict, is_online: bool) -> Optional[Booking]:
     try:
-        bid = sanitize_string(row.get("booking_id") or row.get("id"))
-        status_field = "booking_status" if is_online else "plan_status"
-        status = sanitize_string(row.get(status_field, "")).title()
-        if status not in ["Confirmed", "Completed"]: return None
-        pay = sanitize_string(row.get("payment_status")).title()
-        if pay not in ["Fully Paid", "Partially Paid"]: return None
-        ci = date.fromisoformat(row["check_in"])
-        co = date.fromisoformat(row["check_out"])
-        if co <= ci: return None
-        days_field = "room_nights" if is_online else "no_of_days"
-        days = safe_int(row.get(days_field)) or (co - ci).days
-        if days <= 0: days = 1
-        p = normalize_property(row.get("property_name") if not is_online else row.get("property"))
-
-        if is_online:
-            total_amount = safe_float(row.get("booking_amount")) or 0.0
-            gst = safe_float(row.get("gst")) or 0.0
-            tax = safe_float(row.get("ota_tax")) or 0.0
-            commission = safe_float(row.get("ota_commission")) or 0.0
-            room_charges = total_amount - gst - tax
-        else:
-            total_amount = safe_float(row.get("total_tariff")) or 0.0
-            gst = tax = commission = 0.0
-            room_charges = total_amount
-
-        receivable = total_amount - gst - tax - commission
-        if receivable < 0: receivable = 0.0
-
-        identifier = row.get("id") if is_online else row.get("booking_id")
-        identifier_str = str(identifier) if identifier is not None else ""
-
-        return {
-            "type": "online" if is_online else "direct",
-            "property": p,
-            "booking_id": bid,
-            "guest_name": sanitize_string(row.get("guest_name")),
-            "mobile_no": sanitize_string(row.get("guest_phone") if is_online else row.get("mobile_no")),
-            "total_pax": safe_int(row.get("total_pax")),
-            "check_in": str(ci),
-            "check_out": str(co),
-            "days": days,
-            "room_no": sanitize_string(row.get("room_no")).title(),
-            "mob": sanitize_string(row.get("mode_of_booking") if is_online else row.get("mob")),
-            "plan": sanitize_string(row.get("rate_plans") if is_online else row.get("breakfast")),
-            "room_charges": room_charges,
-            "gst": gst,
-            "tax": tax,
-            "total_amount": total_amount,
-            "commission": commission,
-            "receivable": receivable,
-            "advance": safe_float(row.get("total_payment_made") if is_online else row.get("advance_amount")),
-            "advance_mop": sanitize_string(row.get("advance_mop")),
-            "balance": safe_float(row.get("balance_due") if is_online else row.get("balance_amount")),
-            "balance_mop": sanitize_string(row.get("balance_mop")),
-            "booking_status": status,
-            "payment_status": pay,
-            "submitted_by": sanitize_string(row.get("submitted_by")),
-            "modified_by": sanitize_string(row.get("modified_by")),
-            "remarks": sanitize_string(row.get("remarks")),
-            "advance_remarks": sanitize_string(row.get("advance_remarks", "")),
-            "balance_remarks": sanitize_string(row.get("balance_remarks", "")),
-            "accounts_status": sanitize_string(row.get("accounts_status", "Pending")).title(),
-            "ota_booking_id": sanitize_string(row.get("ota_booking_id", "")) if is_online else "",
-            "db_id": identifier_str,
-        }
+        b = Booking.from_row(row, is_online, normalize_property)
+        if b is None or not b.has_stay or not b.is_confirmed or not b.is_paid: return None
+        return b
     except Exception as e:
         logging.warning(f"normalize failed: {e}")
         return None
 
 # ═══════════════════════════════════════════════════════════════════════════
-# Filter & Assign
+# Assign
 # ═══════════════════════════════════════════════════════════════════════════
-def filter_bookings_for_day(bookings: List[Dict], day: date) -> List[Dict]:
-    return [b.copy() for b in bookings if date.fromisoformat(b["check_in"]) <= day < date.fromisoformat(b["check_out"])]
+def assign_inventory_numbers(daily_bookings: List[Booking], property: str):
+    """Place the day's bookings in inventory rooms.
 
-def assign_inventory_numbers(daily_bookings: List[Dict], property: str):
-    assigned, over = [], []
+    Returns (assigned, over): assigned maps each occupied inventory room name to
+    its RoomStay, so the table builder looks rooms up instead of scanning;
+    over lists the bookings that could not be placed.
+    """
+    assigned: Dict[str, RoomStay] = {}
+    over = []
     inv = PROPERTY_INVENTORY.get(property, {"all": []})["all"]
     inv_lookup = {i.strip().lower(): i for i in inv}
 
-    room_bookings = {}
-    sorted_bookings = sorted(daily_bookings, key=lambda x: (x.get("check_in", ""), x.get("booking_id", "")))
+    sorted_bookings = sorted(daily_bookings, key=lambda x: (x.check_in, x.booking_id))
 
     for b in sorted_bookings:
-        raw_room = str(b.get("room_no", "") or "").strip()
-        booking_id = b.get("booking_id", "Unknown")
+        raw_room = b.room_no
+        booking_id = b.booking_id
 
         if not raw_room:
             over.append(b)
@@ -304,7 +233,7 @@ def assign_inventory_numbers(daily_bookings: List[Dict], property: str):
                 is_overbooking = True
                 break
             room_name = inv_lookup[key]
-            if room_name in room_bookings and room_bookings[room_name] != booking_id:
+            if room_name in assigned and assigned[room_name].booking.booking_id != booking_id:
                 is_overbooking = True
                 break
             assigned_rooms.append(room_name)
@@ -313,32 +242,26 @@ def assign_inventory_numbers(daily_bookings: List[Dict], property: str):
             over.append(b)
             continue
 
-        for room in assigned_rooms:
-            room_bookings[room] = booking_id
-
-        days = max(b.get("days", 1), 1)
-        receivable = b.get("receivable", 0.0)
+        days = max(b.days, 1)
         num_rooms = len(assigned_rooms)
         total_nights = days * num_rooms
-        per_night = receivable / total_nights if total_nights > 0 else 0.0
-        base_pax = b["total_pax"] // num_rooms if num_rooms else 0
-        rem = b["total_pax"] % num_rooms if num_rooms else 0
+        per_night = b.receivable / total_nights if total_nights > 0 else 0.0
+        base_pax, rem = divmod(b.total_pax, num_rooms)
 
         for idx, room in enumerate(assigned_rooms):
-            nb = b.copy()
-            nb["assigned_room"] = room
-            nb["room_no"] = room
-            nb["total_pax"] = base_pax + (1 if idx < rem else 0)
-            nb["per_night"] = per_night
-            nb["is_primary"] = (idx == 0)
-            assigned.append(nb)
+            assigned.setdefault(room, RoomStay(b, room, base_pax + (1 if idx < rem else 0), per_night, idx == 0))
 
     return assigned, over
 
 # ═══════════════════════════════════════════════════════════════════════════
 # Build Table
 # ═══════════════════════════════════════════════════════════════════════════
-def create_inventory_table(assigned: List[Dict], over: List[Dict], prop: str, target_date: date):
+# Typed columns of the inventory table: floats / nullable ints, blank (NaN) when the row has no value.
+# They are formatted only when rendered (format_inventory_numbers, the column configs, the Excel export).
+MONEY_COLUMNS = ["Room Charges", "GST", "TAX", "Total", "Commission", "Hotel Receivable", "Per Night", "Advance", "Balance"]
+COUNT_COLUMNS = ["Total Pax", "Days"]
+
+def create_inventory_table(assigned: Dict[str, RoomStay], over: List[Booking], prop: str, target_date: date):
     visible_cols = ["Inventory No","Room No","Booking ID","OTA Booking ID","Guest Name","Mobile No","Total Pax",
                     "Check In","Check Out","Days","MOB","Room Charges","GST","TAX","Total","Commission",
                     "Hotel Receivable","Per Night","Advance","Advance Mop","Balance","Balance Mop",
@@ -351,60 +274,62 @@ def create_inventory_table(assigned: List[Dict], over: List[Dict], prop: str, ta
 
     for inventory_no in all_inventory:
         row = {c: "" for c in visible_cols + hidden_cols}
+        row.update(dict.fromkeys(MONEY_COLUMNS + COUNT_COLUMNS))
         row["Inventory No"] = inventory_no
 
-        match = next((a for a in assigned if str(a.get("assigned_room", "")).strip() == inventory_no.strip()), None)
+        match = assigned.get(inventory_no)
 
         if match:
-            check_in_date = date.fromisoformat(match["check_in"])
-            is_check_in_day = (target_date == check_in_date)
-            is_primary = match.get("is_primary", False)
-
-            row["type"] = match["type"]
-            row["db_id"] = str(match["db_id"]) if match["db_id"] else ""
-            row["Room No"] = match["room_no"]
-            row["Booking ID"] = match["booking_id"]
-            row["OTA Booking ID"] = match.get("ota_booking_id", "")
-            row["Guest Name"] = match["guest_name"]
-            row["Mobile No"] = match["mobile_no"]
-            row["Total Pax"] = match["total_pax"]
-            row["Check In"] = match["check_in"]
-            row["Check Out"] = match["check_out"]
-            row["Days"] = match["days"]
-            row["MOB"] = match["mob"]
-            row["Per Night"] = f"{match.get('per_night', 0):.2f}"
-
-            if is_check_in_day and is_primary:
-                row["Room Charges"] = f"{match.get('room_charges', 0):.2f}"
-                row["GST"] = f"{match.get('gst', 0):.2f}"
-                row["TAX"] = f"{match.get('tax', 0):.2f}"
-                row["Total"] = f"{match.get('total_amount', 0):.2f}"
-                row["Commission"] = f"{match.get('commission', 0):.2f}"
-                row["Hotel Receivable"] = f"{match.get('receivable', 0):.2f}"
-                row["Advance"] = f"{match.get('advance', 0):.2f}"
-                row["Advance Mop"] = match.get("advance_mop", "")
-                row["Balance"] = f"{match.get('balance', 0):.2f}"
-                row["Balance Mop"] = match.get("balance_mop", "")
-                row["Plan"] = match["plan"]
-                row["Booking Status"] = match["booking_status"]
-                row["Payment Status"] = match["payment_status"]
-                row["Submitted by"] = match["submitted_by"]
-                row["Modified by"] = match["modified_by"]
-                row["Remarks"] = match.get("remarks", "")
-
-            row["Advance Remarks"] = match.get("advance_remarks", "")
-            row["Balance Remarks"] = match.get("balance_remarks", "")
-            row["Accounts Status"] = match.get("accounts_status", "Pending")
+            is_check_in_day = (target_date == match.check_in)
+
+            row["type"] = match.type
+            row["db_id"] = match.db_id
+            row["Room No"] = match.room
+            row["Booking ID"] = match.booking_id
+            row["OTA Booking ID"] = match.ota_booking_id
+            row["Guest Name"] = match.guest_name
+            row["Mobile No"] = match.mobile_no
+            row["Total Pax"] = match.total_pax
+            row["Check In"] = str(match.check_in)
+            row["Check Out"] = str(match.check_out)
+            row["Days"] = match.days
+            row["MOB"] = match.mob
+            row["Per Night"] = match.per_night
+
+            if is_check_in_day and match.is_primary:
+                row["Room Charges"] = match.room_charges
+                row["GST"] = match.gst
+                row["TAX"] = match.tax
+                row["Total"] = match.total_amount
+                row["Commission"] = match.commission
+                row["Hotel Receivable"] = match.receivable
+                row["Advance"] = match.advance
+                row["Advance Mop"] = match.advance_mop
+                row["Balance"] = match.balance
+                row["Balance Mop"] = match.balance_mop
+                row["Plan"] = match.plan
+                row["Booking Status"] = match.booking_status
+                row["Payment Status"] = match.payment_status
+                row["Submitted by"] = match.submitted_by
+                row["Modified by"] = match.modified_by
+                row["Remarks"] = match.remarks
+
+            row["Advance Remarks"] = match.advance_remarks
+            row["Balance Remarks"] = match.balance_remarks
+            row["Accounts Status"] = match.accounts_status
 
         rows.append(row)
 
     if over:
         over_row = {c: "" for c in visible_cols + hidden_cols}
+        over_row.update(dict.fromkeys(MONEY_COLUMNS + COUNT_COLUMNS))
         over_row["Inventory No"] = "Overbookings"
-        over_row["Room No"] = ", ".join(f"{b.get('room_no','')} ({b.get('booking_id','')})" for b in over)
+        over_row["Room No"] = ", ".join(f"{b.room_no} ({b.booking_id})" for b in over)
         rows.append(over_row)
 
     df = pd.DataFrame(rows, columns=visible_cols + hidden_cols)
+    df[MONEY_COLUMNS] = df[MONEY_COLUMNS].astype(float)
+    df[COUNT_COLUMNS] = df[COUNT_COLUMNS].astype("Int64")
     display_df = df[visible_cols].copy()
     full_df = df
     return display_df, full_df
@@ -414,39 +339,22 @@ def create_inventory_table(assigned: List[Dict], over: List[Dict], prop: str, ta
 # ═══════════════════════════════════════════════════════════════════════════
 def extract_stats_from_table(df: pd.DataFrame, mob_types: List[str]) -> Dict:
     occupied = df[df["Booking ID"].fillna("").str.strip() != ""].copy()
-
-    def to_float(col):
-        return pd.to_numeric(occupied[col].replace('', '0').str.replace(',', ''), errors='coerce').fillna(0.0)
-
-    def to_int(col):
-        return pd.to_numeric(occupied[col], errors='coerce').fillna(0).astype(int)
-
-    occupied["Per Night"] = to_float("Per Night")
-    occupied["Hotel Receivable"] = to_float("Hotel Receivable")
-    occupied["GST"] = to_float("GST")
-    occupied["TAX"] = to_float("TAX")
-    occupied["Commission"] = to_float("Commission")
-    occupied["Advance"] = to_float("Advance")
-    occupied["Balance"] = to_float("Balance")
-    occupied["Total Pax"] = to_int("Total Pax")
+    occupied[MONEY_COLUMNS] = occupied[MONEY_COLUMNS].fillna(0.0)
+    occupied["Total Pax"] = occupied["Total Pax"].fillna(0).astype(int)
 
     mop_data = {m: 0.0 for m in ["UPI","Cash","Go-MMT","Agoda","NOT PAID","Airbnb","Expenses","Bank Transfer","Stayflexi","Card Payment","Expedia","Cleartrip","Website"]}
-    total_cash = total = 0.0
-
-    for _, row in occupied.iterrows():
-        for mop_col, amount_col in [("Advance Mop", "Advance"), ("Balance Mop", "Balance")]:
-            mop = sanitize_string(row[mop_col])
-            amount = row[amount_col]
-            if not mop or amount == 0: continue
-            for std, variants in mop_mapping.items():
-                if mop in variants:
-                    mop_data[std] += amount
-                    total += amount
-                    if std == "Cash": total_cash += amount
+
+    # Advance and balance payments stacked into one (MOP, amount) column pair; blank MOPs are not counted
+    mops = pd.concat([occupied["Advance Mop"], occupied["Balance Mop"]], ignore_index=True)
+    mops = mops.fillna("").astype(str).str.strip()
+    amounts = pd.concat([occupied["Advance"], occupied["Balance"]], ignore_index=True)
+    by_mop = amounts.groupby(mops.map(MOP_LOOKUP).where(mops != "")).sum()
+    for std, amount in by_mop.items():
+        mop_data[std] += float(amount)
 
     mop_data["Expenses"] = 0.0
-    mop_data["Total Cash"] = total_cash
-    mop_data["Total"] = total
+    mop_data["Total Cash"] = float(by_mop.get("Cash", 0.0))
+    mop_data["Total"] = float(by_mop.sum())
 
     dtd = {m: {"rooms":0,"value":0.0,"comm":0.0,"gst":0.0,"tax":0.0,"pax":0} for m in mob_types}
     dtd_rooms = len(occupied)
@@ -456,15 +364,13 @@ def extract_stats_from_table(df: pd.DataFrame, mob_types: List[str]) -> Dict:
     dtd_tax = occupied["TAX"].sum()
     dtd_pax = occupied["Total Pax"].sum()
 
-    for _, row in occupied.iterrows():
-        mob_raw = sanitize_string(row["MOB"])
-        mob = next((m for m, vs in mob_mapping.items() if mob_raw.upper() in [v.upper() for v in vs]), "Booking")
-        dtd[mob]["rooms"] += 1
-        dtd[mob]["value"] += row["Per Night"]
-        dtd[mob]["comm"] += row["Commission"]
-        dtd[mob]["gst"] += row["GST"]
-        dtd[mob]["tax"] += row["TAX"]
-        dtd[mob]["pax"] += row["Total Pax"]
+    mob = occupied["MOB"].fillna("").astype(str).str.strip().str.upper().map(MOB_LOOKUP).fillna("Booking")
+    by_mob = occupied.groupby(mob).agg(
+        rooms=("Per Night", "size"), value=("Per Night", "sum"), comm=("Commission", "sum"),
+        gst=("GST", "sum"), tax=("TAX", "sum"), pax=("Total Pax", "sum"),
+    )
+    for m, sums in by_mob.to_dict("index").items():
+        dtd[m] = {k: int(v) if k in ("rooms", "pax") else float(v) for k, v in sums.items()}
 
     for m in mob_types:
         r = dtd[m]["rooms"]
@@ -486,18 +392,25 @@ def extract_stats_from_table(df: pd.DataFrame, mob_types: List[str]) -> Dict:
 # ═══════════════════════════════════════════════════════════════════════════
 # Monthly Report Excel Generator — ONE single sheet
 # ═══════════════════════════════════════════════════════════════════════════
-def generate_monthly_report(props_list: List[str], year: int, month: int, bookings_by_prop: Dict[str, List[Dict]]) -> bytes:
+def generate_monthly_report(props_list: List[str], year: int, month: int, bookings_by_prop: Dict[str, List[Booking]],
+                            progress: Optional[Callable[[float, str], None]] = None) -> bytes:
     """
     All properties × all dates in a single sheet.
     Columns: Property, Date, + all 30 booking columns.
     Rows are color-coded by property for easy scanning.
+
+    The sheet is written in openpyxl's write-only mode: rows stream to the file
+    as they are built instead of being held as a grid of cell objects, and each
+    cell takes one of a few named styles registered up front instead of its own
+    Font/Fill/Alignment/Border set. Sheet settings (widths, heights, freeze,
+    merge) must therefore be in place before the first row is appended.
+    progress, if given, is called with the fraction of properties written.
     """
     month_dates = [date(year, month, d) for d in range(1, calendar.monthrange(year, month)[1] + 1)]
     month_label = calendar.month_name[month]
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = f"{month_label} {year}"
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(f"{month_label} {year}")
 
     # ── Styles ──
     HEADER_FILL = PatternFill("solid", fgColor="1F4E79")
@@ -546,57 +459,80 @@ def generate_monthly_report(props_list: List[str], year: int, month: int, bookin
         "Advance Remarks": 22, "Balance Remarks": 22, "Accounts Status": 15,
     }
 
-    # ── Row 1: Title ──
-    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(all_cols))
-    title_cell = ws.cell(row=1, column=1,
-                         value=f"All Properties — {month_label} {year} — Complete Booking Data")
-    title_cell.font      = BIG_TITLE
-    title_cell.alignment = CENTER
-    ws.row_dimensions[1].height = 30
-
-    # ── Row 2: Headers ──
+    # ── Shared styles: one named style per (font, fill, number format) combination ──
+    def add_style(name, font, fill, alignment, border=None, number_format="General"):
+        wb.add_named_style(NamedStyle(name=name, font=font, fill=fill, alignment=alignment,
+                                      border=border or Border(), number_format=number_format))
+        return name
+
+    title_style  = add_style("Report Title", BIG_TITLE, PatternFill(), CENTER)
+    header_style = add_style("Report Header", HEADER_FONT, HEADER_FILL, CENTER, BORDER)
+    subhdr_style = add_style("Report Subheader", HEADER_FONT, SUBHDR_FILL, CENTER, BORDER)
+
+    body_styles = {}
+
+    def body_style(bold, fill_no, money):
+        """fill_no: index into PROP_FILLS, or "gray" / "white"."""
+        key = (bold, fill_no, money)
+        if key not in body_styles:
+            fill = GRAY_FILL if fill_no == "gray" else WHITE_FILL if fill_no == "white" else PROP_FILLS[fill_no]
+            body_styles[key] = add_style(f"Report Body {len(body_styles) + 1}", BOLD_FONT if bold else NORMAL_FONT,
+                                         fill, LEFT, BORDER, "0.00" if money else "General")
+        return body_styles[key]
+
+    # Style name per column for a row with / without a booking, per property fill
+    row_styles = {}
+
+    def styles_for(fill_no, has_bk):
+        key = (fill_no, has_bk)
+        if key not in row_styles:
+            row_styles[key] = [
+                body_style(has_bk, "gray" if col_name in highlight_cols else fill_no if has_bk else "white",
+                           col_name in MONEY_COLUMNS)
+                for col_name in all_cols
+            ]
+        return row_styles[key]
+
+    def styled_cell(value, style):
+        cell = WriteOnlyCell(ws, value=None if pd.isna(value) else value)
+        cell.style = style
+        return cell
+
+    # ── Sheet settings (before any row is written) ──
     for ci, col_name in enumerate(all_cols, start=1):
-        c = ws.cell(row=2, column=ci, value=col_name)
-        c.font      = HEADER_FONT
-        c.fill      = SUBHDR_FILL if col_name in highlight_cols else HEADER_FILL
-        c.alignment = CENTER
-        c.border    = BORDER
         ws.column_dimensions[get_column_letter(ci)].width = col_widths.get(col_name, 14)
+    ws.row_dimensions[1].height = 30
     ws.row_dimensions[2].height = 28
     ws.freeze_panes = "E3"   # freeze Property, Date, Inventory No, Room No
+    ws.merged_cells.add(f"A1:{get_column_letter(len(all_cols))}1")
+
+    # ── Row 1: Title ──
+    ws.append([styled_cell(f"All Properties — {month_label} {year} — Complete Booking Data", title_style)])
+
+    # ── Row 2: Headers ──
+    ws.append([styled_cell(col_name, subhdr_style if col_name in highlight_cols else header_style)
+               for col_name in all_cols])
 
     # ── Data rows ──
-    prop_fill_map = {p: PROP_FILLS[i % len(PROP_FILLS)] for i, p in enumerate(props_list)}
-    write_row = 3
+    prop_fill_map = {p: i % len(PROP_FILLS) for i, p in enumerate(props_list)}
 
-    for prop in props_list:
-        bookings  = bookings_by_prop.get(prop, [])
-        prop_fill = prop_fill_map[prop]
+    for pi, prop in enumerate(props_list):
+        if progress:
+            progress(pi / len(props_list), f"Writing {prop}")
+        stays   = StayIndex(bookings_by_prop.get(prop, []))
+        fill_no = prop_fill_map[prop]
 
         for day in month_dates:
-            daily = filter_bookings_for_day(bookings, day)
+            daily = stays.active_on(day)
             assigned, over = assign_inventory_numbers(daily, prop)
             display_df, _ = create_inventory_table(assigned, over, prop, day)
             day_label = day.strftime("%d-%b-%Y")
 
             for df_row in display_df.itertuples(index=False):
-                row_data = list(df_row)
-                has_bk   = str(row_data[2]).strip() != ""  # Booking ID at index 2
-                full_row = [prop, day_label] + row_data
-
-                for ci, (col_name, value) in enumerate(zip(all_cols, full_row), start=1):
-                    cell           = ws.cell(row=write_row, column=ci, value=value)
-                    cell.font      = BOLD_FONT if has_bk else NORMAL_FONT
-                    cell.alignment = LEFT
-                    cell.border    = BORDER
-                    if col_name in highlight_cols:
-                        cell.fill = GRAY_FILL
-                    elif has_bk:
-                        cell.fill = prop_fill
-                    else:
-                        cell.fill = WHITE_FILL
-
-                write_row += 1
+                has_bk = str(df_row[2]).strip() != ""  # Booking ID at index 2
+                full_row = (prop, day_label) + tuple(df_row)
+                ws.append([styled_cell(value, style)
+                           for value, style in zip(full_row, styles_for(fill_no, has_bk))])
 
     # ── Save ──
     buffer = io.BytesIO()
@@ -604,6 +540,16 @@ def generate_monthly_report(props_list: List[str], year: int, month: int, bookin
     buffer.seek(0)
     return buffer.getvalue()
 
+def build_monthly_report(props_list: List[str], year: int, month: int,
+                         progress: Optional[Callable[[float, str], None]] = None) -> bytes:
+    """Read the month's bookings from the store and write the workbook; the monthly report job's build."""
+    start_d = date(year, month, 1)
+    end_d   = date(year, month, calendar.monthrange(year, month)[1])
+    if progress:
+        progress(0.0, "Reading bookings")
+    bookings_by_prop = load_bookings_by_property(props_list, start_d, end_d)
+    return generate_monthly_report(props_list, year, month, bookings_by_prop, progress)
+
 
 # ═══════════════════════════════════════════════════════════════════════════
 # UI – Dashboard with single table (editable for Accounts Team)
@@ -612,7 +558,16 @@ def show_daily_status():
     st.title("Daily Status Dashboard")
 
     if st.button("🔄 Refresh Data"):
-        st.cache_data.clear()
+        # Only the property and month on screen; no property selected refreshes the month for all
+        view_prop = st.session_state.get("view_prop")
+        view_year = st.session_state.get("view_year", date.today().year)
+        view_month = st.session_state.get("view_month", date.today().month)
+        invalidate_bookings(
+            supabase,
+            [view_prop] if view_prop in PROPERTY_INVENTORY else None,
+            date(view_year, view_month, 1),
+            date(view_year, view_month, calendar.monthrange(view_year, view_month)[1]),
+        )
         st.rerun()
 
     today = date.today()
@@ -711,68 +666,70 @@ def show_daily_status():
 
         # ── Summary of what will be generated ──
         if dl_props_selected and months_to_download:
+            # Workbooks are built by background jobs on request: reruns keep the build going, and
+            # the last report built for the same properties and month stays downloadable
+            report_jobs = get_report_jobs(supabase)
+            prop_count  = len(dl_props_selected)
+            prop_tag    = "All_Properties" if prop_count > 1 else dl_props_selected[0].replace(' ', '_')
+
+            def job_params(m):
+                return (tuple(dl_props_selected), dl_year, m)
+
+            def job_period(m):
+                return (date(dl_year, m, 1), date(dl_year, m, calendar.monthrange(dl_year, m)[1]))
+
+            def submit_reports(months):
+                return {m: report_jobs.submit("inventory_monthly", job_params(m),
+                                              partial(build_monthly_report, list(dl_props_selected), dl_year, m),
+                                              job_period(m), label=f"{month_names[m]} {dl_year} report")
+                        for m in months}
+
+            def find_report(m):
+                job = report_jobs.find("inventory_monthly", job_params(m), job_period(m))
+                if job and rebuild_requested(job, key=f"dl_rebuild_{m}"):
+                    job = submit_reports([m])[m]
+                return job
+
             if len(months_to_download) == 1:
                 m = months_to_download[0]
                 month_label_dl = month_names[m]
-                prop_count = len(dl_props_selected)
                 st.info(
                     f"**1 combined report** will be generated for **{prop_count}** "
                     f"propert{'y' if prop_count == 1 else 'ies'} — **{month_label_dl} {dl_year}**. "
                     f"2 sheets: All Data + Summary."
                 )
                 if st.button(f"📥 Generate {month_label_dl} {dl_year} Report", key="dl_generate_btn", type="primary"):
-                    with st.spinner(f"Generating report for {prop_count} {'property' if prop_count == 1 else 'properties'}…"):
-                        try:
-                            start_d = date(dl_year, m, 1)
-                            end_d   = date(dl_year, m, calendar.monthrange(dl_year, m)[1])
-                            bookings_by_prop = {}
-                            for dl_prop in dl_props_selected:
-                                bookings_by_prop[dl_prop] = load_combined_bookings(dl_prop, start_d, end_d)
-                            report_bytes = generate_monthly_report(dl_props_selected, dl_year, m, bookings_by_prop)
-                            prop_tag  = "All_Properties" if prop_count > 1 else dl_props_selected[0].replace(' ', '_')
-                            filename  = f"{prop_tag}_{month_label_dl}_{dl_year}_Report.xlsx"
-                            st.download_button(
-                                label=f"⬇️ Download {month_label_dl} {dl_year} — {prop_count} {'Property' if prop_count == 1 else 'Properties'}",
-                                data=report_bytes,
-                                file_name=filename,
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                                key="dl_single_save"
-                            )
-                            st.success(f"✅ Report ready! {prop_count} {'property' if prop_count == 1 else 'properties'} × {calendar.monthrange(dl_year, m)[1]} days.")
-                        except Exception as e:
-                            st.error(f"Failed: {e}")
-                            logging.error(f"Report error {dl_year}/{m}: {e}")
+                    submit_reports(months_to_download)
+                job = find_report(m)
+                if job and show_job_progress(job):
+                    st.download_button(
+                        label=f"⬇️ Download {month_label_dl} {dl_year} — {prop_count} {'Property' if prop_count == 1 else 'Properties'}",
+                        data=job.result,
+                        file_name=f"{prop_tag}_{month_label_dl}_{dl_year}_Report.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                        key="dl_single_save"
+                    )
+                    st.success(f"✅ Report ready! {prop_count} {'property' if prop_count == 1 else 'properties'} × {calendar.monthrange(dl_year, m)[1]} days.")
             else:
                 # Multiple months → one file per month, each with all selected properties
-                prop_count = len(dl_props_selected)
                 st.info(
                     f"**{len(months_to_download)} combined reports** will be generated "
                     f"(one per month, each containing **{prop_count}** {'property' if prop_count == 1 else 'properties'}, "
                     f"2 sheets each: All Data + Summary)."
                 )
                 if st.button(f"📥 Generate {len(months_to_download)} Monthly Reports", key="dl_generate_btn", type="primary"):
-                    for m in months_to_download:
-                        month_label_dl = month_names[m]
-                        start_d = date(dl_year, m, 1)
-                        end_d   = date(dl_year, m, calendar.monthrange(dl_year, m)[1])
-                        with st.spinner(f"Generating {month_label_dl} {dl_year}…"):
-                            try:
-                                bookings_by_prop = {}
-                                for dl_prop in dl_props_selected:
-                                    bookings_by_prop[dl_prop] = load_combined_bookings(dl_prop, start_d, end_d)
-                                report_bytes = generate_monthly_report(dl_props_selected, dl_year, m, bookings_by_prop)
-                                prop_tag  = "All_Properties" if prop_count > 1 else dl_props_selected[0].replace(' ', '_')
-                                filename  = f"{prop_tag}_{month_label_dl}_{dl_year}_Report.xlsx"
-                                st.download_button(
-                                    label=f"⬇️ {month_label_dl} {dl_year} — {prop_count} {'Property' if prop_count == 1 else 'Properties'}",
-                                    data=report_bytes,
-                                    file_name=filename,
-                                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                                    key=f"dl_multi_save_{m}"
-                                )
-                            except Exception as e:
-                                st.error(f"❌ Failed for {month_label_dl}: {e}")
-                                logging.error(f"Report error {m}/{dl_year}: {e}")
+                    submit_reports(months_to_download)
+                for m in months_to_download:
+                    month_label_dl = month_names[m]
+                    job = find_report(m)
+                    if job and show_job_progress(job):
+                        st.download_button(
+                            label=f"⬇️ {month_label_dl} {dl_year} — {prop_count} {'Property' if prop_count == 1 else 'Properties'}",
+                            data=job.result,
+                            file_name=f"{prop_tag}_{month_label_dl}_{dl_year}_Report.xlsx",
+                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                            key=f"dl_multi_save_{m}"
+                        )
         else:
             st.warning("Please select at least one property and one month to enable downloads.")
 
@@ -821,13 +778,14 @@ def show_daily_status():
     month_dates = [date(year, month, d) for d in range(1, calendar.monthrange(year, month)[1] + 1)]
     start, end = month_dates[0], month_dates[-1]
     bookings = load_combined_bookings(prop, start, end)
+    stays = StayIndex(bookings)
 
     # MTD aggregation
     mtd = {m: {"rooms": 0, "value": 0.0, "comm": 0.0} for m in mob_types}
     mtd_rooms = mtd_value = mtd_comm = 0
 
     for day in month_dates:
-        daily = filter_bookings_for_day(bookings, day)
+        daily = stays.active_on(day)
         st.markdown(f"### {prop} — {day.strftime('%d %B %Y')}")
 
         assigned, over = assign_inventory_numbers(daily, prop)
@@ -849,16 +807,16 @@ def show_daily_status():
                     "Check Out": st.column_config.TextColumn(disabled=True),
                     "Days": st.column_config.NumberColumn(disabled=True),
                     "MOB": st.column_config.TextColumn(disabled=True),
-                    "Room Charges": st.column_config.TextColumn(disabled=True),
-                    "GST": st.column_config.TextColumn(disabled=True),
-                    "TAX": st.column_config.TextColumn(disabled=True),
-                    "Total": st.column_config.TextColumn("💰 Total", disabled=True),
-                    "Commission": st.column_config.TextColumn(disabled=True),
-                    "Hotel Receivable": st.column_config.TextColumn(disabled=True),
-                    "Per Night": st.column_config.TextColumn(disabled=True),
-                    "Advance": st.column_config.TextColumn("💳 Advance", disabled=True),
+                    "Room Charges": st.column_config.NumberColumn(disabled=True, format="%.2f"),
+                    "GST": st.column_config.NumberColumn(disabled=True, format="%.2f"),
+                    "TAX": st.column_config.NumberColumn(disabled=True, format="%.2f"),
+                    "Total": st.column_config.NumberColumn("💰 Total", disabled=True, format="%.2f"),
+                    "Commission": st.column_config.NumberColumn(disabled=True, format="%.2f"),
+                    "Hotel Receivable": st.column_config.NumberColumn(disabled=True, format="%.2f"),
+                    "Per Night": st.column_config.NumberColumn(disabled=True, format="%.2f"),
+                    "Advance": st.column_config.NumberColumn("💳 Advance", disabled=True, format="%.2f"),
                     "Advance Mop": st.column_config.TextColumn(disabled=True),
-                    "Balance": st.column_config.TextColumn(disabled=True),
+                    "Balance": st.column_config.NumberColumn(disabled=True, format="%.2f"),
                     "Balance Mop": st.column_config.TextColumn("💵 Balance Mop", disabled=True),
                     "Plan": st.column_config.TextColumn(disabled=True),
                     "Booking Status": st.column_config.TextColumn(disabled=True),
@@ -884,7 +842,7 @@ def show_daily_status():
                         if 'Balance Mop' in col_names:
                             styles[col_names.index('Balance Mop')] = 'background-color: #D3D3D3'
                         return styles
-                    return df.style.apply(highlight_row, axis=1)
+                    return format_inventory_numbers(df.style.apply(highlight_row, axis=1))
 
                 styled_df = apply_highlight_to_df(display_df)
 
@@ -920,12 +878,15 @@ def show_daily_status():
                                 "accounts_status": accounts_status,
                                 "type": btype,
                                 "db_id": db_id,
-                                "booking_id": bid
+                                "booking_id": bid,
+                                "check_in": date.fromisoformat(str(fr.get("Check In"))[:10]),
+                                "check_out": date.fromisoformat(str(fr.get("Check Out"))[:10]),
                             }
 
                         success = error = 0
                         error_details = []
                         processed_bookings = set()
+                        saved_stays = []
 
                         for update_key, data in updates.items():
                             bid = data["booking_id"]
@@ -945,6 +906,7 @@ def show_daily_status():
                                     res = supabase.table("reservations").update(update_data).eq("booking_id", bid).execute()
                                 if res.data:
                                     success += 1
+                                    saved_stays.append((data["check_in"], data["check_out"]))
                                 else:
                                     error += 1
                                     error_details.append(f"{bid}: No rows updated")
@@ -955,7 +917,9 @@ def show_daily_status():
 
                         if success:
                             st.success(f"✅ Saved {success} booking(s)!")
-                            st.cache_data.clear()
+                            invalidate_bookings(supabase, [prop],
+                                                min(ci for ci, _ in saved_stays),
+                                                max(co for _, co in saved_stays))
                             st.rerun()
                         if error:
                             st.error(f"⚠️ {error} failed")
@@ -968,8 +932,9 @@ def show_daily_status():
                     "Room No": st.column_config.TextColumn(disabled=True, pinned=True),
                     "Booking ID": st.column_config.TextColumn(disabled=True, pinned=True),
                     "Guest Name": st.column_config.TextColumn(disabled=True, pinned=True),
+                    **{c: st.column_config.NumberColumn(format="%.2f") for c in MONEY_COLUMNS},
                 }
-                styled_display = display_df.style.apply(highlight_columns, axis=None)
+                styled_display = format_inventory_numbers(display_df.style.apply(highlight_columns, axis=None))
                 st.dataframe(styled_display, column_config=col_config_readonly, use_container_width=True, height=400, hide_index=True)
 
             st.markdown("---")
@@ -0,0 +1,152 @@
+# occupancy.py - Sweep-line room × day occupancy for a property over a date range
+from bisect import insort
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from booking_index import parse_stay_date
+
+
+class OccupancyGrid:
+    """Room × day occupancy matrix for one property.
+
+    cells[r, t] holds the position (in `bookings`) of the booking occupying
+    rooms[r] on dates[t], or -1 when the room is free. primary[r, t] marks the
+    first room of a multi-room booking, which is where its amounts are booked.
+    overbooked[b, t] flags bookings that were in-house on dates[t] but could
+    not be given their rooms.
+    """
+
+    def __init__(self, rooms: List[str], dates: List[date], bookings: List[Dict],
+                 requested: List[Optional[List[str]]], cells: np.ndarray,
+                 primary: np.ndarray, overbooked: np.ndarray):
+        self.rooms = rooms
+        self.dates = dates
+        self.bookings = bookings
+        self.requested = requested
+        self.cells = cells
+        self.primary = primary
+        self.overbooked = overbooked
+        self._row = {r: i for i, r in enumerate(rooms)}
+        self._first = dates[0].toordinal() if dates else 0
+
+    def day_index(self, day: date) -> int:
+        t = day.toordinal() - self._first
+        if not 0 <= t < len(self.dates):
+            raise ValueError(f"{day} is outside the grid ({self.dates[0]} to {self.dates[-1]})")
+        return t
+
+    def rooms_sold(self) -> np.ndarray:
+        """Occupied rooms per day, aligned with `dates`."""
+        return np.count_nonzero(self.cells >= 0, axis=0)
+
+    def rooms_sold_on(self, day: date) -> int:
+        return int(np.count_nonzero(self.cells[:, self.day_index(day)] >= 0))
+
+    def assignments_on(self, day: date) -> List[Tuple[Dict, List[str]]]:
+        """(booking, assigned rooms) pairs for one day, rooms in the order requested."""
+        t = self.day_index(day)
+        column = self.cells[:, t]
+        result = []
+        for pos in np.unique(column[column >= 0]):
+            rooms = [r for r in self.requested[pos] if column[self._row[r]] == pos]
+            result.append((self.bookings[pos], rooms))
+        return result
+
+    def overbookings_on(self, day: date) -> List[Dict]:
+        t = self.day_index(day)
+        return [self.bookings[pos] for pos in np.flatnonzero(self.overbooked[:, t])]
+
+
+def sweep_occupancy(bookings: Sequence[Dict], inventory: Sequence[str], dates: Sequence[date],
+                    order: Optional[Callable[[Dict], Any]] = None, strict: bool = True) -> OccupancyGrid:
+    """Build the occupancy grid for consecutive `dates` in a single sweep.
+
+    Check-in/check-out events are walked in date order while the set of
+    in-house bookings is kept sorted by `order` (load order when None). Rooms
+    are only re-assigned on days where a booking arrives or leaves; quiet days
+    copy the previous column.
+
+    strict=True follows inventory.assign_inventory_numbers: a booking gets all
+    of its rooms or none, and is an overbooking if a room is unknown or held by
+    another booking ID. strict=False hands out whichever requested rooms are
+    still free and never reports overbookings.
+    """
+    rooms = list(inventory)
+    dates = list(dates)
+    row = {r: i for i, r in enumerate(rooms)}
+    lookup = {r.strip().lower(): r for r in rooms}
+    n_days = len(dates)
+    first = dates[0].toordinal() if dates else 0
+
+    records: List[Dict] = []
+    requested: List[Optional[List[str]]] = []
+    arrivals: List[List[int]] = [[] for _ in range(n_days)]
+    departures: List[List[int]] = [[] for _ in range(n_days + 1)]
+
+    for b in bookings:
+        ci = parse_stay_date(b.get("check_in"))
+        co = parse_stay_date(b.get("check_out"))
+        if not ci or not co or co <= ci:
+            continue
+        start = max(ci.toordinal() - first, 0)
+        end = min(co.toordinal() - first, n_days)
+        if start >= end:
+            continue
+        raw = [r.strip() for r in str(b.get("room_no") or "").split(",") if r.strip()]
+        if strict:
+            wanted = [lookup.get(r.lower()) for r in raw]
+            wanted = wanted if wanted and None not in wanted else None
+        else:
+            wanted = [lookup[r.lower()] for r in raw if r.lower() in lookup]
+        pos = len(records)
+        records.append(b)
+        requested.append(wanted)
+        arrivals[start].append(pos)
+        departures[end].append(pos)
+
+    ranked = list(range(len(records)))
+    if order is not None:
+        ranked.sort(key=lambda p: (order(records[p]), p))
+    rank = [0] * len(records)
+    for r, pos in enumerate(ranked):
+        rank[pos] = r
+
+    cells = np.full((len(rooms), n_days), -1, dtype=np.int32)
+    primary = np.zeros((len(rooms), n_days), dtype=bool)
+    overbooked = np.zeros((len(records), n_days), dtype=bool)
+
+    active: List[int] = []
+    for t in range(n_days):
+        for pos in departures[t]:
+            active.remove(rank[pos])
+        for pos in arrivals[t]:
+            insort(active, rank[pos])
+        if t and not arrivals[t] and not departures[t]:
+            cells[:, t] = cells[:, t - 1]
+            primary[:, t] = primary[:, t - 1]
+            overbooked[:, t] = overbooked[:, t - 1]
+            continue
+
+        taken: Dict[str, Any] = {}
+        for r in active:
+            pos = ranked[r]
+            wanted = requested[pos]
+            if strict:
+                bid = records[pos].get("booking_id", "Unknown")
+                if not wanted or any(taken.get(room, bid) != bid for room in wanted):
+                    overbooked[pos, t] = True
+                    continue
+                grant = wanted
+            else:
+                grant = [room for room in dict.fromkeys(wanted or []) if room not in taken]
+                bid = pos
+            for idx, room in enumerate(grant):
+                taken[room] = bid
+                i = row[room]
+                if cells[i, t] < 0:
+                    cells[i, t] = pos
+                    primary[i, t] = idx == 0
+
+    return OccupancyGrid(rooms, dates, records, requested, cells, primary, overbooked)
@@ -1,9 +1,13 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
-import re
+import numpy as np
+import logging
+from datetime import date, datetime
+from openpyxl import load_workbook
 from supabase import create_client, Client
-from utils import safe_int, safe_float, get_property_name
+from utils import get_property_name
+from supabase_paging import fetch_all
+from cache_registry import invalidate_stays
 
 # Initialize Supabase client
 try:
@@ -12,199 +16,254 @@ except KeyError as e:
     st.error(f"Missing Supabase secret: {e}. Please check Streamlit Cloud secrets configuration.")
     st.stop()
 
-def parse_date(dt_str):
-    """Parse date string with or without time."""
-    if not dt_str or pd.isna(dt_str):
-        return None
-    try:
-        return datetime.strptime(dt_str, "%d/%m/%Y %H:%M:%S").date()
-    except ValueError:
-        try:
-            return datetime.strptime(dt_str, "%d/%m/%Y").date()
-        except ValueError:
-            return None
-
-def parse_pax(pax_str):
-    """Parse pax string to get adults, children, infants."""
-    adults = 0
-    children = 0
-    infants = 0
-    if not pax_str or pd.isna(pax_str):
-        return adults, children, infants
-    # Normalize spaces
-    pax_str = re.sub(r'\s*,\s*', ',', pax_str)
-    parts = pax_str.split(',')
-    for part in parts:
-        part = part.strip()
-        if 'Adults:' in part:
-            try:
-                adults += int(part.split('Adults:')[1].strip())
-            except ValueError:
-                pass
-        elif 'Children:' in part:
-            try:
-                children += int(part.split('Children:')[1].strip())
-            except ValueError:
-                pass
-        elif 'Infant:' in part:
-            try:
-                infants += int(part.split('Infant:')[1].strip())
-            except ValueError:
-                pass
-    return adults, children, infants
-
-def truncate_string(value, max_length=50):
-    """Truncate string to specified length."""
-    if not value:
-        return value
-    return str(value)[:max_length] if len(str(value)) > max_length else str(value)
-
-def insert_online_reservation(reservation):
-    """Insert a new online reservation into Supabase."""
-    try:
-        # Truncate string fields to prevent database errors
-        truncated_reservation = reservation.copy()
-        
-        # List of fields that might have character limits
-        string_fields_50 = [
-            "property", "booking_id", "guest_name", "guest_phone", "room_no", 
-            "room_type", "rate_plans", "booking_source", "segment", "staflexi_status",
-            "mode_of_booking", "booking_status", "payment_status", "submitted_by", "modified_by"
-        ]
-        
-        # Truncate to 50 characters for standard fields
-        for field in string_fields_50:
-            if field in truncated_reservation:
-                truncated_reservation[field] = truncate_string(truncated_reservation[field], 50)
-        
-        # Remarks might have a longer limit, but let's be safe and truncate to 500
-        if "remarks" in truncated_reservation:
-            truncated_reservation["remarks"] = truncate_string(truncated_reservation["remarks"], 500)
-        
-        response = supabase.table("online_reservations").insert(truncated_reservation).execute()
-        return bool(response.data)
-    except Exception as e:
-        if '23505' in str(e) and 'duplicate key value' in str(e).lower():
-            return False  # Silently skip duplicate booking_id errors
-        st.error(f"Error inserting online reservation: {e}")
-        return False
+UPLOAD_DATE_FORMATS = ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y")
+# Pax labels in the order a comma-separated part is matched against them
+PAX_LABELS = {"no_of_adults": "Adults:", "no_of_children": "Children:", "no_of_infant": "Infant:"}
+
+def parse_dates(values):
+    """Parse a column of dd/mm/yyyy dates, with or without time (NaT when unparseable)."""
+    text = values.where(values.notna(), "").astype(str).str.strip()
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    for fmt in UPLOAD_DATE_FORMATS:
+        parsed = parsed.fillna(pd.to_datetime(text, format=fmt, errors="coerce"))
+    # Cells Excel already typed as dates
+    typed = values.map(lambda v: isinstance(v, (datetime, date)))
+    if typed.any():
+        parsed[typed] = pd.to_datetime(values[typed])
+    return parsed
+
+def pax_counts(pax_str):
+    """Adults, children and infants in one pax string.
+
+    Each comma-separated part counts toward the first label it contains, with
+    int() rules for the number after it; parts that do not parse count 0.
+    """
+    counts = dict.fromkeys(PAX_LABELS, 0)
+    for part in pax_str.split(","):
+        for column, label in PAX_LABELS.items():
+            if label in part:
+                try:
+                    counts[column] += int(part.split(label)[1])
+                except ValueError:
+                    pass
+                break
+    return counts
+
+def parse_pax(values):
+    """Adults / children / infants counts from a column of pax strings like "Adults: 2, Children: 1".
+
+    Exports repeat a handful of pax strings, so each distinct string is parsed
+    once with pax_counts.
+    """
+    codes, uniques = pd.factorize(values.where(values.notna(), "").astype(str))
+    counts = pd.DataFrame([pax_counts(text) for text in uniques], columns=list(PAX_LABELS), dtype=int)
+    return counts.iloc[codes].set_axis(values.index)
 
 def load_online_reservations_from_supabase():
-    """Load online reservations from Supabase."""
+    """Load all online reservations from Supabase, newest check-in first (no check-in date first, as Postgres sorts)."""
     try:
-        response = supabase.table("online_reservations").select("*").order("check_in", desc=True).execute()
-        return response.data if response.data else []
+        rows = fetch_all(supabase, "online_reservations")
+        return sorted(rows, key=lambda r: (r.get("check_in") is None, r.get("check_in") or ""), reverse=True)
     except Exception as e:
         st.error(f"Error loading online reservations: {e}")
         return []
 
-def process_and_sync_excel(uploaded_file):
-    """Process the uploaded Excel file and sync to DB."""
+UPSERT_CHUNK_SIZE = 500
+UPLOAD_CHUNK_ROWS = 2000
+
+# Upload column -> online_reservations column, truncated to 50 characters
+TEXT_COLUMNS = {
+    "customer_name": "guest_name",
+    "customer_phone": "guest_phone",
+    "room ids": "room_no",
+    "room types": "room_type",
+    "rate_plans": "rate_plans",
+    "booking_source": "booking_source",
+    "segment": "segment",
+    "status": "staflexi_status",
+}
+AMOUNT_COLUMNS = {
+    "booking_amount": "booking_amount",
+    "Total Payment Made": "total_payment_made",
+    "balance_due": "balance_due",
+    "total_amount_with_services": "total_amount_with_services",
+    "ota_gross_amount": "ota_gross_amount",
+    "ota_commission": "ota_commission",
+    "ota_tax": "ota_tax",
+    "ota_net_amount": "ota_net_amount",
+    "room_revenue": "room_revenue",
+}
+
+def _upload_column(df, name):
+    return df[name] if name in df.columns else pd.Series(None, index=df.index, dtype=object)
+
+def _text_column(df, name, max_length=50):
+    col = _upload_column(df, name)
+    return col.where(col.notna(), "").astype(str).str[:max_length]
+
+def _id_column(df, name):
+    """Booking IDs as text; whole numbers read as floats lose their trailing .0"""
+    col = _upload_column(df, name)
+    numeric = pd.to_numeric(col, errors="coerce")
+    whole = numeric.notna() & (numeric % 1 == 0)
+    out = col.where(col.notna(), "").astype(str).str.strip()
+    out[whole] = numeric[whole].astype("int64").astype(str)
+    return out
+
+def _date_column(df, name):
+    dates = parse_dates(_upload_column(df, name))
+    return dates.dt.strftime("%Y-%m-%d").where(dates.notna(), None)
+
+def normalize_stayflexi_frame(df):
+    """Stayflexi export rows as online_reservations records, built column-wise.
+
+    The result keeps the upload's index so results can be reported per row.
+    """
+    out = pd.DataFrame(index=df.index)
+    hotel_ids = pd.to_numeric(_upload_column(df, "hotel id"), errors="coerce").fillna(0).astype("int64").astype(str)
+    out["property"] = hotel_ids.map({h: get_property_name(h) for h in hotel_ids.unique()})
+    unknown = out["property"] == "Unknown Property"
+    hotel_names = _upload_column(df, "hotel name")
+    fallback = hotel_names.where(hotel_names.notna() & (hotel_names != ""), "").astype(str).str.split("-").str[0].str.strip()
+    out.loc[unknown, "property"] = fallback[unknown]
+    out["property"] = out["property"].str.slice(0, 50)
+    out["booking_id"] = _id_column(df, "booking id").str.slice(0, 50)
+    out["booking_made_on"] = _date_column(df, "booking_made_on")
+    for src, dst in TEXT_COLUMNS.items():
+        out[dst] = _text_column(df, src)
+    out["check_in"] = _date_column(df, "checkin")
+    out["check_out"] = _date_column(df, "checkout")
+
+    pax = parse_pax(_upload_column(df, "pax"))
+    out["no_of_adults"] = pax["no_of_adults"]
+    out["no_of_children"] = pax["no_of_children"]
+    out["no_of_infant"] = pax["no_of_infant"]
+    out["total_pax"] = out["no_of_adults"] + out["no_of_children"] + out["no_of_infant"]
+
+    for src, dst in AMOUNT_COLUMNS.items():
+        out[dst] = pd.to_numeric(_upload_column(df, src), errors="coerce").fillna(0.0).astype(float)
+
+    out["booking_confirmed_on"] = None  # Editable, default None
+    # Mode of booking defaults to the booking source; agents confirm bookings, so imports start Pending
+    out["mode_of_booking"] = out["booking_source"]
+    out["booking_status"] = "Pending"
+    out["payment_status"] = np.select(
+        [out["total_payment_made"] >= out["booking_amount"], out["total_payment_made"] > 0],
+        ["Fully Paid", "Partially Paid"],
+        default="Not Paid",
+    )
+    out["remarks"] = _text_column(df, "special_requests", 500)
+    out["submitted_by"] = ""  # Editable
+    out["modified_by"] = ""  # Editable
+    return out
+
+def upsert_online_reservations(records, seen_ids=None):
+    """Insert normalized records in chunks, leaving booking IDs already in the table untouched.
+
+    seen_ids carries the booking IDs of earlier chunks of the same upload, so repeats
+    across chunks are reported as duplicates too; it is updated in place.
+    Returns a per-row report (upload row, booking_id, result, error) indexed like records.
+    """
+    seen_ids = set() if seen_ids is None else seen_ids
+    report = pd.DataFrame({"row": records.index + 2, "booking_id": records["booking_id"],
+                           "result": "pending", "error": ""}, index=records.index)
+    report.loc[records["booking_id"] == "", "result"] = "skipped: no booking id"
+    in_file_dupe = (records["booking_id"] != "") & (records["booking_id"].duplicated()
+                                                    | records["booking_id"].isin(seen_ids))
+    report.loc[in_file_dupe, "result"] = "skipped: duplicate in file"
+    seen_ids.update(records["booking_id"][records["booking_id"] != ""])
+
+    pending = records[report["result"] == "pending"]
+    for start in range(0, len(pending), UPSERT_CHUNK_SIZE):
+        chunk = pending.iloc[start:start + UPSERT_CHUNK_SIZE]
+        try:
+            response = supabase.table("online_reservations")\
+                .upsert(chunk.to_dict("records"), on_conflict="booking_id", ignore_duplicates=True)\
+                .execute()
+            inserted_ids = {r["booking_id"] for r in response.data or []}
+            inserted = chunk["booking_id"].isin(inserted_ids)
+            report.loc[chunk.index[inserted], "result"] = "inserted"
+            report.loc[chunk.index[~inserted], "result"] = "skipped: already exists"
+        except Exception as e:
+            # Retry row by row so one bad record does not fail its whole chunk
+            logging.warning(f"Bulk upsert of rows {chunk.index[0]}-{chunk.index[-1]} failed, retrying per row: {e}")
+            for idx, record in zip(chunk.index, chunk.to_dict("records")):
+                try:
+                    response = supabase.table("online_reservations")\
+                        .upsert(record, on_conflict="booking_id", ignore_duplicates=True)\
+                        .execute()
+                    report.loc[idx, "result"] = "inserted" if response.data else "skipped: already exists"
+                except Exception as row_error:
+                    report.loc[idx, "result"] = "failed"
+                    report.loc[idx, "error"] = str(row_error)
+    return report
+
+def read_upload_chunks(uploaded_file, chunk_rows=UPLOAD_CHUNK_ROWS):
+    """Yield (frame, fraction_read) for an .xlsx or .csv upload, chunk_rows rows at a time.
+
+    Workbooks are streamed with openpyxl in read-only mode and CSVs with pandas
+    chunks, so only one chunk of rows is ever held as a DataFrame. Frame indexes
+    run on across chunks (sheet row - 2, as pd.read_excel would number them).
+    """
+    name = getattr(uploaded_file, "name", "") or ""
+    size = getattr(uploaded_file, "size", 0) or 0
+    if name.lower().endswith(".csv"):
+        for frame in pd.read_csv(uploaded_file, chunksize=chunk_rows):
+            yield frame, min(uploaded_file.tell() / size, 1.0) if size else 0.0
+        return
+
+    wb = load_workbook(uploaded_file, read_only=True, data_only=True)
     try:
-        df = pd.read_excel(uploaded_file, header=0)
-        if df.empty:
-            st.warning("Uploaded file is empty.")
-            return 0, 0
-        # Get existing booking_ids
-        existing_reservations = load_online_reservations_from_supabase()
-        existing_ids = {r["booking_id"] for r in existing_reservations}
-        inserted = 0
-        skipped = 0
-        for _, row in df.iterrows():
-            hotel_id = str(safe_int(row.get("hotel id", "")))
-            property_name = get_property_name(hotel_id)
-            if property_name == "Unknown Property":
-                property_name = str(row.get("hotel name", "")).split("-")[0].strip() if row.get("hotel name") else ""
-            booking_id = str(row.get("booking id", ""))
-            if not booking_id:
-                continue  # Skip if no booking_id
-            if booking_id in existing_ids:
-                skipped += 1
+        ws = wb.worksheets[0]
+        total = max((ws.max_row or 0) - 1, 0)
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(c).strip() if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+        batch, index = [], []
+        for sheet_row, values in enumerate(rows, start=2):
+            if all(v is None for v in values):
                 continue
-            booking_made_on = parse_date(row.get("booking_made_on"))
-            guest_name = truncate_string(row.get("customer_name", ""), 50)
-            guest_phone = truncate_string(row.get("customer_phone", ""), 50)
-            check_in = parse_date(row.get("checkin"))
-            check_out = parse_date(row.get("checkout"))
-            pax_str = str(row.get("pax", ""))
-            no_of_adults, no_of_children, no_of_infant = parse_pax(pax_str)
-            total_pax = no_of_adults + no_of_children + no_of_infant
-            room_no = truncate_string(row.get("room ids", ""), 50)
-            room_type = truncate_string(row.get("room types", ""), 50)
-            rate_plans = truncate_string(row.get("rate_plans", ""), 50)
-            booking_source = truncate_string(row.get("booking_source", ""), 50)
-            segment = truncate_string(row.get("segment", ""), 50)
-            staflexi_status = truncate_string(row.get("status", ""), 50)
-            booking_confirmed_on = None  # Editable, default None
-            booking_amount = safe_float(row.get("booking_amount"))
-            total_payment_made = safe_float(row.get("Total Payment Made"))
-            balance_due = safe_float(row.get("balance_due"))
-            
-            # Set mode_of_booking to booking_source by default (truncated)
-            mode_of_booking = truncate_string(booking_source, 50)
-            
-            # Always set booking_status to Pending by default
-            # Reservation agent will change it if required
-            booking_status = "Pending"
-            
-            # Compute payment_status
-            if total_payment_made >= booking_amount:
-                payment_status = "Fully Paid"
-            elif total_payment_made > 0:
-                payment_status = "Partially Paid"
-            else:
-                payment_status = "Not Paid"
-            remarks = truncate_string(row.get("special_requests", ""), 500)  # Longer limit for remarks
-            submitted_by = ""  # Editable
-            modified_by = ""  # Editable
-            total_amount_with_services = safe_float(row.get("total_amount_with_services"))
-            ota_gross_amount = safe_float(row.get("ota_gross_amount"))
-            ota_commission = safe_float(row.get("ota_commission"))
-            ota_tax = safe_float(row.get("ota_tax"))
-            ota_net_amount = safe_float(row.get("ota_net_amount"))
-            room_revenue = safe_float(row.get("room_revenue"))
-            reservation = {
-                "property": property_name,
-                "booking_id": booking_id,
-                "booking_made_on": str(booking_made_on) if booking_made_on else None,
-                "guest_name": guest_name,
-                "guest_phone": guest_phone,
-                "check_in": str(check_in) if check_in else None,
-                "check_out": str(check_out) if check_out else None,
-                "no_of_adults": no_of_adults,
-                "no_of_children": no_of_children,
-                "no_of_infant": no_of_infant,
-                "total_pax": total_pax,
-                "room_no": room_no,
-                "room_type": room_type,
-                "rate_plans": rate_plans,
-                "booking_source": booking_source,
-                "segment": segment,
-                "staflexi_status": staflexi_status,
-                "booking_confirmed_on": booking_confirmed_on,  # Fixed: lowercase 'c'
-                "booking_amount": booking_amount,
-                "total_payment_made": total_payment_made,
-                "balance_due": balance_due,
-                "mode_of_booking": mode_of_booking,
-                "booking_status": booking_status,
-                "payment_status": payment_status,
-                "remarks": remarks,
-                "submitted_by": submitted_by,
-                "modified_by": modified_by,
-                "total_amount_with_services": total_amount_with_services,
-                "ota_gross_amount": ota_gross_amount,
-                "ota_commission": ota_commission,
-                "ota_tax": ota_tax,
-                "ota_net_amount": ota_net_amount,
-                "room_revenue": room_revenue
-            }
-            if insert_online_reservation(reservation):
-                inserted += 1
-                st.session_state.online_reservations.append(reservation)
-        return inserted, skipped
+            batch.append(values)
+            index.append(sheet_row - 2)
+            if len(batch) == chunk_rows:
+                yield pd.DataFrame(batch, columns=columns, index=index), min(index[-1] + 1, total) / total if total else 0.0
+                batch, index = [], []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns, index=index), 1.0
+    finally:
+        wb.close()
+
+def process_and_sync_excel(uploaded_file, progress=None):
+    """Process the uploaded Excel or CSV file and sync to DB chunk by chunk.
+
+    progress, if given, is called with (fraction_read, rows_done) after each chunk.
+    Returns (inserted, skipped, report) where report has one line per spreadsheet row.
+    """
+    try:
+        reports, stays, seen_ids, rows_done = [], [], set(), 0
+        for frame, fraction in read_upload_chunks(uploaded_file):
+            records = normalize_stayflexi_frame(frame)
+            reports.append(upsert_online_reservations(records, seen_ids))
+            stays.append(records.loc[reports[-1]["result"] == "inserted", ["check_in", "check_out"]])
+            rows_done += len(frame)
+            if progress:
+                progress(fraction, rows_done)
+        if not reports:
+            st.warning("Uploaded file is empty.")
+            return 0, 0, None
+        report = pd.concat(reports)
+        stays = pd.concat(stays)
+        if len(stays):
+            # One invalidation over the span of every inserted stay
+            invalidate_stays(supabase, (stays["check_in"].dropna().min(), stays["check_out"].dropna().max()))
+        inserted = int((report["result"] == "inserted").sum())
+        skipped = int(report["result"].isin(["skipped: already exists", "skipped: duplicate in file"]).sum())
+        return inserted, skipped, report
     except Exception as e:
         st.error(f"Error processing Excel file: {e}")
-        return 0, 0
+        return 0, 0, None
 
 def show_online_reservations():
     """Display online reservations page with upload and view."""
@@ -214,15 +273,43 @@ def show_online_reservations():
 
     # Upload and Sync section
     st.subheader("Upload and Sync Excel File")
-    uploaded_file = st.file_uploader("Choose an Excel file", type="xlsx")
+    uploaded_file = st.file_uploader("Choose an Excel or CSV file", type=["xlsx", "csv"])
     if uploaded_file is not None:
         if st.button("🔄 Sync to Database"):
             with st.spinner("Processing and syncing..."):
-                inserted, skipped = process_and_sync_excel(uploaded_file)
+                bar = st.progress(0.0, text="Reading upload...")
+                inserted, skipped, report = process_and_sync_excel(
+                    uploaded_file,
+                    progress=lambda fraction, rows: bar.progress(fraction, text=f"Synced {rows:,} rows..."),
+                )
+                bar.empty()
                 st.success(f"✅ Synced successfully! Inserted: {inserted}, Skipped (duplicates): {skipped}")
+                if report is not None:
+                    failed = report[report["result"] == "failed"]
+                    if not failed.empty:
+                        st.error(f"⚠️ {len(failed)} row(s) failed")
+                    with st.expander("Row-by-row results"):
+                        st.dataframe(report, use_container_width=True, hide_index=True)
                 # Reload to reflect changes
                 st.session_state.online_reservations = load_online_reservations_from_supabase()
 
+    st.subheader("Pull Changes from Stayflexi")
+    if st.button("⬇️ Pull Changes"):
+        from stayflexi_sync import PULL_TIMEOUT, get_stayflexi_sync
+        with st.spinner("Fetching bookings modified since the last sync..."):
+            results = get_stayflexi_sync(supabase).pull()
+        if results is None:
+            st.info(f"⏳ Still syncing after {PULL_TIMEOUT} seconds; it carries on in the background. "
+                    "Press Pull Changes again later to see the result.")
+        else:
+            inserted = sum(r["inserted"] for r in results.values())
+            updated = sum(r["updated"] for r in results.values())
+            st.success(f"✅ Pulled from Stayflexi! Inserted: {inserted}, Updated: {updated}")
+            failed = {get_property_name(h): r["error"] for h, r in results.items() if "error" in r}
+            if failed:
+                st.error("⚠️ Not synced, will retry next time: " + "; ".join(f"{p}: {e}" for p, e in failed.items()))
+            st.session_state.online_reservations = load_online_reservations_from_supabase()
+
      # View section
     st.subheader("View Online Reservations")
     if not st.session_state.online_reservations:
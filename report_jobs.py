@@ -0,0 +1,181 @@
+# report_jobs.py - Background report builds with progress, cached by report, parameters and data version
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import streamlit as st
+
+from booking_store import TABLE_KEYS, get_booking_store
+
+JOB_WORKERS = 2      # builds running at once; later submissions queue behind them
+MAX_FINISHED = 24    # finished jobs (artifacts) kept, least recently used dropped first
+POLL_INTERVAL = 1.0  # seconds between progress refreshes while a job runs
+
+Progress = Callable[[float, str], None]
+Period = Tuple[date, date]  # the stay dates a report reads, which scope its data version
+
+
+class ReportJob:
+    """One background build: its progress while it runs, then its result or error."""
+
+    def __init__(self, label: str, version: Hashable = None):
+        self.label = label
+        self.version = version
+        self.stale = False  # set by ReportJobs.find once the data it was built from has changed
+        self._key: Optional[Tuple] = None
+        self.progress = 0.0
+        self.message = "Queued…"
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self._done = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def update(self, fraction: float, message: str = ""):
+        """Progress callback handed to the build: fraction done in 0..1 and a short status line."""
+        self.progress = min(max(fraction, 0.0), 1.0)
+        if message:
+            self.message = message
+
+
+class ReportJobs:
+    """Runs report builds on a thread pool instead of inside the Streamlit script run.
+
+    A job is keyed by (report, params, data version) over the period the
+    report reads. The job first loads that period on its worker thread (load,
+    e.g. BookingStore.prefetch), then takes the data version once and is
+    re-keyed under it before the build runs, so a cold load neither blocks the
+    script run nor leaves the job keyed on the version from before it.
+    find() returns the job for the current data, else the latest one for
+    (report, params) with .stale set when it was built from earlier data, so
+    pages keep serving the last artifact and offer a rebuild instead of
+    starting one on every rerun.
+    """
+
+    def __init__(self, version: Callable[[date, date], Hashable],
+                 load: Optional[Callable[[date, date], None]] = None, workers: int = JOB_WORKERS,
+                 max_finished: int = MAX_FINISHED):
+        self.version = version
+        self.load = load
+        self.max_finished = max_finished
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-job")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[Tuple, ReportJob]" = OrderedDict()
+        self._latest: Dict[Tuple, ReportJob] = {}
+
+    def find(self, report: str, params: tuple, period: Period) -> Optional[ReportJob]:
+        """The job for the current data, else the last one submitted for (report, params), marked stale."""
+        version = self.version(*period)
+        with self._lock:
+            key = (report, params, version)
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs.move_to_end(key)
+                job.stale = False
+                return job
+            latest = self._latest.get((report, params))
+            # Until it has loaded its period a job's version is the one from submit, not yet comparable
+            if latest is not None and latest.finished:
+                latest.stale = latest.version != version
+            return latest
+
+    def submit(self, report: str, params: tuple, build: Callable[[Progress], Any], period: Period,
+               label: str = "") -> ReportJob:
+        """Queue build(progress) unless a job for the same report, params and data version exists (failed ones are retried).
+
+        Call it on an explicit request (a button) or when find() has no job, never on every rerun.
+        """
+        version = self.version(*period)
+        key = (report, params, version)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.error is None:
+                self._jobs.move_to_end(key)
+                return job
+            job = ReportJob(label or report, version)
+            job._key = key
+            self._jobs[key] = job
+            self._latest[(report, params)] = job
+            self._evict()
+        self._pool.submit(self._run, job, build, period)
+        return job
+
+    def _run(self, job: ReportJob, build: Callable[[Progress], Any], period: Period):
+        try:
+            if self.load:
+                job.update(0.0, "Loading bookings…")
+                self.load(*period)
+            self._rekey(job, self.version(*period))
+            job.update(0.0, "Starting…")
+            job.result = build(job.update)
+            job.update(1.0, "Done")
+        except Exception as e:
+            job.error = str(e)
+            logging.error(f"Report job '{job.label}' failed: {e}")
+        finally:
+            job._done.set()
+
+    def _rekey(self, job: ReportJob, version: Hashable):
+        """Key the job on the version of the data it is about to be built from."""
+        with self._lock:
+            if self._jobs.get(job._key) is job:
+                del self._jobs[job._key]
+            job.version = version
+            job._key = job._key[:2] + (version,)
+            self._jobs[job._key] = job
+
+    def _evict(self):
+        excess = len(self._jobs) - self.max_finished
+        for key in [k for k, j in self._jobs.items() if j.finished][:max(excess, 0)]:
+            job = self._jobs.pop(key)
+            if self._latest.get(key[:2]) is job:
+                del self._latest[key[:2]]
+
+
+@st.cache_resource
+def get_report_jobs(_client) -> ReportJobs:
+    """The report job queue shared by every session in this server process, versioned by the booking store."""
+    store = get_booking_store(_client)
+
+    def version(start: date, end: date) -> Tuple[int, ...]:
+        for table in TABLE_KEYS:
+            store.sync(table)  # throttled to SYNC_INTERVAL; picks up changes made by other processes
+        return store.versions(start, end)
+
+    return ReportJobs(version, load=store.prefetch)
+
+
+def show_job_progress(job: ReportJob) -> bool:
+    """Progress bar for a job, refreshed until it finishes; then the page reruns.
+
+    Returns True once the job has finished successfully (job.result is ready),
+    and shows the error instead when it failed.
+    """
+    if job.finished:
+        if job.error:
+            st.error(f"❌ {job.label} failed: {job.error}")
+        return job.error is None
+
+    @st.fragment(run_every=POLL_INTERVAL)
+    def poll():
+        if job.finished:
+            st.rerun()
+        st.progress(job.progress, text=f"{job.label}: {job.message}")
+
+    poll()
+    return False
+
+
+def rebuild_requested(job: ReportJob, key: str) -> bool:
+    """For a finished job that failed or was built from earlier data: offer a rebuild; True once it is asked for."""
+    if not job.finished or not (job.error or job.stale):
+        return False
+    if job.error:
+        return st.button("🔄 Try again", key=key)
+    st.caption(f"⚠️ {job.label} was built before the latest booking changes.")
+    return st.button("🔄 Rebuild with latest data", key=key)
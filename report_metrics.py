@@ -0,0 +1,46 @@
+# report_metrics.py - Server-side daily report aggregates (sql/report_metrics.sql)
+import logging
+import os
+from datetime import date
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+# Opt-in: the Python aggregation stays the default until tests/test_report_metrics.py has shown
+# the deployed function matching it on the live schema
+USE_METRICS_RPC = os.getenv("REPORT_METRICS_RPC", "").strip().lower() in ("1", "true", "yes")
+
+DAILY_COLUMNS = ["property", "day", "rooms_sold", "room_charges", "gst", "commission", "receivable_per_night"]
+
+
+def fetch_daily_metrics(supabase, aliases: Dict[str, List[str]], inventory: Dict[str, List[str]],
+                        start: date, end: date, checkin_window: bool = False,
+                        strict: bool = True) -> Optional[pd.DataFrame]:
+    """Per-property, per-day rooms sold and amounts from the report_daily_metrics RPC.
+
+    aliases maps each report property to the names it is stored under. Returns
+    None if the RPC is not enabled (REPORT_METRICS_RPC) or unavailable, so
+    callers fall back to loading the bookings and computing the same figures
+    in Python.
+    """
+    if not USE_METRICS_RPC:
+        return None
+    try:
+        res = supabase.rpc("report_daily_metrics", {
+            "p_aliases": aliases,
+            "p_inventory": inventory,
+            "p_start": str(start),
+            "p_end": str(end),
+            "p_checkin_window": checkin_window,
+            "p_strict": strict,
+        }).execute()
+    except Exception as e:
+        logging.warning(f"report_daily_metrics RPC unavailable, falling back to Python aggregation: {e}")
+        return None
+
+    df = pd.DataFrame(res.data or [], columns=DAILY_COLUMNS)
+    df["day"] = pd.to_datetime(df["day"]).dt.date
+    df["rooms_sold"] = df["rooms_sold"].astype(int)
+    for col in DAILY_COLUMNS[3:]:
+        df[col] = df[col].astype(float)
+    return df
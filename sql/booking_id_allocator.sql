@@ -0,0 +1,63 @@
+-- booking_id_allocator.sql - Per-day booking ID counters behind utils.allocate_booking_ids,
+-- called through supabase.rpc("allocate_booking_ids").
+--
+-- One upsert per call hands out a block of consecutive IDs <prefix><yyyymmdd><seq>, so two
+-- agents saving at once can never receive the same ID. Sequences are zero-padded to three
+-- digits and simply grow past 999. The first call for a day starts after the highest ID
+-- already stored for that day, so IDs issued before this migration are not reused.
+--
+-- Apply with the Supabase SQL editor or `psql -f sql/booking_id_allocator.sql`.
+
+create table if not exists booking_id_counters (
+    prefix text not null,
+    day date not null,
+    last_seq integer not null,
+    primary key (prefix, day)
+);
+
+create or replace function allocate_booking_ids(
+    p_table text,               -- 'reservations' (TIE...) or 'online_reservations' (SFX...)
+    p_day date,
+    p_count integer default 1
+)
+returns table (booking_id text)
+language plpgsql
+as $$
+#variable_conflict use_column
+declare
+    v_prefix text;
+    v_stem text;
+    v_existing integer;
+    v_last integer;
+begin
+    if p_count < 1 then
+        raise exception 'allocate_booking_ids: count must be positive, got %', p_count;
+    end if;
+    v_prefix := case p_table
+        when 'reservations' then 'TIE'
+        when 'online_reservations' then 'SFX'
+    end;
+    if v_prefix is null then
+        raise exception 'allocate_booking_ids: unknown table %', p_table;
+    end if;
+    v_stem := v_prefix || to_char(p_day, 'YYYYMMDD');
+
+    if not exists (select 1 from booking_id_counters c where c.prefix = v_prefix and c.day = p_day) then
+        execute format(
+            'select coalesce(max(substr(booking_id, %s)::integer), 0) from %I
+             where booking_id like %L and substr(booking_id, %s) ~ ''^\d+$''',
+            length(v_stem) + 1, p_table, v_stem || '%', length(v_stem) + 1
+        ) into v_existing;
+    end if;
+
+    insert into booking_id_counters as c (prefix, day, last_seq)
+    values (v_prefix, p_day, coalesce(v_existing, 0) + p_count)
+    on conflict (prefix, day) do update set last_seq = c.last_seq + p_count
+    returning c.last_seq into v_last;
+
+    return query
+        select v_stem || lpad(seq::text, greatest(3, length(seq::text)), '0')
+        from generate_series(v_last - p_count + 1, v_last) as seq
+        order by seq;
+end;
+$$;
@@ -0,0 +1,12 @@
+-- booking_realtime.sql - Publishes reservation row changes to Supabase Realtime for
+-- booking_feed.BookingFeed (enabled with BOOKING_REALTIME=1).
+--
+-- replica identity full sends the whole old row on UPDATE and DELETE, so the feed knows
+-- which months a moved or deleted stay used to cover.
+--
+-- Apply with the Supabase SQL editor or `psql -f sql/booking_realtime.sql`.
+
+alter table reservations replica identity full;
+alter table online_reservations replica identity full;
+
+alter publication supabase_realtime add table reservations, online_reservations;
@@ -0,0 +1,31 @@
+-- booking_updated_at.sql - updated_at change stamps on the reservation tables, read by
+-- booking_store.BookingStore to pull only the rows changed since its last sync.
+--
+-- Without this migration the store still works but falls back to reloading each cached
+-- month every few minutes.
+--
+-- Apply with the Supabase SQL editor or `psql -f sql/booking_updated_at.sql`.
+
+create or replace function touch_updated_at() returns trigger
+language plpgsql as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+alter table reservations add column if not exists updated_at timestamptz not null default now();
+alter table online_reservations add column if not exists updated_at timestamptz not null default now();
+
+drop trigger if exists reservations_touch_updated_at on reservations;
+create trigger reservations_touch_updated_at
+    before update on reservations
+    for each row execute function touch_updated_at();
+
+drop trigger if exists online_reservations_touch_updated_at on online_reservations;
+create trigger online_reservations_touch_updated_at
+    before update on online_reservations
+    for each row execute function touch_updated_at();
+
+create index if not exists reservations_updated_at_idx on reservations (updated_at);
+create index if not exists online_reservations_updated_at_idx on online_reservations (updated_at);
@@ -0,0 +1,47 @@
+-- duplicate_guest.sql - Indexed duplicate-guest lookup used by utils.find_duplicate_guests,
+-- called through supabase.rpc("find_duplicate_guest") on every reservation save.
+--
+-- Matches on the normalized key (lower(guest_name), phone, room_no); the expression
+-- indexes below turn it into an index lookup instead of a scan of the whole table.
+--
+-- Apply with the Supabase SQL editor or `psql -f sql/duplicate_guest.sql`.
+
+create index if not exists reservations_guest_key_idx
+    on reservations (lower(guest_name), mobile_no, room_no);
+create index if not exists online_reservations_guest_key_idx
+    on online_reservations (lower(guest_name), guest_phone, room_no);
+
+create or replace function find_duplicate_guest(
+    p_table text,                             -- 'reservations' or 'online_reservations'
+    p_guest_name text,
+    p_phone text,
+    p_room_no text,
+    p_exclude_booking_id text default null
+)
+returns table (booking_id text, mob text)
+language plpgsql stable
+as $$
+begin
+    if p_table = 'reservations' then
+        return query
+            select r.booking_id::text, r.mob::text
+            from reservations r
+            where lower(r.guest_name) = lower(p_guest_name)
+              and r.mobile_no = p_phone
+              and r.room_no = p_room_no
+              and (p_exclude_booking_id is null or r.booking_id <> p_exclude_booking_id)
+            order by r.booking_id;
+    elsif p_table = 'online_reservations' then
+        return query
+            select o.booking_id::text, o.mode_of_booking::text
+            from online_reservations o
+            where lower(o.guest_name) = lower(p_guest_name)
+              and o.guest_phone = p_phone
+              and o.room_no = p_room_no
+              and (p_exclude_booking_id is null or o.booking_id <> p_exclude_booking_id)
+            order by o.booking_id;
+    else
+        raise exception 'find_duplicate_guest: unknown table %', p_table;
+    end if;
+end;
+$$;
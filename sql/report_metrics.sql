@@ -0,0 +1,171 @@
+-- report_metrics.sql - Per-property, per-day occupancy and revenue for the summary and
+-- target achievement reports, called through supabase.rpc("report_daily_metrics").
+--
+-- Mirrors occupancy.sweep_occupancy: on every night the bookings in-house are walked in load
+-- order (direct reservations first, then online) and handed the inventory rooms they asked for.
+--   p_strict = true   a booking gets all of its rooms or none (summary report)
+--   p_strict = false  a booking gets whichever of its rooms are still free (target report)
+-- Amounts are booked on the check-in night by bookings that hold at least one room; the
+-- per-night figure is the booking receivable for every night it holds a room.
+--
+-- Apply with the Supabase SQL editor or `psql -f sql/report_metrics.sql`, then check it against
+-- the Python aggregation with tests/test_report_metrics.py (REPORT_METRICS_TEST_DSN) before
+-- turning it on with REPORT_METRICS_RPC=1.
+
+create or replace function report_num(v text) returns numeric
+language sql immutable as $$
+    select case when v ~ '^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$' then trim(v)::numeric else 0 end
+$$;
+
+create or replace function report_daily_metrics(
+    p_aliases jsonb,                     -- {"<property>": ["<property>", "<synonym>", ...]}
+    p_inventory jsonb,                   -- {"<property>": ["101", "102", ...]}
+    p_start date,
+    p_end date,
+    p_checkin_window boolean default false,  -- only bookings checking in between p_start and p_end
+    p_strict boolean default true
+)
+returns table (
+    property text,
+    day date,
+    rooms_sold integer,
+    room_charges numeric,
+    gst numeric,
+    commission numeric,
+    receivable_per_night numeric
+)
+language plpgsql stable
+as $$
+#variable_conflict use_column
+declare
+    v_stay record;
+    v_room text;
+    v_grant text[];
+    v_taken jsonb;
+    v_ok boolean;
+    v_held boolean;
+begin
+    -- One row per property × day with the stays in-house that night in load order
+    -- (a single NULL stay for empty nights); the loop emits a result row whenever the
+    -- property or day changes. No temp table, so concurrent calls and read replicas work.
+    for v_stay in
+        with names as (
+            select distinct a.key as property, n.value as name
+            from jsonb_each(p_aliases) a, jsonb_array_elements_text(a.value) n
+        ),
+        inventory as (
+            select i.key as property, lower(btrim(r.value, E' \t\r\n')) as room_key, r.value as room
+            from jsonb_each(p_inventory) i, jsonb_array_elements_text(i.value) r
+        ),
+        loaded as (
+            select 0 as source, r.booking_id::text as sort_key, r.booking_id::text as booking_id,
+                   r.property_name as name, r.check_in::date as check_in, r.check_out::date as check_out,
+                   r.room_no::text as room_no,
+                   report_num(r.total_tariff::text) as amount, 0::numeric as tax, 0::numeric as comm
+            from reservations r
+            where r.property_name in (select name from names)
+              and r.plan_status in ('Confirmed', 'Completed')
+              and r.payment_status in ('Partially Paid', 'Fully Paid')
+              and r.check_in <= p_end
+              and (case when p_checkin_window then r.check_in >= p_start else r.check_out >= p_start end)
+            union all
+            select 1, lpad(o.id::text, 20, '0'), o.booking_id::text,
+                   o.property, o.check_in::date, o.check_out::date,
+                   o.room_no::text,
+                   report_num(o.booking_amount::text), report_num(o.ota_tax::text), report_num(o.ota_commission::text)
+            from online_reservations o
+            where o.property in (select name from names)
+              and o.booking_status in ('Confirmed', 'Completed')
+              and o.payment_status in ('Partially Paid', 'Fully Paid')
+              and o.check_in <= p_end
+              and (case when p_checkin_window then o.check_in >= p_start else o.check_out >= p_start end)
+        ),
+        stays as (
+            -- load order is BookingStore order: booking_id compared bytewise like Python's sorted()
+            select n.property,
+                   row_number() over (order by l.source, l.sort_key collate "C") as rank,
+                   l.booking_id, l.check_in, l.check_out, l.amount, l.tax, l.comm,
+                   -- requested rooms in order; unknown rooms stay as NULL entries
+                   array(
+                       select inv.room
+                       from unnest(string_to_array(coalesce(l.room_no, ''), ',')) with ordinality as req(raw, pos)
+                       left join inventory inv
+                              on inv.property = n.property
+                             and inv.room_key = lower(btrim(req.raw, E' \t\r\n'))
+                       where btrim(req.raw, E' \t\r\n') <> ''
+                       order by req.pos
+                   ) as rooms
+            from loaded l
+            join names n on n.name = l.name
+            where l.check_out > l.check_in
+        ),
+        slots as (
+            select a.key as property, d::date as day
+            from jsonb_each(p_aliases) a, generate_series(p_start, p_end, interval '1 day') d
+        )
+        select sl.property as slot_property, sl.day as slot_day, s.rank,
+               s.booking_id, s.check_in, s.amount, s.tax, s.comm, s.rooms
+        from slots sl
+        left join stays s on s.property = sl.property and s.check_in <= sl.day and s.check_out > sl.day
+        order by sl.property, sl.day, s.rank
+    loop
+        if property is distinct from v_stay.slot_property or day is distinct from v_stay.slot_day then
+            if property is not null then
+                return next;
+            end if;
+            v_taken := '{}'::jsonb;
+            property := v_stay.slot_property;
+            day := v_stay.slot_day;
+            rooms_sold := 0;
+            room_charges := 0;
+            gst := 0;
+            commission := 0;
+            receivable_per_night := 0;
+        end if;
+        continue when v_stay.rank is null;  -- nobody in-house that night
+
+        if p_strict then
+            if cardinality(v_stay.rooms) = 0 or array_position(v_stay.rooms, null) is not null then
+                continue;  -- overbooking: no room or a room outside the inventory
+            end if;
+            v_ok := true;
+            foreach v_room in array v_stay.rooms loop
+                if v_taken ? v_room and v_taken ->> v_room is distinct from v_stay.booking_id then
+                    v_ok := false;
+                    exit;
+                end if;
+            end loop;
+            continue when not v_ok;
+            v_grant := v_stay.rooms;
+        else
+            v_grant := '{}';
+            foreach v_room in array v_stay.rooms loop
+                if v_room is not null and not v_taken ? v_room and not v_room = any(v_grant) then
+                    v_grant := v_grant || v_room;
+                end if;
+            end loop;
+        end if;
+
+        v_held := false;
+        foreach v_room in array v_grant loop
+            if not v_taken ? v_room then
+                v_taken := v_taken || jsonb_build_object(v_room, v_stay.booking_id);
+                rooms_sold := rooms_sold + 1;
+                v_held := true;
+            end if;
+        end loop;
+        continue when not v_held;
+
+        receivable_per_night := receivable_per_night + v_stay.amount - v_stay.tax - v_stay.comm;
+        if v_stay.check_in = v_stay.slot_day then
+            room_charges := room_charges + v_stay.amount - v_stay.tax;
+            gst := gst + v_stay.tax;
+            commission := commission + v_stay.comm;
+        end if;
+    end loop;
+
+    if property is not null then
+        return next;
+    end if;
+end;
+$$;
@@ -0,0 +1,13 @@
+-- sync_cursors.sql - Where stayflexi_sync.py resumes each Stayflexi hotel's delta sync.
+--
+-- One row per source ('stayflexi:<hotelId>'). The cursor is the time the last complete
+-- sync of that hotel started; the next sync asks the API only for bookings modified since
+-- then. Without this table every sync falls back to a short look-back window.
+--
+-- Apply with the Supabase SQL editor or `psql -f sql/sync_cursors.sql`.
+
+create table if not exists sync_cursors (
+    source text primary key,
+    cursor timestamptz not null,
+    updated_at timestamptz not null default now()
+);
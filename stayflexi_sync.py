@@ -0,0 +1,334 @@
+# stayflexi_sync.py - Pulls bookings modified in Stayflexi since the last sync into online_reservations
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import requests
+import streamlit as st
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+from cache_registry import get_cache_registry
+from booking_store import get_booking_store
+from config import STAYFLEXI_API_TOKEN, STAYFLEXI_API_URL
+from online_reservation import AMOUNT_COLUMNS, TEXT_COLUMNS, normalize_stayflexi_frame
+from utils import STAYFLEXI_HOTELS
+
+PAGE_SIZE = 200                         # bookings per API page, upserted as one batch
+MAX_ATTEMPTS = 6                        # tries per API page before a hotel's sync is abandoned
+MIN_REQUEST_INTERVAL = 0.5              # seconds between API calls, across all hotels
+REQUEST_TIMEOUT = 30
+CURSOR_OVERLAP = timedelta(minutes=5)   # re-read before the cursor for clock skew; upserts are idempotent
+INITIAL_LOOKBACK = timedelta(days=2)    # window for a hotel without a stored cursor
+SYNC_INTERVAL = 300                     # seconds between background syncs
+PULL_TIMEOUT = 60                       # seconds "Pull Changes" waits before leaving the sync to the background
+
+# navigationGetRoomBookings field -> Stayflexi export column read by normalize_stayflexi_frame
+API_FIELDS = {
+    "bookingId": "booking id",
+    "hotelId": "hotel id",
+    "hotelName": "hotel name",
+    "bookingMadeOn": "booking_made_on",
+    "customerName": "customer_name",
+    "customerPhone": "customer_phone",
+    "checkin": "checkin",
+    "checkout": "checkout",
+    "pax": "pax",
+    "roomIds": "room ids",
+    "roomTypes": "room types",
+    "ratePlans": "rate_plans",
+    "bookingSource": "booking_source",
+    "segment": "segment",
+    "status": "status",
+    "bookingAmount": "booking_amount",
+    "totalPaymentMade": "Total Payment Made",
+    "balanceDue": "balance_due",
+    "totalAmountWithServices": "total_amount_with_services",
+    "otaGrossAmount": "ota_gross_amount",
+    "otaCommission": "ota_commission",
+    "otaTax": "ota_tax",
+    "otaNetAmount": "ota_net_amount",
+    "roomRevenue": "room_revenue",
+    "specialRequests": "special_requests",
+}
+API_DATE_FIELDS = ("bookingMadeOn", "checkin", "checkout")
+# online_reservations columns Stayflexi owns. Bookings already in the table get only these
+# updated, so agent edits (booking_status, mode_of_booking, remarks, ...) survive a sync.
+# payment_status is derived from the synced amounts, as the Excel import derives it.
+SYNCED_COLUMNS = (
+    ("property", "booking_made_on", "check_in", "check_out",
+     "no_of_adults", "no_of_children", "no_of_infant", "total_pax")
+    + tuple(TEXT_COLUMNS.values()) + tuple(AMOUNT_COLUMNS.values())
+    + ("payment_status",)
+)
+
+
+class RetryableResponse(Exception):
+    """A 429 or 5xx from the API; retry_after is the server's Retry-After in seconds, if it sent one."""
+
+    def __init__(self, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _retry_after(header: Optional[str]) -> Optional[float]:
+    try:
+        return min(max(float(header), 0.0), 300.0) if header is not None else None
+    except ValueError:
+        return None  # HTTP-date form; fall back to exponential backoff
+
+
+_backoff = wait_exponential(multiplier=1, min=1, max=60)
+
+
+def _wait(retry_state) -> float:
+    exc = retry_state.outcome.exception()
+    if isinstance(exc, RetryableResponse) and exc.retry_after is not None:
+        return exc.retry_after
+    return _backoff(retry_state)
+
+
+def bookings_to_frame(bookings: List[Dict]) -> pd.DataFrame:
+    """API bookings as a frame with the export's column names, ready for normalize_stayflexi_frame.
+
+    ISO dates from the API become datetimes, which parse_dates accepts like
+    cells Excel already typed as dates; dd/mm/yyyy strings are left as they are.
+    """
+    frame = pd.DataFrame(bookings)
+    for field in API_DATE_FIELDS:
+        if field in frame.columns:
+            iso = pd.to_datetime(frame[field].astype(str).str[:19], format="ISO8601", errors="coerce")
+            frame[field] = frame[field].astype(object).where(iso.isna(), iso.astype(object))
+    return frame.rename(columns=API_FIELDS)
+
+
+class StayflexiSync:
+    """Delta sync of Stayflexi bookings into online_reservations.
+
+    Each hotel is paged through navigationGetRoomBookings for the bookings
+    modified since its cursor (sync_cursors, see sql/sync_cursors.sql), and
+    every page is upserted as one batch: new booking IDs are inserted as the
+    Excel import would insert them, known ones get only SYNCED_COLUMNS
+    updated. A hotel's cursor moves only after it synced completely, so a
+    failed run is simply repeated next time.
+
+    API calls are spaced MIN_REQUEST_INTERVAL apart; 429, 5xx and connection
+    errors are retried with exponential backoff, waiting Retry-After instead
+    when the server sends it. api_url can point at a MockStayflexiServer.
+    """
+
+    def __init__(self, client, api_url: str = STAYFLEXI_API_URL, token: str = STAYFLEXI_API_TOKEN,
+                 hotel_ids: Optional[Iterable[str]] = None,
+                 on_change: Optional[Callable[[List[str], date, date], None]] = None):
+        self.client = client
+        self.api_url = api_url
+        self.token = token
+        self.hotel_ids = list(hotel_ids or STAYFLEXI_HOTELS)
+        self.on_change = on_change
+        self.min_interval = MIN_REQUEST_INTERVAL
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        self._last_request = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._pull_lock = threading.Lock()
+        self._pull_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stayflexi-pull")
+        self._pull: Optional[Future] = None
+
+    def run(self) -> Dict[str, Dict]:
+        """Sync every hotel once; returns per-hotel counts (inserted, updated, and error when it stopped)."""
+        with self._lock:
+            return {hotel_id: self.sync_hotel(hotel_id) for hotel_id in self.hotel_ids}
+
+    def pull(self, timeout: float = PULL_TIMEOUT) -> Optional[Dict[str, Dict]]:
+        """run() off the request thread, waiting at most timeout seconds for its counts.
+
+        Returns None when the sync is still going; it finishes in the background
+        and a pull pressed meanwhile waits on the same run instead of queueing another.
+        """
+        with self._pull_lock:
+            if self._pull is None or self._pull.done():
+                self._pull = self._pull_pool.submit(self.run)
+            pending = self._pull
+        try:
+            return pending.result(timeout=timeout)
+        except FutureTimeout:
+            return None
+
+    def sync_hotel(self, hotel_id: str) -> Dict:
+        source = f"stayflexi:{hotel_id}"
+        started = datetime.now(timezone.utc)
+        counts = {"inserted": 0, "updated": 0}
+        try:
+            for bookings in self.fetch_modified(hotel_id, self.load_cursor(source) - CURSOR_OVERLAP):
+                for key, n in self.upsert_batch(bookings).items():
+                    counts[key] += n
+        except Exception as e:
+            logging.error(f"StayflexiSync: sync of hotel {hotel_id} stopped, cursor kept: {e}")
+            counts["error"] = str(e)
+            return counts
+        self.save_cursor(source, started)
+        return counts
+
+    # ────── API ──────
+    def fetch_modified(self, hotel_id: str, since: datetime) -> Iterator[List[Dict]]:
+        """Yield pages of the hotel's bookings modified at or after since."""
+        page = 0
+        while True:
+            data = self._get({
+                "hotelId": hotel_id,
+                "modifiedSince": since.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "page": page,
+                "size": PAGE_SIZE,
+            })
+            bookings = (data.get("bookings") or []) if isinstance(data, dict) else (data or [])
+            if bookings:
+                yield bookings
+            if len(bookings) < PAGE_SIZE:
+                return
+            page += 1
+
+    @retry(retry=retry_if_exception_type((RetryableResponse, requests.ConnectionError, requests.Timeout)),
+           wait=_wait, stop=stop_after_attempt(MAX_ATTEMPTS), reraise=True)
+    def _get(self, params: Dict):
+        pause = self._last_request + self.min_interval - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+        self._last_request = time.monotonic()
+        response = self.session.get(self.api_url, params=params, timeout=REQUEST_TIMEOUT,
+                                    headers={"Authorization": f"Bearer {self.token}"})
+        if response.status_code == 429 or response.status_code >= 500:
+            raise RetryableResponse(response.status_code, _retry_after(response.headers.get("Retry-After")))
+        response.raise_for_status()
+        return response.json()
+
+    # ────── Database ──────
+    def upsert_batch(self, bookings: List[Dict]) -> Dict[str, int]:
+        records = normalize_stayflexi_frame(bookings_to_frame(bookings))
+        records = records[records["booking_id"] != ""].drop_duplicates("booking_id", keep="last")
+        if records.empty:
+            return {"inserted": 0, "updated": 0}
+        response = self.client.table("online_reservations")\
+            .upsert(records.to_dict("records"), on_conflict="booking_id", ignore_duplicates=True)\
+            .execute()
+        inserted_ids = {r["booking_id"] for r in response.data or []}
+        existing = records[~records["booking_id"].isin(inserted_ids)]
+        if not existing.empty:
+            self.client.table("online_reservations")\
+                .upsert(existing[["booking_id", *SYNCED_COLUMNS]].to_dict("records"), on_conflict="booking_id")\
+                .execute()
+        if self.on_change:
+            stays = records.dropna(subset=["check_in", "check_out"])
+            if not stays.empty:
+                self.on_change(sorted(stays["property"].unique()),
+                               date.fromisoformat(stays["check_in"].min()),
+                               date.fromisoformat(stays["check_out"].max()))
+        return {"inserted": len(inserted_ids), "updated": len(existing)}
+
+    def load_cursor(self, source: str) -> datetime:
+        try:
+            data = self.client.table("sync_cursors").select("cursor").eq("source", source).execute().data
+            if data:
+                return pd.Timestamp(data[0]["cursor"]).to_pydatetime()
+        except Exception as e:
+            logging.warning(f"StayflexiSync: could not read the cursor for {source}: {e}")
+        return datetime.now(timezone.utc) - INITIAL_LOOKBACK
+
+    def save_cursor(self, source: str, cursor: datetime):
+        try:
+            self.client.table("sync_cursors")\
+                .upsert({"source": source, "cursor": cursor.isoformat(),
+                         "updated_at": datetime.now(timezone.utc).isoformat()}, on_conflict="source")\
+                .execute()
+        except Exception as e:
+            logging.warning(f"StayflexiSync: could not store the cursor for {source}: {e}")
+
+    # ────── Background ──────
+    def start(self, interval: float = SYNC_INTERVAL):
+        """Run the sync every interval seconds on a daemon thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run_forever, args=(interval,), name="stayflexi-sync", daemon=True)
+        self._thread.start()
+
+    def _run_forever(self, interval: float):
+        while True:
+            try:
+                self.run()
+            except Exception as e:
+                logging.error(f"StayflexiSync: sync failed: {e}")
+            threading.Event().wait(interval)
+
+
+class MockStayflexiServer:
+    """Local stand-in for navigationGetRoomBookings, for tests and development.
+
+    Serves the given bookings filtered by hotelId and by modifiedSince against
+    each booking's "modifiedAt", paged like the API. rate_limit_every=n
+    answers every n-th request with 429 and Retry-After: 0. Requests received
+    are kept in .requests as parsed query dicts.
+    """
+
+    def __init__(self, bookings: Iterable[Dict] = (), rate_limit_every: int = 0):
+        self.bookings = list(bookings)
+        self.rate_limit_every = rate_limit_every
+        self.requests: List[Dict[str, str]] = []
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def start(self) -> str:
+        """Serve on a free local port; returns the URL to pass as StayflexiSync(api_url=...)."""
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, body = mock._respond({k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()})
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, name="stayflexi-mock", daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_port}/navigationGetRoomBookings"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _respond(self, query: Dict[str, str]):
+        self.requests.append(query)
+        if self.rate_limit_every and len(self.requests) % self.rate_limit_every == 0:
+            return 429, {"message": "Too many requests"}
+        since = pd.Timestamp(query["modifiedSince"]) if query.get("modifiedSince") else None
+        matches = [b for b in self.bookings
+                   if str(b.get("hotelId")) == query.get("hotelId")
+                   and (since is None or pd.Timestamp(b["modifiedAt"]) >= since)]
+        page, size = int(query.get("page", 0)), int(query.get("size", PAGE_SIZE))
+        return 200, {"bookings": matches[page * size:(page + 1) * size]}
+
+
+@st.cache_resource
+def get_stayflexi_sync(_client) -> StayflexiSync:
+    """The Stayflexi sync shared by every session in this server process."""
+    registry, store = get_cache_registry(), get_booking_store(_client)
+
+    def on_change(properties: List[str], start: date, end: date):
+        registry.invalidate(properties, start, end)
+        store.invalidate(start, end, tables=("online_reservations",))
+
+    return StayflexiSync(_client, on_change=on_change)
@@ -6,8 +6,12 @@ from datetime import date
 import calendar
 import pandas as pd
 from supabase import create_client, Client
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 import os
+from occupancy import OccupancyGrid, sweep_occupancy
+from report_metrics import fetch_daily_metrics
+from booking_store import get_booking_store
+from cache_registry import get_cache_registry
 
 # -------------------------- Supabase --------------------------
 try:
@@ -115,107 +119,66 @@ def load_properties(report_year: int = None, report_month: int = None) -> List[s
         return [p for p in all_props if p not in CLOSED_PROPERTIES]
     return all_props
 
-@st.cache_data(ttl=1800)
-def load_combined_bookings(prop: str, start: date, end: date) -> List[Dict]:
-    normalized_prop = normalize_property_name(prop)
-    query_props = [normalized_prop] + reverse_mapping.get(normalized_prop, [])
+def load_bookings_by_property(props: List[str], start: date, end: date) -> Dict[str, List[Dict]]:
+    """Bookings of every property in props from one store read per table, partitioned by property."""
+    owner = {}
+    for prop in props:
+        normalized_prop = normalize_property_name(prop)
+        for name in [normalized_prop] + reverse_mapping.get(normalized_prop, []):
+            owner.setdefault(name, prop)
+    store = get_booking_store(supabase)
     try:
-        direct = (supabase.table("reservations").select("*")
-                  .in_("property_name", query_props)
-                  .lte("check_in", str(end))
-                  .gte("check_out", str(start))
-                  .in_("plan_status", ["Confirmed", "Completed"])
-                  .in_("payment_status", ["Partially Paid", "Fully Paid"])
-                  .execute().data or [])
-
-        online = (supabase.table("online_reservations").select("*")
-                  .in_("property", query_props)
-                  .lte("check_in", str(end))
-                  .gte("check_out", str(start))
-                  .in_("booking_status", ["Confirmed", "Completed"])
-                  .in_("payment_status", ["Partially Paid", "Fully Paid"])
-                  .execute().data or [])
-
-        all_bookings = []
+        direct = store.rows("reservations", start, end, where={
+            "property_name": list(owner),
+            "plan_status": ["Confirmed", "Completed"],
+            "payment_status": ["Partially Paid", "Fully Paid"],
+        })
+
+        online = store.rows("online_reservations", start, end, where={
+            "property": list(owner),
+            "booking_status": ["Confirmed", "Completed"],
+            "payment_status": ["Partially Paid", "Fully Paid"],
+        })
+
+        by_prop = {p: [] for p in props}
         for b in direct:
+            prop = owner[b.get("property_name")]
             if normalize_property_name(b.get("property_name")) == prop:
                 b["property_name"] = prop
                 b["type"] = "direct"
-                all_bookings.append(b)
+                by_prop[prop].append(b)
         for b in online:
+            prop = owner[b.get("property")]
             if normalize_property_name(b.get("property")) == prop:
                 b["property"] = prop
                 b["type"] = "online"
-                all_bookings.append(b)
-        return all_bookings
+                by_prop[prop].append(b)
+        return by_prop
     except Exception as e:
-        st.error(f"Error loading bookings for {prop}: {e}")
-        return []
-
-def filter_bookings_for_day(bookings: List[Dict], target: date) -> List[Dict]:
-    return [
-        b for b in bookings
-        if date.fromisoformat(b["check_in"]) <= target < date.fromisoformat(b["check_out"])
-    ]
-
-def assign_inventory_numbers(daily: List[Dict], prop: str):
-    PROPERTY_INVENTORY = {
-        "Le Poshe Beach view": {"all": ["101","102","201","202","203","204","301","302","303","304","Day Use 1","Day Use 2","No Show"]},
-        "La Millionaire Resort": {"all": ["101","102","103","105","201","202","203","204","205","206","207","208","301","302","303","304","305","306","307","308","401","402","Day Use 1","Day Use 2","Day Use 3","Day Use 4","Day Use 5","No Show"]},
-        "Le Poshe Luxury": {"all": ["101","102","201","202","203","204","205","301","302","303","304","305","401","402","403","404","405","501","Day Use 1","Day Use 2","No Show"]},
-        "Le Poshe Suite": {"all": ["601","602","603","604","701","702","703","704","801","Day Use 1","Day Use 2","No Show"]},
-        "La Paradise Residency": {"all": ["101","102","103","201","202","203","301","302","303","304","Day Use 1","Day Use 2","No Show"]},
-        "La Paradise Luxury": {"all": ["101","102","103","201","202","203","Day Use 1","Day Use 2","No Show"]},
-        "La Villa Heritage": {"all": ["101","102","103","201","202","203","301","Day Use 1","Day Use 2","No Show"]},
-        "Le Pondy Beachside": {"all": ["101","102","201","202","Day Use 1","Day Use 2","No Show"]},
-        "Le Royce Villa": {"all": ["101","102","201","202","Day Use 1","Day Use 2","No Show"]},
-        "La Tamara Luxury": {"all": ["101","102","103","104","105","106","201","202","203","204","205","206","301","302","303","304","305","306","401","402","403","404","Day Use 1","Day Use 2","No Show"]},
-        "La Antilia Luxury": {"all": ["101","201","202","203","204","301","302","303","304","401","Day Use 1","Day Use 2","No Show"]},
-        "La Tamara Suite": {"all": ["101","102","103","104","201","202","203","204","205","206","Day Use 1","Day Use 2","No Show"]},
-        "Le Park Resort": {"all": ["111","222","333","444","555","666","Day Use 1","Day Use 2","No Show"]},
-        "Villa Shakti": {"all": ["101","102","201","201A","202","203","301","301A","302","303","401","Day Use 1","Day Use 2","No Show"]},
-        "Eden Beach Resort": {"all": ["101","102","103","201","202","Day Use 1","Day Use 2","No Show"]},
-        "Le Terra": {"all": ["101","102","103","104","105","106","107","Day Use 1","Day Use 2","No Show"]},
-        "La Coromandel Luxury": {"all": ["101","102","103","201","202","203","204","205","206","301","Day Use 1","Day Use 2","No Show"]},
-        "Happymates Forest Retreat": {"all": ["101","102","Day Use 1","Day Use 2","No Show"]}
-    }
-    
-    inv = PROPERTY_INVENTORY.get(prop, {"all": []})["all"]
-    inv_lookup = {i.strip().lower(): i for i in inv}
-    assigned = []
-    over = []
-    already_assigned = set()
-    
-    for b in daily:
-        raw_room = str(b.get("room_no") or "").strip()
-        if not raw_room:
-            over.append(b)
-            continue
-        requested = [r.strip() for r in raw_room.split(",") if r.strip()]
-        assigned_rooms = []
-        is_over = False
-        for r in requested:
-            key = r.lower()
-            if key not in inv_lookup:
-                is_over = True
-                break
-            room = inv_lookup[key]
-            if room in already_assigned:
-                is_over = True
-                break
-            assigned_rooms.append(room)
-        if is_over or not assigned_rooms:
-            over.append(b)
-            continue
-        for room in assigned_rooms:
-            already_assigned.add(room)
-        for idx, room in enumerate(assigned_rooms):
-            new_b = b.copy()
-            new_b["assigned_room"] = room
-            new_b["room_no"] = room
-            new_b["is_primary"] = (idx == 0)
-            assigned.append(new_b)
-    return assigned, over
+        st.error(f"Error loading bookings for {', '.join(props)}: {e}")
+        return {p: [] for p in props}
+
+# -------------------------- Inventory --------------------------
+PROPERTY_INVENTORY = {
+    "Le Poshe Beach view": {"all": ["101","102","201","202","203","204","301","302","303","304","Day Use 1","Day Use 2","No Show"]},
+    "La Millionaire Resort": {"all": ["101","102","103","105","201","202","203","204","205","206","207","208","301","302","303","304","305","306","307","308","401","402","Day Use 1","Day Use 2","Day Use 3","Day Use 4","Day Use 5","No Show"]},
+    "Le Poshe Luxury": {"all": ["101","102","201","202","203","204","205","301","302","303","304","305","401","402","403","404","405","501","Day Use 1","Day Use 2","No Show"]},
+    "Le Poshe Suite": {"all": ["601","602","603","604","701","702","703","704","801","Day Use 1","Day Use 2","No Show"]},
+    "La Paradise Residency": {"all": ["101","102","103","201","202","203","301","302","303","304","Day Use 1","Day Use 2","No Show"]},
+    "La Paradise Luxury": {"all": ["101","102","103","201","202","203","Day Use 1","Day Use 2","No Show"]},
+    "La Villa Heritage": {"all": ["101","102","103","201","202","203","301","Day Use 1","Day Use 2","No Show"]},
+    "Le Pondy Beachside": {"all": ["101","102","201","202","Day Use 1","Day Use 2","No Show"]},
+    "Le Royce Villa": {"all": ["101","102","201","202","Day Use 1","Day Use 2","No Show"]},
+    "La Tamara Luxury": {"all": ["101","102","103","104","105","106","201","202","203","204","205","206","301","302","303","304","305","306","401","402","403","404","Day Use 1","Day Use 2","No Show"]},
+    "La Antilia Luxury": {"all": ["101","201","202","203","204","301","302","303","304","401","Day Use 1","Day Use 2","No Show"]},
+    "La Tamara Suite": {"all": ["101","102","103","104","201","202","203","204","205","206","Day Use 1","Day Use 2","No Show"]},
+    "Le Park Resort": {"all": ["111","222","333","444","555","666","Day Use 1","Day Use 2","No Show"]},
+    "Villa Shakti": {"all": ["101","102","201","201A","202","203","301","301A","302","303","401","Day Use 1","Day Use 2","No Show"]},
+    "Eden Beach Resort": {"all": ["101","102","103","201","202","Day Use 1","Day Use 2","No Show"]},
+    "Le Terra": {"all": ["101","102","103","104","105","106","107","Day Use 1","Day Use 2","No Show"]},
+    "La Coromandel Luxury": {"all": ["101","102","103","201","202","203","204","205","206","301","Day Use 1","Day Use 2","No Show"]},
+    "Happymates Forest Retreat": {"all": ["101","102","Day Use 1","Day Use 2","No Show"]}
+}
 
 def safe_float(value, default=0.0):
     try:
@@ -223,15 +186,15 @@ def safe_float(value, default=0.0):
     except:
         return default
 
-def compute_daily_metrics(bookings: List[Dict], prop: str, day: date) -> Dict:
-    daily = filter_bookings_for_day(bookings, day)
-    assigned, _ = assign_inventory_numbers(daily, prop)
+def compute_daily_metrics(grid: OccupancyGrid, day: date) -> Dict:
+    # Bookings holding at least one room today; amounts are booked once per booking (its primary room)
+    assigned = [b for b, _ in grid.assignments_on(day)]
     
     # ✅ FIX: Count ALL occupied rooms on this day, not just check-ins
-    rooms_sold = len(set(b.get("assigned_room") for b in assigned if b.get("assigned_room")))
+    rooms_sold = grid.rooms_sold_on(day)
     
     # Only calculate financial metrics for check-in day primaries
-    check_in_primaries = [b for b in assigned if b.get("is_primary", True) and date.fromisoformat(b["check_in"]) == day]
+    check_in_primaries = [b for b in assigned if date.fromisoformat(b["check_in"]) == day]
 
     room_charges = gst = commission = 0.0
     for b in check_in_primaries:
@@ -250,22 +213,19 @@ def compute_daily_metrics(bookings: List[Dict], prop: str, day: date) -> Dict:
     # Calculate per-night receivable for ALL occupied rooms on this day
     daily_per_night_sum = 0.0
     for b in assigned:
-        if b.get("is_primary", True):
-            is_online = b.get("type") == "online"
-            if is_online:
-                booking_total = safe_float(b.get("booking_amount"))
-                booking_gst = safe_float(b.get("ota_tax"))
-                booking_commission = safe_float(b.get("ota_commission"))
-            else:
-                booking_total = safe_float(b.get("total_tariff"))
-                booking_gst = booking_commission = 0.0
-            booking_receivable = booking_total - booking_gst - booking_commission
-            days = max(b.get("days", 1), 1)
-            raw_room = str(b.get("room_no") or "").strip()
-            num_rooms = len([r.strip() for r in raw_room.split(",") if r.strip()]) if raw_room else 1
-            total_nights = days * num_rooms
-            per_night = booking_receivable / total_nights if total_nights > 0 else 0.0
-            daily_per_night_sum += per_night
+        is_online = b.get("type") == "online"
+        if is_online:
+            booking_total = safe_float(b.get("booking_amount"))
+            booking_gst = safe_float(b.get("ota_tax"))
+            booking_commission = safe_float(b.get("ota_commission"))
+        else:
+            booking_total = safe_float(b.get("total_tariff"))
+            booking_gst = booking_commission = 0.0
+        booking_receivable = booking_total - booking_gst - booking_commission
+        # Counted once per booking (its primary room), as the per-room rows carried a single room_no
+        days = max(b.get("days", 1), 1)
+        per_night = booking_receivable / days
+        daily_per_night_sum += per_night
 
     return {
         "rooms_sold": rooms_sold,
@@ -278,28 +238,44 @@ def compute_daily_metrics(bookings: List[Dict], prop: str, day: date) -> Dict:
         "receivable_per_night": daily_per_night_sum,
     }
 
-def build_report(props: List[str], dates: List[date], bookings: Dict[str, List[Dict]], metric: str) -> pd.DataFrame:
-    rows = []
-    prop_totals = {p: 0.0 for p in props}
-    grand_total = 0.0
-    for d in dates:
-        row = {"Date": d.strftime("%Y-%m-%d")}
-        day_sum = 0.0
-        for p in props:
-            val = compute_daily_metrics(bookings.get(p, []), p, d).get(metric, 0.0)
-            short_name = get_short_name(p)
-            row[short_name] = val
-            day_sum += val
-            prop_totals[p] += val
-        row["Total"] = day_sum
-        grand_total += day_sum
-        rows.append(row)
-    total_row = {"Date": "Total"}
+def build_metrics_frame(props: List[str], dates: List[date], bookings: Dict[str, List[Dict]]) -> pd.DataFrame:
+    """Compute every metric for every property × day in one pass.
+    Returns a tidy frame with columns property, date, metric, value."""
+    records = []
     for p in props:
-        total_row[get_short_name(p)] = prop_totals[p]
-    total_row["Total"] = grand_total
-    rows.append(total_row)
-    return pd.DataFrame(rows)
+        grid = sweep_occupancy(bookings.get(p, []), PROPERTY_INVENTORY.get(p, {"all": []})["all"], dates)
+        for d in dates:
+            for metric, value in compute_daily_metrics(grid, d).items():
+                records.append((p, d, metric, value))
+    return pd.DataFrame.from_records(records, columns=["property", "date", "metric", "value"])
+
+@st.cache_data(ttl=1800)
+def load_daily_metrics(props: Tuple[str, ...], start: date, end: date) -> Optional[pd.DataFrame]:
+    """Per-day sums aggregated in Postgres; None when the RPC is not enabled or not deployed."""
+    aliases = {p: [p] + reverse_mapping.get(p, []) for p in props}
+    inventory = {p: PROPERTY_INVENTORY.get(p, {"all": []})["all"] for p in props}
+    return fetch_daily_metrics(supabase, aliases, inventory, start, end)
+
+def metrics_from_daily(daily: pd.DataFrame) -> pd.DataFrame:
+    """Tidy metrics frame from the RPC's per-day sums, derived as in compute_daily_metrics."""
+    df = daily.rename(columns={"day": "date"})
+    df["total"] = df["room_charges"] + df["gst"]
+    df["receivable"] = df["total"] - df["commission"]
+    df["tax_deduction"] = df["receivable"] * 0.003
+    metrics = ["rooms_sold", "room_charges", "gst", "total", "commission", "tax_deduction", "receivable", "receivable_per_night"]
+    return df.melt(id_vars=["property", "date"], value_vars=metrics, var_name="metric", value_name="value")
+
+def build_report(metrics: pd.DataFrame, props: List[str], dates: List[date], metric: str) -> pd.DataFrame:
+    """Pivot one metric out of the tidy frame into a Date × property table with totals."""
+    table = (metrics[metrics["metric"] == metric]
+             .pivot(index="date", columns="property", values="value")
+             .reindex(index=dates, columns=props)
+             .fillna(0.0))
+    table.columns = [get_short_name(p) for p in props]
+    table["Total"] = table.sum(axis=1)
+    table.loc["Total"] = table.sum(axis=0)
+    table.index = [d.strftime("%Y-%m-%d") if isinstance(d, date) else d for d in table.index]
+    return table.rename_axis("Date").reset_index()
 
 # -------------------------- Styling with Horizontal Scroll --------------------------
 def style_dataframe_with_highlights(df: pd.DataFrame) -> str:
@@ -380,7 +356,15 @@ def show_summary_report():
     month_dates = [date(year, month, d) for d in range(1, days_in_month + 1)]
 
     with st.spinner("Loading all booking data..."):
-        bookings = {p: load_combined_bookings(p, month_dates[0], month_dates[-1]) for p in properties}
+        daily_args = (tuple(properties), month_dates[0], month_dates[-1])
+        daily = load_daily_metrics(*daily_args)
+        get_cache_registry().register(load_daily_metrics, daily_args, properties, month_dates[0], month_dates[-1])
+        if daily is not None:
+            metrics = metrics_from_daily(daily)
+        else:
+            get_booking_store(supabase).prefetch(month_dates[0], month_dates[-1])
+            bookings = load_bookings_by_property(properties, month_dates[0], month_dates[-1])
+            metrics = build_metrics_frame(properties, month_dates, bookings)
 
     reports = [
         ("rooms_sold", "Rooms Report"),
@@ -395,7 +379,7 @@ def show_summary_report():
 
     for metric, title in reports:
         st.subheader(f"TIE Hotels & Resort {title}")
-        df = build_report(properties, month_dates, bookings, metric)
+        df = build_report(metrics, properties, month_dates, metric)
         html = style_dataframe_with_highlights(df)
         st.markdown(html, unsafe_allow_html=True)
         st.markdown("---")
@@ -0,0 +1,41 @@
+# supabase_paging.py - Keyset pagination for PostgREST selects past the server row cap
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+PAGE_SIZE = 1000  # Supabase's default max-rows; a larger page would come back capped and end the loop early
+
+
+def iter_pages(supabase, table: str, columns: Sequence[str] = ("*",), key: str = "id",
+               where: Optional[Callable] = None, page_size: int = PAGE_SIZE,
+               descending: bool = False) -> Iterator[List[Dict]]:
+    """Yield every row of a select, page by page, seeking past the last key instead of using offsets.
+
+    Each page is `key > last key seen ORDER BY key LIMIT page_size` (< and
+    DESC when descending), which an index on key answers in the same time
+    however deep the page, and rows inserted meanwhile cannot shift later
+    pages. Pages are yielded as they arrive, so callers can work on the first
+    before the last is fetched. key must be unique and not null (the primary
+    key); where, if given, adds the filters to the query builder, e.g.
+    lambda q: q.eq("property", prop).
+    """
+    columns = tuple(columns)
+    if "*" not in columns and key not in columns:
+        columns += (key,)
+    last = None
+    while True:
+        query = supabase.table(table).select(*columns)
+        if where:
+            query = where(query)
+        if last is not None:
+            query = query.lt(key, last) if descending else query.gt(key, last)
+        page = query.order(key, desc=descending).limit(page_size).execute().data or []
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last = page[-1][key]
+
+
+def fetch_all(supabase, table: str, columns: Sequence[str] = ("*",), key: str = "id",
+              where: Optional[Callable] = None, page_size: int = PAGE_SIZE) -> List[Dict]:
+    """All rows of a select, ordered by key; see iter_pages."""
+    return [row for page in iter_pages(supabase, table, columns, key, where, page_size) for row in page]
@@ -5,8 +5,12 @@ from datetime import date, datetime
 import calendar
 import pandas as pd
 from supabase import create_client, Client
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 import os
+from occupancy import OccupancyGrid, sweep_occupancy
+from report_metrics import fetch_daily_metrics
+from booking_store import get_booking_store
+from cache_registry import get_cache_registry
 
 # -------------------------- Supabase --------------------------
 try:
@@ -38,6 +42,7 @@ PROPERTY_MAPPING = {
 reverse_mapping = {c: [] for c in set(PROPERTY_MAPPING.values())}
 for v, c in PROPERTY_MAPPING.items():
     reverse_mapping[c].append(v)
+
 def normalize_property_name(prop_name: str) -> str:
     if not prop_name:
         return ""
@@ -232,82 +237,63 @@ def load_properties(report_year: int = None, report_month: int = None) -> List[s
     return all_props
 
 # -------------------------- Booking Functions --------------------------
-@st.cache_data(ttl=1800)
-def load_combined_bookings(prop: str, start: date, end: date) -> List[Dict]:
-    """Load bookings with caching and optimized date filtering."""
-    normalized = normalize_property_name(prop)
-    query_props = [normalized] + reverse_mapping.get(normalized, [])
+def load_bookings_by_property(props: List[str], start: date, end: date) -> Dict[str, List[Dict]]:
+    """Bookings checking in between start and end for every property in props, from one store read per table."""
+    owner = {}
+    for prop in props:
+        normalized = normalize_property_name(prop)
+        for name in [normalized] + reverse_mapping.get(normalized, []):
+            owner.setdefault(name, prop)
+    store = get_booking_store(supabase)
     try:
-        direct = supabase.table("reservations").select("*")\
-            .in_("property_name", query_props)\
-            .gte("check_in", str(start))\
-            .lte("check_in", str(end))\
-            .in_("plan_status", ["Confirmed", "Completed"])\
-            .in_("payment_status", ["Partially Paid", "Fully Paid"])\
-            .execute().data or []
-
-        online = supabase.table("online_reservations").select("*")\
-            .in_("property", query_props)\
-            .gte("check_in", str(start))\
-            .lte("check_in", str(end))\
-            .in_("booking_status", ["Confirmed", "Completed"])\
-            .in_("payment_status", ["Partially Paid", "Fully Paid"])\
-            .execute().data or []
-
-        all_bookings = []
+        direct = [b for b in store.rows("reservations", start, end, where={
+            "property_name": list(owner),
+            "plan_status": ["Confirmed", "Completed"],
+            "payment_status": ["Partially Paid", "Fully Paid"],
+        }) if str(b["check_in"])[:10] >= str(start)]
+
+        online = [b for b in store.rows("online_reservations", start, end, where={
+            "property": list(owner),
+            "booking_status": ["Confirmed", "Completed"],
+            "payment_status": ["Partially Paid", "Fully Paid"],
+        }) if str(b["check_in"])[:10] >= str(start)]
+
+        by_prop = {p: [] for p in props}
         
         for b in direct:
             name = b.get("property_name")
+            prop = owner[name]
             if normalize_property_name(name) == prop:
                 b["property_name"] = prop
                 b["type"] = "direct"
-                all_bookings.append(b)
+                by_prop[prop].append(b)
         
         for b in online:
             name = b.get("property")
+            prop = owner[name]
             if normalize_property_name(name) == prop:
                 b["property_name"] = prop
                 b["type"] = "online"
-                all_bookings.append(b)
+                by_prop[prop].append(b)
                 
-        return all_bookings
+        return by_prop
     except Exception as e:
-        st.warning(f"Failed to load bookings for {prop}: {e}")
-        return []
+        st.warning(f"Failed to load bookings for {', '.join(props)}: {e}")
+        return {p: [] for p in props}
 
-def filter_bookings_for_day(bookings: List[Dict], day: date):
-    return [b for b in bookings if date.fromisoformat(b["check_in"]) <= day < date.fromisoformat(b["check_out"])]
-
-def assign_inventory_numbers(daily: List[Dict], prop: str):
+def build_occupancy_grid(bookings: List[Dict], prop: str, dates: List[date]) -> OccupancyGrid:
+    """Month occupancy for one property; requested rooms are handed out first-come, no overbooking."""
     inv = PROPERTY_INVENTORY.get(prop, {"all": []})["all"]
-    lookup = {r.strip().lower(): r for r in inv}
-    assigned = []; used = set()
-    for b in daily:
-        rooms = [r.strip() for r in str(b.get("room_no") or "").split(",") if r.strip()]
-        assigned_rooms = []
-        for r in rooms:
-            key = r.lower()
-            if key in lookup and lookup[key] not in used:
-                assigned_rooms.append(lookup[key])
-                used.add(lookup[key])
-        for i, room in enumerate(assigned_rooms):
-            new_b = b.copy()
-            new_b["assigned_room"] = room
-            new_b["room_no"] = room
-            new_b["is_primary"] = (i == 0)
-            assigned.append(new_b)
-    return assigned, []
+    return sweep_occupancy(bookings, inv, dates, strict=False)
 
 def safe_float(v, default=0.0):
     try: return float(v) if v not in [None, "", " "] else default
     except: return default
 
-def compute_daily_metrics(bookings: List[Dict], prop: str, day: date) -> Dict:
-    daily = filter_bookings_for_day(bookings, day)
-    assigned, _ = assign_inventory_numbers(daily, prop)
-    rooms_sold = len({b.get("assigned_room") for b in assigned if b.get("assigned_room")})
+def compute_daily_metrics(grid: OccupancyGrid, day: date) -> Dict:
+    rooms_sold = grid.rooms_sold_on(day)
     
-    check_in_primaries = [b for b in assigned if b.get("is_primary", True) and date.fromisoformat(b["check_in"]) == day]
+    check_in_primaries = [b for b, _ in grid.assignments_on(day) if date.fromisoformat(b["check_in"]) == day]
     
     room_charges = gst = commission = 0.0
     for b in check_in_primaries:
@@ -331,8 +317,32 @@ def compute_daily_metrics(bookings: List[Dict], prop: str, day: date) -> Dict:
         "gst": gst
     }
 
+def compute_property_metrics(bookings: List[Dict], prop: str, dates: List[date]) -> Dict[date, Dict]:
+    grid = build_occupancy_grid(bookings, prop, dates)
+    return {d: compute_daily_metrics(grid, d) for d in dates}
+
+@st.cache_data(ttl=1800)
+def load_daily_metrics(props: Tuple[str, ...], start: date, end: date) -> Optional[Dict[str, Dict[date, Dict]]]:
+    """Per-day metrics aggregated in Postgres; None when the RPC is not enabled or not deployed."""
+    aliases = {p: [p] + reverse_mapping.get(p, []) for p in props}
+    inventory = {p: PROPERTY_INVENTORY.get(p, {"all": []})["all"] for p in props}
+    df = fetch_daily_metrics(supabase, aliases, inventory, start, end, checkin_window=True, strict=False)
+    if df is None:
+        return None
+    daily = {p: {} for p in props}
+    for r in df.itertuples(index=False):
+        total = r.room_charges + r.gst
+        daily[r.property][r.day] = {
+            "rooms_sold": r.rooms_sold,
+            "total": total,
+            "receivable": total - r.commission,
+            "commission": r.commission,
+            "gst": r.gst
+        }
+    return daily
+
 # -------------------------- MAIN REPORT --------------------------
-def build_target_achievement_report(props: List[str], dates: List[date], bookings_dict: Dict[str, List[Dict]], current_date: date, targets: Dict) -> pd.DataFrame:
+def build_target_achievement_report(props: List[str], dates: List[date], daily: Dict[str, Dict[date, Dict]], current_date: date, targets: Dict) -> pd.DataFrame:
     rows = []
     balance_days = len([d for d in dates if d > current_date])
 
@@ -344,9 +354,10 @@ def build_target_achievement_report(props: List[str], dates: List[date], booking
 
             achieved = rooms_sold = future_booked = 0.0
             commission_total = receivable_total = gst_total = 0.0
+            prop_daily = daily[prop]
             
             for d in dates:
-                m = compute_daily_metrics(bookings_dict.get(prop, []), prop, d)
+                m = prop_daily[d]
                 achieved += m["total"]
                 commission_total += m["commission"]
                 gst_total += m["gst"]
@@ -393,7 +404,7 @@ def build_target_achievement_report(props: List[str], dates: List[date], booking
     return df
 
 # -------------------------- TILL TODAY REPORT --------------------------
-def build_till_today_report(props: List[str], dates: List[date], bookings_dict: Dict[str, List[Dict]], current_date: date, targets: Dict) -> pd.DataFrame:
+def build_till_today_report(props: List[str], dates: List[date], daily: Dict[str, Dict[date, Dict]], current_date: date, targets: Dict) -> pd.DataFrame:
     """Calculate metrics only till current system date - ARR based on total room inventory"""
     rows = []
     dates_till_today = [d for d in dates if d <= current_date]
@@ -409,9 +420,10 @@ def build_till_today_report(props: List[str], dates: List[date], bookings_dict:
 
             achieved_till_today = 0.0
             rooms_sold_till_today = 0.0
+            prop_daily = daily[prop]
             
             for d in dates_till_today:
-                m = compute_daily_metrics(bookings_dict.get(prop, []), prop, d)
+                m = prop_daily[d]
                 achieved_till_today += m["total"]
                 rooms_sold_till_today += m["rooms_sold"]
 
@@ -547,19 +559,28 @@ def show_target_achievement_report():
     properties = load_properties(report_year, report_month)
 
     with st.spinner("Generating report..."):
-        bookings = {}
-        total_bookings_count = 0
-        for p in properties:
-            try:
-                bookings[p] = load_combined_bookings(p, dates[0], dates[-1])
-                total_bookings_count += len(bookings[p])
-            except:
-                bookings[p] = []
-        
-        st.info(f"📊 Loaded {total_bookings_count} total bookings across all properties for {selected_month}")
+        daily_args = (tuple(properties), dates[0], dates[-1])
+        daily = load_daily_metrics(*daily_args)
+        get_cache_registry().register(load_daily_metrics, daily_args, properties, dates[0], dates[-1])
+        if daily is not None:
+            st.info(f"📊 Aggregated {len(properties)} properties server-side for {selected_month}")
+        else:
+            daily = {}
+            total_bookings_count = 0
+            get_booking_store(supabase).prefetch(dates[0], dates[-1])
+            bookings_by_prop = load_bookings_by_property(properties, dates[0], dates[-1])
+            for p in properties:
+                bookings = bookings_by_prop.get(p, [])
+                total_bookings_count += len(bookings)
+                try:
+                    daily[p] = compute_property_metrics(bookings, p, dates)
+                except Exception as e:
+                    st.warning(f"Error processing {p}: {e}")
+            
+            st.info(f"📊 Loaded {total_bookings_count} total bookings across all properties for {selected_month}")
 
         # Main Report
-        df = build_target_achievement_report(properties, dates, bookings, current_date, targets)
+        df = build_target_achievement_report(properties, dates, daily, current_date, targets)
         styled = style_dataframe(df)
 
     st.dataframe(styled, use_container_width=True, hide_index=True)
@@ -581,7 +602,7 @@ def show_target_achievement_report():
     if current_date >= dates[0]:
         st.caption(f"Performance metrics calculated from {dates[0].strftime('%B %d, %Y')} to {min(current_date, dates[-1]).strftime('%B %d, %Y')} | ARR = Revenue ÷ Total Room Inventory")
         
-        df_today = build_till_today_report(properties, dates, bookings, current_date, targets)
+        df_today = build_till_today_report(properties, dates, daily, current_date, targets)
         styled_today = style_dataframe(df_today)
         
         st.dataframe(styled_today, use_container_width=True, hide_index=True)
@@ -0,0 +1,14 @@
+# conftest.py - Import the app modules from the repository root without a live Supabase project
+import os
+import sys
+import tempfile
+
+from streamlit import config as st_config
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The app modules create their Supabase client from st.secrets at import time; the tests never call it
+_secrets = os.path.join(tempfile.mkdtemp(prefix="tie-tests-"), "secrets.toml")
+with open(_secrets, "w") as f:
+    f.write('[supabase]\nurl = "http://localhost:54321"\nkey = "test.test.test"\n')
+st_config.set_option("secrets.files", [_secrets])
@@ -0,0 +1,136 @@
+# test_booking_feed.py - Pushed changes through LocalPublisher into the booking store and cache registry
+from datetime import date
+
+import pytest
+
+from booking_feed import BookingFeed, LocalPublisher
+from booking_store import BookingStore
+from cache_registry import CacheRegistry
+
+MAY = (date(2026, 5, 1), date(2026, 5, 31))
+JUNE = (date(2026, 6, 1), date(2026, 6, 30))
+JULY = (date(2026, 7, 1), date(2026, 7, 31))
+
+
+class Query:
+    """The select / filter / order / limit calls BookingStore makes, over a list of rows."""
+
+    def __init__(self, rows):
+        self.rows, self.filters, self.columns, self.key, self.desc, self.n = rows, [], ("*",), None, False, None
+
+    def select(self, *columns):
+        self.columns = columns
+        return self
+
+    def _filter(self, test):
+        self.filters.append(test)
+        return self
+
+    def gt(self, column, value):
+        return self._filter(lambda r: r[column] > value)
+
+    def lt(self, column, value):
+        return self._filter(lambda r: r[column] < value)
+
+    def gte(self, column, value):
+        return self._filter(lambda r: r[column] >= value)
+
+    def lte(self, column, value):
+        return self._filter(lambda r: r[column] <= value)
+
+    def order(self, column, desc=False):
+        self.key, self.desc = column, desc
+        return self
+
+    def limit(self, n):
+        self.n = n
+        return self
+
+    def execute(self):
+        rows = sorted((r for r in self.rows if all(f(r) for f in self.filters)),
+                      key=lambda r: r[self.key], reverse=self.desc)[:self.n]
+        return Result([{c: r.get(c) for c in self.columns} for r in rows])
+
+
+class Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class Client:
+    def __init__(self, **tables):
+        self.tables = tables
+
+    def table(self, name):
+        return Query(self.tables.setdefault(name, []))
+
+
+class Cached:
+    """Stands in for an st.cache_data function; records which entries were cleared."""
+
+    def __init__(self):
+        self.cleared = []
+
+    def clear(self, *args):
+        self.cleared.append(args)
+
+
+def reservation(booking_id, check_in, check_out, guest="Ann Lee", **extra):
+    return dict({"booking_id": booking_id, "property_name": "Le Terra", "guest_name": guest,
+                 "check_in": check_in, "check_out": check_out, "room_no": "101",
+                 "plan_status": "Confirmed", "updated_at": "2026-04-01T00:00:00+00:00"}, **extra)
+
+
+def booking_ids(store, period):
+    return [r["booking_id"] for r in store.rows("reservations", *period)]
+
+
+@pytest.fixture
+def feed():
+    client = Client(reservations=[reservation("TIE1", "2026-05-10", "2026-05-12")], online_reservations=[])
+    store = BookingStore(client, sync_interval=3600)  # only the feed changes the store during the test
+    registry, report = CacheRegistry(), Cached()
+    for period in (MAY, JUNE, JULY):
+        registry.register(report, period, ["Le Terra"], *period)
+    publisher = LocalPublisher()
+    BookingFeed(store, registry).connect_local(publisher)
+    assert booking_ids(store, MAY) == ["TIE1"] and booking_ids(store, JUNE) == []
+    return publisher, store, registry, report
+
+
+def test_insert_adds_the_row_and_clears_its_month(feed):
+    publisher, store, registry, report = feed
+    publisher.publish("reservations", "INSERT", reservation("TIE2", "2026-06-03", "2026-06-05"))
+
+    assert booking_ids(store, JUNE) == ["TIE2"]
+    assert booking_ids(store, MAY) == ["TIE1"]
+    assert report.cleared == [JUNE]
+
+
+def test_update_moving_the_stay_to_another_month(feed):
+    publisher, store, registry, report = feed
+    publisher.publish("reservations", "UPDATE",
+                      reservation("TIE1", "2026-06-20", "2026-06-22", guest="Ann Lee-Smith"),
+                      old_record={"booking_id": "TIE1"})
+
+    assert booking_ids(store, MAY) == []
+    assert [(r["guest_name"], r["check_in"]) for r in store.rows("reservations", *JUNE)] == \
+        [("Ann Lee-Smith", "2026-06-20")]
+    # Reports over the old and the new month are cleared, the untouched month is kept
+    assert sorted(report.cleared) == sorted([MAY, JUNE])
+    assert registry.invalidate(None, *JULY) == 1
+
+
+def test_key_only_delete(feed):
+    publisher, store, registry, report = feed
+    # Realtime sends only the primary key in old_record unless the table has REPLICA IDENTITY FULL
+    publisher.publish("reservations", "DELETE", old_record={"booking_id": "TIE1"})
+
+    assert booking_ids(store, MAY) == []
+    assert report.cleared == [MAY]
+
+
+def test_changes_to_other_tables_are_ignored(feed):
+    publisher, store, registry, report = feed
+    publisher.publish("users", "INSERT", {"id": 1})
+    assert report.cleared == []
@@ -0,0 +1,78 @@
+# test_online_reservation.py - Stayflexi export rows normalized column-wise for the upsert
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from online_reservation import normalize_stayflexi_frame, parse_pax
+
+LONG_NAME = "A Very Long Property Name That Runs Past Fifty Characters - Pondicherry"
+
+
+def upload():
+    return pd.DataFrame({
+        "hotel id": [27704, 99999, np.nan],
+        "hotel name": ["La Antilia - Pondy", LONG_NAME, np.nan],
+        "booking id": [12345.0, "SFX-" + "9" * 60, None],
+        "booking_made_on": ["28/04/2026 10:15:00", "29/04/2026", None],
+        "customer_name": ["Ann Lee", "Bob", "C" * 80],
+        "customer_phone": [9876543210, "99", None],
+        "room ids": ["101, 102", "201", None],
+        "checkin": ["01/05/2026 14:00:00", datetime(2026, 5, 2, 12, 0), "bad"],
+        "checkout": ["03/05/2026", datetime(2026, 5, 4), None],
+        "pax": ["Adults: 2, Children: 1", "Adults: 1, Adults: 1, Infant: 1", None],
+        "booking_source": ["Booking.com", "Walk-in", None],
+        "booking_amount": [5000, 5000, 1200],
+        "Total Payment Made": [5000, 100, 0],
+        "ota_tax": [250, None, "n/a"],
+        "special_requests": ["Late check-in", None, "x" * 600],
+    }, index=[0, 1, 2])
+
+
+def test_normalize_stayflexi_frame():
+    out = normalize_stayflexi_frame(upload())
+    assert list(out.index) == [0, 1, 2]
+
+    # Known hotel IDs map to their property; unknown ones fall back to the hotel name before " - "
+    assert out["property"].tolist() == ["La Antilia Luxury", LONG_NAME.split("-")[0].strip()[:50], ""]
+    # Whole-number IDs read as floats lose ".0"; property and booking_id fit their varchar(50) columns
+    assert out["booking_id"].tolist() == ["12345", ("SFX-" + "9" * 60)[:50], ""]
+    assert out["property"].str.len().max() <= 50 and out["booking_id"].str.len().max() <= 50
+    assert out["guest_name"].tolist() == ["Ann Lee", "Bob", "C" * 50]
+    assert out["guest_phone"].tolist() == ["9876543210", "99", ""]
+    assert out["remarks"].tolist() == ["Late check-in", "", "x" * 500]
+
+    assert out["booking_made_on"].tolist() == ["2026-04-28", "2026-04-29", None]
+    assert out["check_in"].tolist() == ["2026-05-01", "2026-05-02", None]
+    assert out["check_out"].tolist() == ["2026-05-03", "2026-05-04", None]
+
+    assert out[["no_of_adults", "no_of_children", "no_of_infant", "total_pax"]].values.tolist() == \
+        [[2, 1, 0, 3], [2, 0, 1, 3], [0, 0, 0, 0]]
+
+    assert out["booking_amount"].tolist() == [5000.0, 5000.0, 1200.0]
+    assert out["ota_tax"].tolist() == [250.0, 0.0, 0.0]
+    assert out["balance_due"].tolist() == [0.0, 0.0, 0.0]  # column missing from the upload
+    assert out["payment_status"].tolist() == ["Fully Paid", "Partially Paid", "Not Paid"]
+    assert out["mode_of_booking"].tolist() == ["Booking.com", "Walk-in", ""]
+    assert (out["booking_status"] == "Pending").all()
+
+
+@pytest.mark.parametrize("pax, expected", [
+    ("Adults: 2, Children: 1, Infant: 1", (2, 1, 1)),
+    ("Adults: 1 , Adults: 2", (3, 0, 0)),
+    # Counts are split on commas only: a part holding two labels counts toward the first and fails int()
+    ("Adults: 2\nChildren: 1", (0, 0, 0)),
+    ("Adults: 2 Children: 1, Infant: 1", (0, 0, 1)),
+    # int() rules: Unicode digits, signs and surrounding whitespace are accepted
+    ("Adults: \uff12", (2, 0, 0)),
+    ("Adults: +2, Children: -1", (2, -1, 0)),
+    ("Adults: two, Children:", (0, 0, 0)),
+    ("", (0, 0, 0)),
+])
+def test_parse_pax_matches_the_row_wise_rules(pax, expected):
+    values = pd.Series([pax, None], index=[7, 8], dtype=object)
+    out = parse_pax(values)
+    assert list(out.index) == [7, 8]
+    assert tuple(out.loc[7]) == expected
+    assert tuple(out.loc[8]) == (0, 0, 0)
@@ -0,0 +1,72 @@
+# test_report_jobs.py - Background report jobs keyed by the data version of the period they read
+from datetime import date
+
+from report_jobs import ReportJobs
+
+MAY = (date(2026, 5, 1), date(2026, 5, 31))
+JUNE = (date(2026, 6, 1), date(2026, 6, 30))
+
+
+def make_jobs():
+    versions = {MAY: 0, JUNE: 0}
+    return ReportJobs(lambda start, end: versions[(start, end)]), versions
+
+
+def finished(job):
+    job._done.wait(5)
+    return job
+
+
+def test_finished_job_is_reused_until_its_period_changes():
+    jobs, versions = make_jobs()
+    builds = []
+    build = lambda progress: builds.append(1) or "artifact"
+
+    assert jobs.find("accounts", (2026, 5), MAY) is None
+    job = finished(jobs.submit("accounts", (2026, 5), build, MAY))
+    assert job.result == "artifact" and not job.stale
+
+    # Submitting again for the same data returns the finished job instead of rebuilding
+    assert jobs.submit("accounts", (2026, 5), build, MAY) is job and len(builds) == 1
+
+    # Changes in another month leave the report current
+    versions[JUNE] += 1
+    assert jobs.find("accounts", (2026, 5), MAY) is job and not job.stale
+
+    # Changes in its own month: the last artifact is still served, marked stale
+    versions[MAY] += 1
+    assert jobs.find("accounts", (2026, 5), MAY) is job and job.stale and job.result == "artifact"
+
+    rebuilt = finished(jobs.submit("accounts", (2026, 5), build, MAY))
+    assert rebuilt is not job and len(builds) == 2
+    assert jobs.find("accounts", (2026, 5), MAY) is rebuilt and not rebuilt.stale
+
+
+def test_failed_job_is_retried_on_submit():
+    jobs, _ = make_jobs()
+
+    def broken(progress):
+        raise ValueError("no data")
+
+    job = finished(jobs.submit("nrd_excel", (2026, 5), broken, MAY))
+    assert job.error == "no data"
+    assert jobs.find("nrd_excel", (2026, 5), MAY) is job
+
+    retried = finished(jobs.submit("nrd_excel", (2026, 5), lambda progress: b"xlsx", MAY))
+    assert retried is not job and retried.result == b"xlsx"
+
+
+def test_period_is_loaded_by_the_job_and_the_version_taken_after():
+    versions, loads = {MAY: 0, JUNE: 0}, []
+
+    def load(start, end):
+        loads.append((start, end))
+        versions[(start, end)] += 1  # a cold load changes the month's version
+
+    jobs = ReportJobs(lambda start, end: versions[(start, end)], load=load)
+    job = finished(jobs.submit("inventory_monthly", (2026, 5), lambda progress: "xlsx", MAY))
+
+    assert loads == [MAY] and job.version == 1
+    # Keyed on the loaded data: found as current, and not rebuilt on the next request
+    assert jobs.find("inventory_monthly", (2026, 5), MAY) is job and not job.stale
+    assert jobs.submit("inventory_monthly", (2026, 5), lambda progress: "other", MAY) is job
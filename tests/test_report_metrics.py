@@ -0,0 +1,248 @@
+# test_report_metrics.py - Daily report metrics: the Python aggregation on a fixed fixture, and
+# sql/report_metrics.sql against it on a real Postgres (set REPORT_METRICS_TEST_DSN to run)
+import os
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+
+import report_metrics
+import summary_report
+import target_achievement_report
+from booking_store import TABLE_COLUMNS, TABLE_KEYS, BookingStore
+
+START, END = date(2026, 5, 1), date(2026, 5, 4)
+DATES = [START + timedelta(days=i) for i in range((END - START).days + 1)]
+SQL_FILE = Path(__file__).resolve().parent.parent / "sql" / "report_metrics.sql"
+
+
+def direct(booking_id, prop, check_in, check_out, room_no, tariff, plan="Confirmed", payment="Fully Paid"):
+    return {"booking_id": booking_id, "property_name": prop, "check_in": check_in, "check_out": check_out,
+            "room_no": room_no, "total_tariff": tariff, "plan_status": plan, "payment_status": payment}
+
+
+def online(id, booking_id, prop, check_in, check_out, room_no, amount, tax=0, commission=0,
+           status="Confirmed", payment="Fully Paid"):
+    return {"id": id, "booking_id": booking_id, "property": prop, "check_in": check_in, "check_out": check_out,
+            "room_no": room_no, "booking_amount": amount, "ota_tax": tax, "ota_commission": commission,
+            "booking_status": status, "payment_status": payment}
+
+
+# Rows as stored, covering what the two paths could disagree on: booking IDs whose order differs
+# between byte order and a linguistic collation ("B7" < "a2"), property synonyms, a padded
+# property name (not a synonym), multi-room, unknown, lower-cased and padded room numbers,
+# a stay checking in before the window, a zero-night stay, an online row reusing a direct
+# booking ID, and rows excluded by status.
+DIRECT_ROWS = [
+    direct("B7", "Le Teera", "2026-05-01", "2026-05-03", "101, 102", 4000),
+    direct("a2", "Le Terra", "2026-05-02", "2026-05-04", "102", 1500),
+    direct("C3", "Le Terra", "2026-05-01", "2026-05-02", "999", 700),
+    direct("X1", " Le Terra", "2026-05-01", "2026-05-03", "104", 900),
+    direct("Z9", "Le Terra", "2026-05-01", "2026-05-03", "105", 800, plan="Cancelled"),
+    direct("P1", "Le Poshe Beach VIEW", "2026-04-28", "2026-05-02", "201", 5000),
+    direct("P2", "Le Poshe Beach view", "2026-05-01", "2026-05-03", "201 , 202", 3000),
+    direct("P3", "Le Poshe Beachview", "2026-05-01", "2026-05-01", "203", 600),
+]
+ONLINE_ROWS = [
+    online(5, "OTA-1", "Le Terra", "2026-05-01", "2026-05-02", "103", 2360, 360, 300),
+    online(12, "OTA-2", "Le Terra", "2026-05-03", "2026-05-05", "101,day use 1", 1180, 180, 100),
+    online(40, "P2", "Le Poshe Beachview", "2026-05-02", "2026-05-03", "202", 1000),
+    online(7, "OTA-3", "Eden Beach Resort", "2026-05-02", "2026-05-03", "101", 1500, payment="Not Paid"),
+    online(100, "OTA-4", "Eden Beach Resort", "2026-05-04", "2026-05-08", "101", 2000, 200, 150),
+]
+PROPS = ["Eden Beach Resort", "Le Poshe Beach view", "Le Terra"]
+
+
+def test_build_metrics_frame_fixed_fixture():
+    """Strict sweep in load order: amounts on the check-in night of bookings holding a room."""
+    bookings = {"Le Terra": [
+        dict(DIRECT_ROWS[0], property_name="Le Terra", type="direct"),
+        dict(DIRECT_ROWS[1], type="direct"),
+        dict(DIRECT_ROWS[2], type="direct"),
+        dict(ONLINE_ROWS[0], type="online"),
+        dict(ONLINE_ROWS[1], type="online"),
+    ]}
+    frame = summary_report.build_metrics_frame(["Eden Beach Resort", "Le Terra"], DATES, bookings)
+    got = frame.set_index(["property", "date", "metric"])["value"]
+
+    expected = {
+        # B7 takes 101+102, OTA-1 103; C3's room is unknown
+        date(2026, 5, 1): dict(rooms_sold=3, room_charges=6000, gst=360, commission=300, receivable_per_night=5700),
+        # a2 wants 102, still held by B7: overbooked, so its check-in night books nothing
+        date(2026, 5, 2): dict(rooms_sold=2, room_charges=0, gst=0, commission=0, receivable_per_night=4000),
+        # a2 gets 102 once B7 leaves; OTA-2 checks into 101 and Day Use 1
+        date(2026, 5, 3): dict(rooms_sold=3, room_charges=1000, gst=180, commission=100, receivable_per_night=2400),
+        date(2026, 5, 4): dict(rooms_sold=2, room_charges=0, gst=0, commission=0, receivable_per_night=900),
+    }
+    for day, metrics in expected.items():
+        for metric, value in metrics.items():
+            assert got[("Le Terra", day, metric)] == pytest.approx(value), (day, metric)
+        total = metrics["room_charges"] + metrics["gst"]
+        assert got[("Le Terra", day, "total")] == pytest.approx(total)
+        assert got[("Le Terra", day, "receivable")] == pytest.approx(total - metrics["commission"])
+    assert (frame[frame["property"] == "Eden Beach Resort"]["value"] == 0).all()
+    assert len(frame) == 2 * len(DATES) * 8
+
+
+# -------------------------- Postgres parity --------------------------
+class PgQuery:
+    """The slice of the PostgREST query builder that BookingStore and the reports use, run with psycopg."""
+
+    def __init__(self, conn, table):
+        from psycopg import sql
+        self.conn, self.table = conn, table
+        self.columns, self.filters, self.params, self.tail = sql.SQL("*"), [], [], sql.SQL("")
+
+    def select(self, *columns):
+        from psycopg import sql
+        if "*" not in columns:
+            self.columns = sql.SQL(", ").join(map(sql.Identifier, columns))
+        return self
+
+    def _filter(self, column, op, value):
+        from psycopg import sql
+        self.filters.append(sql.SQL("{} " + op + " %s").format(sql.Identifier(column)))
+        self.params.append(value)
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, "=", value)
+
+    def gt(self, column, value):
+        return self._filter(column, ">", value)
+
+    def lt(self, column, value):
+        return self._filter(column, "<", value)
+
+    def gte(self, column, value):
+        return self._filter(column, ">=", value)
+
+    def lte(self, column, value):
+        return self._filter(column, "<=", value)
+
+    def order(self, column, desc=False):
+        from psycopg import sql
+        self.tail = sql.SQL(" order by {} " + ("desc" if desc else "asc")).format(sql.Identifier(column))
+        return self
+
+    def limit(self, n):
+        from psycopg import sql
+        self.tail = sql.Composed([self.tail, sql.SQL(" limit {}").format(sql.Literal(n))])
+        return self
+
+    def execute(self):
+        from psycopg import sql
+        where = sql.SQL(" where ") + sql.SQL(" and ").join(self.filters) if self.filters else sql.SQL("")
+        query = sql.SQL("select row_to_json(q) from (select {} from {}{}{}) q").format(
+            self.columns, sql.Identifier(self.table), where, self.tail)
+        return PgResult([r[0] for r in self.conn.execute(query, self.params)])
+
+
+class PgResult:
+    def __init__(self, data):
+        self.data = data
+
+
+class PgRpc:
+    def __init__(self, conn, name, params):
+        self.conn, self.name, self.params = conn, name, params
+
+    def execute(self):
+        from psycopg import sql
+        from psycopg.types.json import Jsonb
+        args = sql.SQL(", ").join(sql.SQL("{} => %s").format(sql.Identifier(k)) for k in self.params)
+        values = [Jsonb(v) if isinstance(v, dict) else v for v in self.params.values()]
+        query = sql.SQL("select row_to_json(r) from {}({}) r").format(sql.Identifier(self.name), args)
+        return PgResult([r[0] for r in self.conn.execute(query, values)])
+
+
+class PgClient:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def table(self, name):
+        return PgQuery(self.conn, name)
+
+    def rpc(self, name, params):
+        return PgRpc(self.conn, name, params)
+
+
+def column_type(column):
+    if column in ("check_in", "check_out", "booking_date"):
+        return "date"
+    if column in ("total_tariff", "booking_amount", "ota_tax", "ota_commission"):
+        return "numeric"
+    if column in ("created_at", "updated_at"):
+        return "timestamptz default now()"
+    return "bigint" if column == "id" else "text"
+
+
+@pytest.fixture
+def pg_client():
+    dsn = os.getenv("REPORT_METRICS_TEST_DSN")
+    if not dsn:
+        pytest.skip("REPORT_METRICS_TEST_DSN not set (see README, Report metrics parity)")
+    import psycopg  # requirements-dev.txt; a DSN without the driver is an error, not a skip
+    from psycopg import sql
+
+    schema = f"report_metrics_test_{os.getpid()}"
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        conn.execute(sql.SQL("create schema {}").format(sql.Identifier(schema)))
+        try:
+            conn.execute(sql.SQL("set search_path to {}").format(sql.Identifier(schema)))
+            for table, rows in (("reservations", DIRECT_ROWS), ("online_reservations", ONLINE_ROWS)):
+                columns = TABLE_COLUMNS[table] + ("updated_at",)
+                defs = sql.SQL(", ").join(
+                    sql.SQL("{} " + column_type(c) + (" primary key" if c == TABLE_KEYS[table] else ""))
+                    .format(sql.Identifier(c)) for c in columns)
+                conn.execute(sql.SQL("create table {} ({})").format(sql.Identifier(table), defs))
+                for row in rows:
+                    conn.execute(sql.SQL("insert into {} ({}) values ({})").format(
+                        sql.Identifier(table),
+                        sql.SQL(", ").join(map(sql.Identifier, row)),
+                        sql.SQL(", ").join(sql.Placeholder() * len(row))), list(row.values()))
+            conn.execute(SQL_FILE.read_text())
+            yield PgClient(conn)
+        finally:
+            conn.execute(sql.SQL("drop schema {} cascade").format(sql.Identifier(schema)))
+
+
+@pytest.fixture
+def parity(pg_client, monkeypatch):
+    store = BookingStore(pg_client)
+    monkeypatch.setattr(report_metrics, "USE_METRICS_RPC", True)
+    for module in (summary_report, target_achievement_report):
+        monkeypatch.setattr(module, "supabase", pg_client)
+        monkeypatch.setattr(module, "get_booking_store", lambda _client: store)
+    return store
+
+
+def uncached(func):
+    """The function under st.cache_data, so each test reads the fixture database."""
+    return getattr(func, "__wrapped__", func)
+
+
+def test_summary_rpc_matches_build_metrics_frame(parity):
+    bookings = summary_report.load_bookings_by_property(PROPS, START, END)
+    expected = summary_report.build_metrics_frame(PROPS, DATES, bookings)
+    daily = uncached(summary_report.load_daily_metrics)(tuple(PROPS), START, END)
+    assert daily is not None
+    got = summary_report.metrics_from_daily(daily)
+
+    keys = ["property", "date", "metric"]
+    merged = expected.merge(got, on=keys, how="outer", suffixes=("_python", "_sql"), indicator=True)
+    assert (merged["_merge"] == "both").all(), merged[merged["_merge"] != "both"]
+    assert merged["value_sql"].tolist() == pytest.approx(merged["value_python"].tolist())
+    assert merged["value_python"].abs().sum() > 0
+
+
+def test_target_rpc_matches_compute_property_metrics(parity):
+    bookings = target_achievement_report.load_bookings_by_property(PROPS, START, END)
+    daily = uncached(target_achievement_report.load_daily_metrics)(tuple(PROPS), START, END)
+    assert daily is not None
+    for prop in PROPS:
+        expected = target_achievement_report.compute_property_metrics(bookings[prop], prop, DATES)
+        assert set(daily[prop]) == set(DATES)
+        for day in DATES:
+            for metric, value in expected[day].items():
+                assert daily[prop][day][metric] == pytest.approx(value), (prop, day, metric)
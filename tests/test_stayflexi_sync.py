@@ -0,0 +1,109 @@
+# test_stayflexi_sync.py - Delta sync against MockStayflexiServer and an in-memory online_reservations
+from datetime import datetime, timezone
+
+import pytest
+
+from stayflexi_sync import SYNCED_COLUMNS, MockStayflexiServer, StayflexiSync
+
+
+class Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class Table:
+    """online_reservations / sync_cursors with the upsert, select and eq calls the sync makes."""
+
+    def __init__(self, rows):
+        self.rows, self.op, self.filters = rows, None, []
+
+    def upsert(self, records, on_conflict, ignore_duplicates=False):
+        self.op = ("upsert", records if isinstance(records, list) else [records], on_conflict, ignore_duplicates)
+        return self
+
+    def select(self, *columns):
+        self.op = ("select",)
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def execute(self):
+        if self.op[0] == "select":
+            return Result([r for r in self.rows if all(r.get(c) == v for c, v in self.filters)])
+        _, records, key, ignore_duplicates = self.op
+        written = []
+        for record in records:
+            existing = next((r for r in self.rows if r[key] == record[key]), None)
+            if existing is None:
+                self.rows.append(dict(record))
+                written.append(record)
+            elif not ignore_duplicates:
+                existing.update(record)
+                written.append(record)
+        return Result(written)
+
+
+class Client:
+    def __init__(self, **tables):
+        self.tables = tables
+
+    def table(self, name):
+        return Table(self.tables.setdefault(name, []))
+
+
+def api_booking(booking_id, paid, **extra):
+    """A booking modified just now, inside the lookback of a hotel without a cursor."""
+    return dict({
+        "bookingId": booking_id, "hotelId": "27704", "hotelName": "La Antilia - Pondy",
+        "bookingMadeOn": "2026-04-20T09:00:00", "customerName": "Ann Lee", "customerPhone": "99",
+        "checkin": "2026-05-02T14:00:00", "checkout": "2026-05-04T11:00:00", "pax": "Adults: 2",
+        "roomIds": "101", "bookingSource": "Booking.com", "bookingAmount": 5000, "totalPaymentMade": paid,
+        "balanceDue": 5000 - paid, "modifiedAt": datetime.now(timezone.utc).isoformat(),
+    }, **extra)
+
+
+@pytest.fixture
+def mock_api():
+    server = MockStayflexiServer()
+    url = server.start()
+    yield server, url
+    server.stop()
+
+
+def test_sync_inserts_new_and_updates_only_synced_columns(mock_api):
+    server, url = mock_api
+    server.bookings = [api_booking("SFX1", 5000), api_booking("SFX2", 1000)]
+    rows = [{"booking_id": "SFX1", "property": "La Antilia Luxury", "booking_amount": 5000.0,
+             "total_payment_made": 0.0, "balance_due": 5000.0, "payment_status": "Not Paid",
+             "booking_status": "Confirmed", "remarks": "VIP", "mode_of_booking": "Agent"}]
+    changed = []
+    sync = StayflexiSync(Client(online_reservations=rows), api_url=url, token="t", hotel_ids=["27704"],
+                         on_change=lambda *args: changed.append(args))
+    sync.min_interval = 0
+
+    assert sync.pull() == {"27704": {"inserted": 1, "updated": 1}}
+
+    by_id = {r["booking_id"]: r for r in rows}
+    # The existing booking takes Stayflexi's amounts and the payment status they imply...
+    assert by_id["SFX1"]["total_payment_made"] == 5000.0
+    assert by_id["SFX1"]["balance_due"] == 0.0
+    assert by_id["SFX1"]["payment_status"] == "Fully Paid"
+    # ...while the agent's columns are left alone
+    assert (by_id["SFX1"]["booking_status"], by_id["SFX1"]["remarks"], by_id["SFX1"]["mode_of_booking"]) == \
+        ("Confirmed", "VIP", "Agent")
+    # New bookings are inserted as the Excel import inserts them
+    assert by_id["SFX2"]["payment_status"] == "Partially Paid"
+    assert by_id["SFX2"]["booking_status"] == "Pending"
+    assert (by_id["SFX2"]["check_in"], by_id["SFX2"]["check_out"]) == ("2026-05-02", "2026-05-04")
+
+    # One page, and the changed stays reported for cache invalidation
+    assert [r["page"] for r in server.requests] == ["0"]
+    assert [(props, str(start), str(end)) for props, start, end in changed] == \
+        [(["La Antilia Luxury"], "2026-05-02", "2026-05-04")]
+
+
+def test_synced_columns_leave_agent_columns_out():
+    assert "payment_status" in SYNCED_COLUMNS
+    assert not {"booking_status", "mode_of_booking", "remarks", "submitted_by", "modified_by"} & set(SYNCED_COLUMNS)
@@ -0,0 +1,90 @@
+# test_supabase_paging.py - Keyset pagination against an in-memory PostgREST table
+import pytest
+
+from supabase_paging import fetch_all, iter_pages
+
+
+class Query:
+    """select / eq / gt / lt / order / limit over a list of rows, recording what each page asked for."""
+
+    def __init__(self, rows, log):
+        self.rows, self.log, self.filters = rows, log, []
+        self.columns = self.key = self.desc = self.n = None
+
+    def select(self, *columns):
+        self.columns = columns
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda r: r[column] == value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda r: r[column] > value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda r: r[column] < value)
+        return self
+
+    def order(self, column, desc=False):
+        self.key, self.desc = column, desc
+        return self
+
+    def limit(self, n):
+        self.n = n
+        return self
+
+    def execute(self):
+        self.log.append(self)
+        rows = sorted((r for r in self.rows if all(f(r) for f in self.filters)),
+                      key=lambda r: r[self.key], reverse=self.desc)[:self.n]
+        if "*" not in self.columns:
+            rows = [{c: r[c] for c in self.columns} for r in rows]
+        return Result(rows)
+
+
+class Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class Client:
+    def __init__(self, rows):
+        self.rows, self.log = rows, []
+
+    def table(self, name):
+        return Query(self.rows, self.log)
+
+
+def rows(n):
+    # Stored out of key order, as a heap table would return them
+    return [{"id": i, "property": "Le Terra" if i % 2 else "Eden Beach Resort"} for i in reversed(range(1, n + 1))]
+
+
+@pytest.mark.parametrize("n, queries", [(0, 1), (2, 1), (7, 3), (6, 3)])
+def test_pages_end_on_a_short_page(n, queries):
+    client = Client(rows(n))
+    pages = list(iter_pages(client, "reservations", page_size=3))
+
+    assert [len(p) for p in pages] == [3] * (n // 3) + ([n % 3] if n % 3 else [])
+    assert [r["id"] for p in pages for r in p] == list(range(1, n + 1))
+    # A full last page costs one more query, which comes back empty and is not yielded
+    assert len(client.log) == queries
+
+
+def test_descending_seeks_below_the_last_key():
+    client = Client(rows(5))
+    pages = list(iter_pages(client, "reservations", page_size=2, descending=True))
+    assert [[r["id"] for r in p] for p in pages] == [[5, 4], [3, 2], [1]]
+    assert all(q.desc for q in client.log)
+
+
+def test_key_is_added_to_the_columns_and_filters_apply_to_every_page():
+    client = Client(rows(9))
+    got = fetch_all(client, "reservations", columns=("property",), page_size=2,
+                    where=lambda q: q.eq("property", "Le Terra"))
+
+    assert got == [{"property": "Le Terra", "id": i} for i in (1, 3, 5, 7, 9)]
+    assert all(q.columns == ("property", "id") for q in client.log)
+    assert len(client.log) == 3
@@ -1,6 +1,10 @@
 from datetime import datetime
+import logging
 import streamlit as st
 import requests
+from booking_index import parse_stay_date
+from booking_store import GUEST_KEY_COLUMNS, TABLE_KEYS, get_booking_store, guest_key
+from supabase_paging import fetch_all
 
 def safe_int(value, default=0):
     """Convert value to integer with a default if invalid."""
@@ -23,54 +27,122 @@ def calculate_days(check_in, check_out):
         return delta.days
     return 0
 
+BOOKING_ID_PREFIXES = {"reservations": "TIE", "online_reservations": "SFX"}
+
+def allocate_booking_ids(supabase, table_name="reservations", count=1, day=None):
+    """Reserve count consecutive booking IDs for the table in one call, e.g. a block for a bulk import.
+
+    Uses the allocate_booking_ids RPC (sql/booking_id_allocator.sql), which hands out
+    IDs from a per-day counter and cannot give two callers the same ID. Without it,
+    falls back to probing today's IDs, which can race between concurrent saves.
+    """
+    day = day or datetime.now().date()
+    try:
+        response = supabase.rpc("allocate_booking_ids", {
+            "p_table": table_name,
+            "p_day": day.isoformat(),
+            "p_count": count,
+        }).execute()
+        return [r["booking_id"] for r in response.data or []]
+    except Exception as e:
+        logging.warning(f"allocate_booking_ids RPC unavailable, probing existing IDs: {e}")
+
+    stem = f"{BOOKING_ID_PREFIXES[table_name]}{day.strftime('%Y%m%d')}"
+    response = supabase.table(table_name).select("booking_id").like("booking_id", f"{stem}%").execute()
+    existing_ids = {record["booking_id"] for record in response.data or []}
+    ids, sequence = [], 1
+    while len(ids) < count:
+        if f"{stem}{sequence:03d}" not in existing_ids:
+            ids.append(f"{stem}{sequence:03d}")
+        sequence += 1
+    return ids
+
 def generate_booking_id(supabase, table_name="reservations"):
     """Generate a unique booking ID for the specified table."""
     try:
-        today = datetime.now().strftime('%Y%m%d')
-        prefix = "SFX" if table_name == "online_reservations" else "TIE"
-        response = supabase.table(table_name).select("booking_id").like("booking_id", f"{prefix}{today}%").execute()
-        existing_ids = [record["booking_id"] for record in response.data]
-        sequence = 1
-        while f"{prefix}{today}{sequence:03d}" in existing_ids:
-            sequence += 1
-        return f"{prefix}{today}{sequence:03d}"
+        return allocate_booking_ids(supabase, table_name)[0]
     except Exception as e:
         st.error(f"Error generating booking ID: {e}")
         return None
 
-def check_duplicate_guest(supabase, table_name, guest_name, guest_phone, room_no, exclude_booking_id=None):
-    """Check for duplicate guest in the specified table."""
+def find_duplicate_guests(supabase, table_name, guest_name, phone, room_no, exclude_booking_id=None,
+                          check_in=None, check_out=None):
+    """Booking ID and MOB of every reservation with the same (lower(guest name), phone, room).
+
+    Uses the indexed find_duplicate_guest RPC (sql/duplicate_guest.sql). If it is not
+    deployed, falls back to the hash index of the shared booking store, which only sees
+    the months it holds; check_in/check_out make sure the new stay's months are among them.
+    Without those dates the table itself is queried, so an empty store never reads as
+    "no duplicates".
+    """
     try:
-        response = supabase.table(table_name).select("*").execute()
-        for reservation in response.data:
-            if exclude_booking_id and reservation["booking_id"] == exclude_booking_id:
-                continue
-            if (reservation["guest_name"].lower() == guest_name.lower() and
-                reservation.get("guest_phone") == guest_phone and
-                reservation["room_no"] == room_no):
-                return True, reservation["booking_id"]
+        response = supabase.rpc("find_duplicate_guest", {
+            "p_table": table_name,
+            "p_guest_name": guest_name,
+            "p_phone": phone,
+            "p_room_no": room_no,
+            "p_exclude_booking_id": exclude_booking_id,
+        }).execute()
+        return response.data or []
+    except Exception as e:
+        logging.warning(f"find_duplicate_guest RPC unavailable, using the booking store index: {e}")
+
+    mob_column = "mode_of_booking" if table_name == "online_reservations" else "mob"
+    ci, co = parse_stay_date(check_in), parse_stay_date(check_out)
+    if ci and co:
+        store = get_booking_store(supabase)
+        store.rows(table_name, ci, co)
+        rows = store.find_guest(table_name, guest_name, phone, room_no)
+    else:
+        name_column, phone_column, room_column = GUEST_KEY_COLUMNS[table_name]
+
+        def same_phone_and_room(q):
+            if phone:
+                q = q.eq(phone_column, phone)
+            return q.eq(room_column, room_no) if room_no else q
+
+        key = guest_key(guest_name, phone, room_no)
+        rows = [r for r in fetch_all(supabase, table_name, ("booking_id", mob_column) + GUEST_KEY_COLUMNS[table_name],
+                                     key=TABLE_KEYS[table_name], where=same_phone_and_room)
+                if guest_key(r.get(name_column), r.get(phone_column), r.get(room_column)) == key]
+    return [
+        {"booking_id": r.get("booking_id"), "mob": r.get(mob_column)}
+        for r in rows
+        if not (exclude_booking_id and r.get("booking_id") == exclude_booking_id)
+    ]
+
+def check_duplicate_guest(supabase, table_name, guest_name, guest_phone, room_no, exclude_booking_id=None,
+                          check_in=None, check_out=None):
+    """Check for duplicate guest in the specified table; pass the stay dates when known."""
+    try:
+        matches = find_duplicate_guests(supabase, table_name, guest_name, guest_phone, room_no, exclude_booking_id,
+                                        check_in=check_in, check_out=check_out)
+        if matches:
+            return True, matches[0]["booking_id"]
         return False, None
     except Exception as e:
         st.error(f"Error checking duplicate guest: {e}")
         return False, None
 
+# Stayflexi hotelId -> property_name
+STAYFLEXI_HOTELS = {
+    "27704": "La Antilia Luxury",
+    "27706": "La Paradise Luxury",
+    "27707": "La Paradise Residency",
+    "27709": "La Tamara Luxury",
+    "27710": "La Tamara Suite",
+    "27711": "La Villa Heritage",
+    "27719": "Le Poshe Beach View",
+    "27720": "Le Poshe Luxury",
+    "27721": "Le Poshe Suite",
+    "27722": "Le Royce Villa",
+    "27723": "Le Pondy Beachside",
+    "27724": "Villa Shakti",
+    "30357": "Eden Beach Resort",
+    "31550": "La Millionaire Luxury Resort",
+    "32470": "Le Park Resort"
+}
+
 def get_property_name(hotel_id):
     """Map Stayflexi hotelId to property_name."""
-    property_mapping = {
-        "27704": "La Antilia Luxury",
-        "27706": "La Paradise Luxury",
-        "27707": "La Paradise Residency",
-        "27709": "La Tamara Luxury",
-        "27710": "La Tamara Suite",
-        "27711": "La Villa Heritage",
-        "27719": "Le Poshe Beach View",
-        "27720": "Le Poshe Luxury",
-        "27721": "Le Poshe Suite",
-        "27722": "Le Royce Villa",
-        "27723": "Le Pondy Beachside",
-        "27724": "Villa Shakti",
-        "30357": "Eden Beach Resort",
-        "31550": "La Millionaire Luxury Resort",
-        "32470": "Le Park Resort"
-    }
-    return property_mapping.get(hotel_id, "Unknown Property")
+    return STAYFLEXI_HOTELS.get(hotel_id, "Unknown Property")